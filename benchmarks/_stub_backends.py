@@ -0,0 +1,222 @@
+"""Local stand-ins for the remote services the assistant talks to.
+
+One HTTP server answers, with a configurable delay per service:
+
+  POST /v1/messages                Anthropic Messages API, scripted turns:
+                                   search, visit the first result, speak the
+                                   answer, then end the turn
+  POST /v1/audio/transcriptions    OpenAI transcription, returns the text set
+                                   through POST /_replay/transcript
+  POST /v1/audio/speech            OpenAI speech, streams silent 24kHz PCM
+                                   sized to the text
+  GET  /customsearch/v1            Google Custom Search JSON API
+  GET  /page/<n>                   article pages for the Browser
+
+The real SDK clients are pointed at it, so request building, serialization
+and parsing are all part of what gets measured. Run it on its own process so
+its CPU time and allocations stay out of the measurements.
+
+Usage: python -m benchmarks._stub_backends [--port 0] [--llm-ms 600]
+           [--stt-ms 250] [--tts-ms 150] [--search-ms 120] [--http-ms 80]
+"""
+
+import argparse
+import json
+import random
+import time
+import typing
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_extract import synthetic_page
+
+TTS_RATE = 24_000
+TTS_CHUNK = 4_800
+PAGES = 3
+
+
+class Latency(typing.NamedTuple):
+    llm: float
+    stt: float
+    tts: float
+    search: float
+    http: float
+
+
+def _is_request(message: dict[str, typing.Any]) -> bool:
+    """A user message carrying a request rather than tool results."""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    if isinstance(content, str):
+        return True
+    return all(block.get("type") != "tool_result" for block in content)
+
+
+def _request_text(message: dict[str, typing.Any]) -> str:
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return " ".join(b.get("text", "") for b in content if b.get("type") == "text")
+
+
+def scripted_turn(body: dict[str, typing.Any], base_url: str) -> dict[str, typing.Any]:
+    """The next assistant message, based on how many turns the current
+    request has taken so far."""
+    messages = body["messages"]
+    start = max(i for i, m in enumerate(messages) if _is_request(m))
+    step = sum(m["role"] == "assistant" for m in messages[start:])
+    request = _request_text(messages[start])
+
+    content: list[dict[str, typing.Any]] = [
+        {"type": "text", "text": "Let me look into that."}
+    ]
+    stop_reason = "tool_use"
+    if step == 0:
+        tool = ("GoogleSearch", {"control_type": "run_query", "query": request})
+    elif step == 1:
+        tool = ("Browser", {"control_type": "visit", "url": f"{base_url}/page/0"})
+    elif step == 2:
+        answer = "Here is what I found. " * 6
+        tool = ("AudioTransciever", {"control_type": "output_voice", "text": answer})
+    else:
+        tool = None
+        content = [{"type": "text", "text": "Anything else?"}]
+        stop_reason = "end_turn"
+    if tool is not None:
+        name, input_ = tool
+        content.append(
+            {
+                "type": "tool_use",
+                "id": f"toolu_{random.getrandbits(48):012x}",
+                "name": name,
+                "input": {"input": input_},
+            }
+        )
+
+    return {
+        "id": f"msg_{random.getrandbits(48):012x}",
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": len(json.dumps(messages)) // 4,
+            "output_tokens": 40,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: typing.Any) -> None:
+        pass
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload: typing.Any) -> None:
+        self._send(200, json.dumps(payload).encode(), "application/json")
+
+    def do_POST(self) -> None:
+        body = self._body()
+        latency = self.server.latency
+        if self.path == "/_replay/transcript":
+            self.server.transcript = body.decode()
+            self._send(204, b"", "text/plain")
+        elif self.path == "/v1/messages":
+            time.sleep(latency.llm)
+            self._json(scripted_turn(json.loads(body), self.server.base_url))
+        elif self.path == "/v1/audio/transcriptions":
+            time.sleep(latency.stt)
+            self._json({"text": self.server.transcript})
+        elif self.path == "/v1/audio/speech":
+            text = json.loads(body)["input"]
+            # Roughly 15 characters a second of speech
+            size = int(TTS_RATE * 2 * max(1.0, len(text) / 15))
+            time.sleep(latency.tts)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/pcm")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            chunk = bytes(TTS_CHUNK)
+            for offset in range(0, size, TTS_CHUNK):
+                self.wfile.write(chunk[: size - offset])
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        latency = self.server.latency
+        if url.path == "/customsearch/v1":
+            time.sleep(latency.search)
+            query = urllib.parse.parse_qs(url.query).get("q", [""])[0]
+            self._json(
+                {
+                    "items": [
+                        {
+                            "link": f"{self.server.base_url}/page/{i}",
+                            "title": f"Result {i} for {query}",
+                            "htmlSnippet": f"Snippet {i} about <b>{query}</b>",
+                        }
+                        for i in range(PAGES)
+                    ]
+                }
+            )
+        elif url.path.startswith("/page/"):
+            time.sleep(latency.http)
+            self._send(200, self.server.page, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"", "text/plain")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency: Latency) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.transcript = ""
+        self.page = synthetic_page(random.Random(0), 80)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--llm-ms", type=float, default=600)
+    parser.add_argument("--stt-ms", type=float, default=250)
+    parser.add_argument("--tts-ms", type=float, default=150)
+    parser.add_argument("--search-ms", type=float, default=120)
+    parser.add_argument("--http-ms", type=float, default=80)
+    args = parser.parse_args()
+
+    latency = Latency(
+        args.llm_ms / 1000,
+        args.stt_ms / 1000,
+        args.tts_ms / 1000,
+        args.search_ms / 1000,
+        args.http_ms / 1000,
+    )
+    server = StubServer(args.port, latency)
+    # The harness waits for this line
+    print(server.base_url, flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Activation phrase matching throughput on long transcripts.
+
+Compares:
+
+  legacy  - the original `Daemon.activation_func`, a character multiset
+            sliding window over a single phrase rebuilt on every call.
+  matcher - `ActivationMatcher`, compiled once, fuzzy per word over every
+            configured phrase.
+
+Transcripts are synthetic English and Spanish word salad with the wake
+phrase, or a near miss, dropped in at a random position. Reports transcripts/s,
+throughput in words/s and how many transcripts each one activated on.
+
+Usage: python -m benchmarks.bench_activation [--words 2000] [--transcripts 200]
+"""
+
+import argparse
+import random
+import time
+
+from jarvis.utils.activation import ActivationMatcher
+
+PHRASES = ["jarvis", "hey jarvis", "oye jarvis"]
+WORDS = (
+    "turn on the kitchen lights what is the weather like tomorrow play some"
+    " music set a timer for ten minutes pon música apaga la luz qué hora es"
+    " cuál es el clima de mañana recuérdame llamar a mi madre Paris Travis"
+    " service harvest"
+).split()
+WAKE = ["Jarvis", "hey Jarvis,", "oye Harvis", "Yarvis", "jervis"]
+
+
+def legacy(activation_phrase: str, sensitivity: float, input_: str) -> bool:
+    left = 0
+    activation_phrase_map = dict()
+    for char in activation_phrase.lower():
+        cnt = activation_phrase_map.get(char, 0)
+        activation_phrase_map[char] = cnt + 1
+
+    input_ = input_.lower()
+    matches = 0
+    for right, char in enumerate(input_):
+        if (
+            input_[right] in activation_phrase_map
+            and activation_phrase_map[input_[right]] == 0
+        ):
+            while activation_phrase_map[input_[right]] == 0:
+                if input_[left] in activation_phrase_map:
+                    activation_phrase_map[input_[left]] += 1
+                left += 1
+        elif input_[right] not in activation_phrase_map:
+            while left <= right:
+                if input_[left] in activation_phrase_map:
+                    activation_phrase_map[input_[left]] += 1
+                left += 1
+        else:
+            matches = max(matches, right - left + 1)
+            activation_phrase_map[input_[right]] -= 1
+
+    portion = matches / len(activation_phrase)
+    return portion > (1.0 - sensitivity)
+
+
+def transcripts(rng: random.Random, count: int, words: int) -> list[str]:
+    result = list[str]()
+    for i in range(count):
+        text = [rng.choice(WORDS) for _ in range(words)]
+        # Half of them carry a wake phrase
+        if i % 2 == 0:
+            text.insert(rng.randrange(words), rng.choice(WAKE))
+        result.append(" ".join(text))
+    return result
+
+
+def run(name: str, fn, texts: list[str], words: int) -> None:
+    start = time.perf_counter()
+    hits = sum(bool(fn(text)) for text in texts)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} {len(texts) / elapsed:>10,.1f} transcripts/s"
+        f"  {len(texts) * words / elapsed:>12,.0f} words/s"
+        f"  activated on {hits}/{len(texts)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=2000)
+    parser.add_argument("--transcripts", type=int, default=200)
+    args = parser.parse_args()
+
+    texts = transcripts(random.Random(0), args.transcripts, args.words)
+    print(f"{len(texts)} transcripts of {args.words} words")
+    run("legacy", lambda text: legacy("jarvis", 0.50, text), texts, args.words)
+    matcher = ActivationMatcher(PHRASES)
+    run("matcher", matcher.search, texts, args.words)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""HTML to text extraction benchmark.
+
+Runs every page of a corpus through:
+
+  legacy      - the original BeautifulSoup `html.parser` tree and
+                `get_text`, unbounded.
+  html.parser - `extract_text` on the stdlib incremental parser.
+  lxml        - `extract_text` on lxml's incremental parser, when installed.
+
+Reports ms/page and the estimated output tokens/page. Point `--corpus` at a
+directory of saved `.html` pages, otherwise synthetic article pages with
+navigation, scripts and styles are generated.
+
+Usage: python -m benchmarks.bench_extract [--corpus DIR] [--max-tokens 4000]
+"""
+
+import argparse
+import pathlib
+import random
+import time
+
+from jarvis.tools import _extract
+
+SEP = "</sep/>"
+
+
+def synthetic_page(rng: random.Random, paragraphs: int) -> bytes:
+    words = ["voice", "assistant", "weather", "kitchen", "timer", "music", "news"]
+    nav = "".join(f"<li><a href='/{i}'>Section {i}</a></li>" for i in range(60))
+    script = "var data = " + "[" + ",".join(str(i) for i in range(2_000)) + "];"
+    body = "".join(
+        "<p>" + " ".join(rng.choice(words) for _ in range(60)) + "</p>"
+        for _ in range(paragraphs)
+    )
+    return (
+        "<!doctype html><html><head><title>Article</title>"
+        f"<style>{'.c{color:red}' * 500}</style><script>{script}</script></head>"
+        f"<body><header><nav><ul>{nav}</ul></nav></header>"
+        f"<main><article><h1>Headline</h1>{body}</article></main>"
+        f"<aside>{'<p>related</p>' * 50}</aside><footer>{nav}</footer>"
+        "</body></html>"
+    ).encode()
+
+
+def load_corpus(corpus: str | None) -> list[bytes]:
+    if corpus is not None:
+        return [p.read_bytes() for p in sorted(pathlib.Path(corpus).glob("*.html"))]
+    rng = random.Random(0)
+    return [synthetic_page(rng, n) for n in (5, 20, 80, 300, 1_200) for _ in range(4)]
+
+
+def legacy(content: bytes, max_tokens: int) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, features="html.parser")
+    return soup.get_text(SEP)
+
+
+def extractor(backend: str):
+    def extract(content: bytes, max_tokens: int) -> str:
+        return _extract.extract_text(content, SEP, max_tokens, backend=backend).text
+
+    return extract
+
+
+def run(name: str, fn, pages: list[bytes], max_tokens: int) -> None:
+    chars = 0
+    start = time.perf_counter()
+    for content in pages:
+        chars += len(fn(content, max_tokens))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<12} {elapsed * 1000 / len(pages):>8.2f} ms/page"
+        f"  {chars / _extract.CHARS_PER_TOKEN / len(pages):>9,.0f} tokens/page"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    size = sum(len(p) for p in pages)
+    print(f"{len(pages)} pages, {size / len(pages) / 1024:,.0f} KiB/page on average")
+    run("legacy", legacy, pages, args.max_tokens)
+    run("html.parser", extractor("html.parser"), pages, args.max_tokens)
+    if _extract.DEFAULT_BACKEND == "lxml":
+        run("lxml", extractor("lxml"), pages, args.max_tokens)
+
+
+if __name__ == "__main__":
+    main()
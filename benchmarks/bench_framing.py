@@ -0,0 +1,115 @@
+"""Allocation and peak memory benchmark for audio framing.
+
+Simulates a continuous capture (10 minutes by default) delivered in 20ms
+chunks, the way PyAudio hands them out, and pushes it through:
+
+  before - the original pipeline: chunks collected into a list per 5s batch,
+           joined, sliced into per-frame copies and joined again by the VAD.
+  after  - chunks copied into a preallocated `FrameRing`, framed as
+           memoryviews and accumulated once into the VAD segment buffer.
+
+Reports wall time, peak traced memory and the peak number of live memory
+blocks, sampled once per frame.
+
+Usage: python -m benchmarks.bench_framing [--seconds 600]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_vad import (
+    FRAME_DURATION_MS,
+    SAMPLE_RATE,
+    ScriptedVad,
+    legacy_frame_generator,
+    legacy_vad_collector,
+    speech_pattern,
+)
+from jarvis import utils
+
+PADDING_MS = 400
+BATCH_SECONDS = 5
+FRAME_BYTES = SAMPLE_RATE * FRAME_DURATION_MS // 1000 * 2
+
+
+class PeakBlocks:
+    def __init__(self) -> None:
+        self.baseline = sys.getallocatedblocks()
+        self.peak = self.baseline
+
+    def sample(self) -> None:
+        self.peak = max(self.peak, sys.getallocatedblocks())
+
+
+def before(n_frames: int, chunk: bytes, peak: PeakBlocks) -> int:
+    vad = ScriptedVad(speech_pattern(PADDING_MS // FRAME_DURATION_MS))
+    frames_per_batch = BATCH_SECONDS * 1000 // FRAME_DURATION_MS
+    segments = 0
+    for _ in range(0, n_frames, frames_per_batch):
+        chunks = list[bytes]()
+        for _ in range(frames_per_batch):
+            chunks.append(bytes(chunk))
+            peak.sample()
+        frames = legacy_frame_generator(
+            FRAME_DURATION_MS, b"".join(chunks), SAMPLE_RATE
+        )
+        peak.sample()
+        voiced, _ = legacy_vad_collector(
+            SAMPLE_RATE, FRAME_DURATION_MS, PADDING_MS, vad, frames
+        )
+        segments += len(voiced)
+        peak.sample()
+    return segments
+
+
+def after(n_frames: int, chunk: bytes, peak: PeakBlocks) -> int:
+    vad = ScriptedVad(speech_pattern(PADDING_MS // FRAME_DURATION_MS))
+    ring = utils.FrameRing(FRAME_BYTES, 30_000 // FRAME_DURATION_MS)
+    collector = utils.VadCollector(SAMPLE_RATE, FRAME_DURATION_MS, PADDING_MS, vad)
+    duration = FRAME_DURATION_MS / 1000
+    segments = 0
+    for i in range(n_frames):
+        ring.put(bytes(chunk))
+        frame = utils.Frame(ring.get(), i * duration, duration)
+        if collector.push(frame) is not None:
+            segments += 1
+        peak.sample()
+    return segments
+
+
+def run(name: str, fn, n_frames: int) -> None:
+    chunk = bytes(FRAME_BYTES)
+
+    start = time.perf_counter()
+    fn(n_frames, chunk, PeakBlocks())
+    elapsed = time.perf_counter() - start
+
+    peak = PeakBlocks()
+    tracemalloc.start()
+    segments = fn(n_frames, chunk, peak)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:<8} {elapsed * 1000:>9.1f} ms"
+        f"  peak={peak_bytes / 1024 / 1024:>7.2f} MiB"
+        f"  peak_blocks=+{peak.peak - peak.baseline:,}"
+        f"  segments={segments}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=600)
+    args = parser.parse_args()
+
+    n_frames = args.seconds * 1000 // FRAME_DURATION_MS
+    print(f"{args.seconds}s capture, {n_frames} frames of {FRAME_BYTES} bytes")
+    run("before", before, n_frames)
+    run("after", after, n_frames)
+
+
+if __name__ == "__main__":
+    main()
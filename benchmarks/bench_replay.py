@@ -0,0 +1,341 @@
+"""Offline end-to-end replay of recorded utterances.
+
+Each WAV fixture (16-bit mono) goes through the same path as a live
+utterance:
+
+  vad            frame_generator -> vad_collector with webrtcvad
+  transcription  OpenAITranscriber, WAV upload included
+  activation     ActivationMatcher
+  agent          AnthropicAgent with the GoogleSearch, Browser and
+                 AudioTransciever (speech output) tools
+
+The SDK clients talk to the local stand-ins in `benchmarks._stub_backends`,
+started on their own process with the configured latencies, so nothing
+leaves the machine. Speech is synthesized through the stub and discarded
+instead of played.
+
+Reports p50/p95 wall time, mean CPU time and mean peak allocations per stage
+and end to end, plus p50/p95 of the agent's own spans (model calls and each
+tool). Allocations are measured on a separate pass with tracemalloc, so its
+overhead doesn't skew the timings. A `<name>.txt` next to a fixture holds
+its transcript, otherwise a default request is used. Without `--fixtures`
+synthetic voiced utterances are generated.
+
+Usage: python -m benchmarks.bench_replay [--fixtures DIR] [--rounds 3]
+           [--llm-ms 600] [--stt-ms 250] [--tts-ms 150] [--search-ms 120]
+           [--http-ms 80] [--no-alloc]
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import math
+import pathlib
+import random
+import struct
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing
+import wave
+
+import anthropic
+import googleapiclient.discovery
+import openai
+import webrtcvad
+
+from jarvis import utils
+from jarvis.agents import AnthropicAgent
+from jarvis.exceptions import RequestComplete
+from jarvis.tools import OpenAITranscriber
+from jarvis.tools.audio_transciever import AudioTransciever
+from jarvis.tools.browser import Browser
+from jarvis.tools.google_search import GoogleSearch
+from jarvis.utils import tracing
+from jarvis.utils.activation import ActivationMatcher
+from jarvis.utils.tracing import percentile
+
+FRAME_DURATION_MS = 20
+PADDING_DURATION_MS = 400
+DEFAULT_TRANSCRIPT = "Hey Jarvis, what's the weather like in Madrid tomorrow?"
+STAGES = ("vad", "transcription", "activation", "agent", "end to end")
+
+
+class Fixture(typing.NamedTuple):
+    name: str
+    pcm: bytes
+    rate: int
+    transcript: str
+
+
+class Measurement(typing.NamedTuple):
+    wall: float
+    cpu: float
+    peak: int
+
+
+def synthetic_fixture(name: str, seconds: float, rng: random.Random) -> Fixture:
+    """A harmonic, syllable modulated tone webrtcvad takes for speech,
+    padded with silence."""
+    rate = AudioTransciever.RATE
+    n = int(rate * seconds)
+    samples = list[int]()
+    for i in range(n):
+        t = i / rate
+        envelope = 0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)
+        tone = sum(math.sin(2 * math.pi * 120 * k * t) / k for k in range(1, 15))
+        value = 0.25 * envelope * tone + 0.01 * rng.uniform(-1, 1)
+        samples.append(int(max(-1.0, min(1.0, value)) * 32767))
+    silence = bytes(rate)
+    pcm = silence + struct.pack(f"<{n}h", *samples) + silence
+    return Fixture(name, pcm, rate, DEFAULT_TRANSCRIPT)
+
+
+def load_fixtures(directory: str | None) -> list[Fixture]:
+    if directory is None:
+        rng = random.Random(0)
+        return [synthetic_fixture(f"synthetic-{s}s", s, rng) for s in (1.5, 3.0)]
+    fixtures = list[Fixture]()
+    for path in sorted(pathlib.Path(directory).glob("*.wav")):
+        with wave.open(str(path), "rb") as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                raise ValueError(f"{path}: expected 16-bit mono audio")
+            pcm, rate = wf.readframes(wf.getnframes()), wf.getframerate()
+        text = path.with_suffix(".txt")
+        transcript = text.read_text().strip() if text.exists() else DEFAULT_TRANSCRIPT
+        fixtures.append(Fixture(path.stem, pcm, rate, transcript))
+    return fixtures
+
+
+class ReplayTransciever(AudioTransciever):
+    """The real speech output path, minus the speaker and microphone."""
+
+    def __init__(self, openai_client: openai.Client) -> None:
+        self.openai_client = openai_client
+        self.debug_sink = None
+        self.wake_word = None
+        self.transcriber = OpenAITranscriber(openai_client)
+        self.last_time_to_first_audio = None
+
+    def _play_pcm(
+        self, chunks: typing.Iterable[bytes], started_at: float | None = None
+    ) -> None:
+        for _ in chunks:
+            if started_at is not None:
+                self._record_time_to_first_audio(started_at)
+                started_at = None
+
+
+class ReplayAgent(AnthropicAgent):
+    """Ends the request once the model ends its turn without calling a
+    tool, live requests carry on listening through the transciever."""
+
+    def _remember(self, response: typing.Any, results: typing.Any) -> None:
+        super()._remember(response, results)
+        if response.stop_reason == "end_turn":
+            done = RequestComplete()
+            done.reason = ""
+            raise done
+
+
+class StubBackends:
+    """Runs `benchmarks._stub_backends` on its own process."""
+
+    def __init__(self, latencies: list[str]) -> None:
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks._stub_backends", *latencies],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert self._process.stdout is not None
+        self.base_url = self._process.stdout.readline().strip()
+        if not self.base_url:
+            raise RuntimeError("Stub backends failed to start")
+
+    def set_transcript(self, text: str) -> None:
+        import requests
+
+        requests.post(f"{self.base_url}/_replay/transcript", data=text.encode())
+
+    def close(self) -> None:
+        self._process.terminate()
+        self._process.wait()
+
+
+class Pipeline:
+    def __init__(self, backends: StubBackends) -> None:
+        self.backends = backends
+        openai_client = openai.Client(
+            api_key="replay", base_url=f"{backends.base_url}/v1", max_retries=0
+        )
+        self.transcriber = OpenAITranscriber(openai_client)
+        self.vad = webrtcvad.Vad(mode=2)
+        self.matcher = ActivationMatcher(["jarvis", "hey jarvis", "oye jarvis"])
+        google_client = googleapiclient.discovery.build(
+            "customsearch",
+            "v1",
+            developerKey="replay",
+            static_discovery=True,
+            cache_discovery=False,
+            client_options={"api_endpoint": f"{backends.base_url}/"},
+        )
+        self.agent = ReplayAgent(
+            directive="You are a voice assistant.",
+            max_tokens=1024,
+            anthropic_client=anthropic.Client(
+                api_key="replay", base_url=backends.base_url, max_retries=0
+            ),
+        )
+        self.agent.register_tool(ReplayTransciever(openai_client))
+        self.agent.register_tool(GoogleSearch(google_client, "replay"))
+        self.agent.register_tool(Browser())
+
+    def run(
+        self, fixture: Fixture, measure: typing.Callable[[str], typing.Any]
+    ) -> None:
+        self.backends.set_transcript(fixture.transcript)
+        with measure("end to end"):
+            with measure("vad"):
+                frames = utils.frame_generator(
+                    FRAME_DURATION_MS, fixture.pcm, fixture.rate
+                )
+                segments, _ = utils.vad_collector(
+                    fixture.rate,
+                    FRAME_DURATION_MS,
+                    PADDING_DURATION_MS,
+                    self.vad,
+                    frames,
+                )
+            for segment in segments:
+                with measure("transcription"):
+                    text = self.transcriber.transcribe(segment, fixture.rate)
+                with measure("activation"):
+                    match = self.matcher.search(text)
+                if match is None:
+                    continue
+                with measure("agent"), contextlib.redirect_stdout(io.StringIO()):
+                    self.agent.act(match.command or text)
+                self.agent.clear_mem()
+
+
+class Recorder:
+    """Measures stages, which may nest. Peaks are in bytes above what was
+    allocated when the stage started, a stage's peak includes its children."""
+
+    def __init__(self, allocations: bool) -> None:
+        self.allocations = allocations
+        self.results = collections.defaultdict[str, list[Measurement]](list)
+        # Per open stage, allocated bytes at its start and its children's peak
+        self._open = list[list[int]]()
+
+    @contextlib.contextmanager
+    def __call__(self, stage: str) -> typing.Iterator[None]:
+        if self.allocations:
+            tracemalloc.reset_peak()
+            self._open.append([tracemalloc.get_traced_memory()[0], 0])
+        wall, cpu = time.perf_counter(), time.process_time()
+        yield
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        peak = 0
+        if self.allocations:
+            base, children = self._open.pop()
+            top = max(tracemalloc.get_traced_memory()[1], children)
+            peak = top - base
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], top)
+        self.results[stage].append(Measurement(wall, cpu, peak))
+
+
+def report(timings: Recorder, allocations: Recorder | None) -> None:
+    print(
+        f"{'stage':<16}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}{'cpu ms':>10}"
+        f"{'peak KiB':>10}"
+    )
+    for stage in STAGES:
+        runs = timings.results.get(stage)
+        if not runs:
+            continue
+        walls = sorted(r.wall * 1000 for r in runs)
+        cpu = sum(r.cpu for r in runs) / len(runs) * 1000
+        peak = "-"
+        if allocations is not None and allocations.results.get(stage):
+            peaks = [r.peak for r in allocations.results[stage]]
+            peak = f"{sum(peaks) / len(peaks) / 1024:,.0f}"
+        print(
+            f"{stage:<16}{len(runs):>4}{percentile(walls, 50):>10.1f}"
+            f"{percentile(walls, 95):>10.1f}{cpu:>10.1f}{peak:>10}"
+        )
+
+
+def report_spans(spans: list[tracing.Span]) -> None:
+    durations = collections.defaultdict[str, list[float]](list)
+    for span in spans:
+        name = span.name
+        if name == "tool.use":
+            name = f"tool.use {span.attributes.get('tool')}"
+        durations[name].append(span.duration * 1000)
+    print(f"\n{'span':<28}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}")
+    for name in sorted(durations):
+        values = sorted(durations[name])
+        print(
+            f"{name:<28}{len(values):>4}{percentile(values, 50):>10.1f}"
+            f"{percentile(values, 95):>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=None)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--no-alloc", dest="alloc", action="store_false")
+    for service, default in (
+        ("llm", 600),
+        ("stt", 250),
+        ("tts", 150),
+        ("search", 120),
+        ("http", 80),
+    ):
+        parser.add_argument(f"--{service}-ms", type=float, default=default)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    latencies = list[str]()
+    for service in ("llm", "stt", "tts", "search", "http"):
+        latencies += [f"--{service}-ms", str(getattr(args, f"{service}_ms"))]
+    backends = StubBackends(latencies)
+    spans = tracing.InMemoryExporter()
+    tracing.get_tracer().add_exporter(spans)
+    try:
+        pipeline = Pipeline(backends)
+        # Warm up connections and caches, not measured
+        pipeline.run(fixtures[0], Recorder(False))
+        spans.clear()
+
+        timings = Recorder(False)
+        for _ in range(args.rounds):
+            for fixture in fixtures:
+                pipeline.run(fixture, timings)
+        finished = list(spans.spans)
+
+        allocations = None
+        if args.alloc:
+            allocations = Recorder(True)
+            tracemalloc.start()
+            for fixture in fixtures:
+                pipeline.run(fixture, allocations)
+            tracemalloc.stop()
+    finally:
+        backends.close()
+
+    print(
+        f"{len(fixtures)} fixtures x {args.rounds} rounds, latencies (ms):"
+        f" {' '.join(latencies)}"
+    )
+    report(timings, allocations)
+    report_spans(finished)
+
+
+if __name__ == "__main__":
+    main()
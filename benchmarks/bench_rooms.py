@@ -0,0 +1,311 @@
+"""Cost of each room served by one multi-session daemon.
+
+For every room count in `--rooms` a daemon is built with that many
+sessions, using the same `Daemon.add_session` as a live one, and run for
+`--seconds`. Each room captures from a replayed recording instead of a
+microphone, looped in real time with the rooms out of phase, and talks to
+the local stand-ins in `benchmarks._stub_backends`, so nothing leaves the
+machine. Speech is synthesized and discarded.
+
+It reports:
+
+  first room KiB  - allocations of the first session, including the shared
+                    search and browser tools
+  per room KiB    - mean allocations of each session added after it, mostly
+                    the `--buffer-ms` capture buffer
+  rss MiB         - resident memory once the run is over
+  cpu %/room      - process CPU time per second of wall time, per room
+  cycles          - utterances handled, and how many reached the agent
+  cycle p50/p95   - listening to one utterance and acting on it
+  queued p95      - time model calls waited for one of the `--max-llm-calls`
+                    shared slots
+  peak calls      - most model calls in flight at once
+
+Usage: python -m benchmarks.bench_rooms [--rooms 1,2,4,8] [--seconds 20]
+           [--max-llm-calls 4] [--buffer-ms 30000] [--fixtures DIR] [--llm-ms 600] [--stt-ms 250]
+           [--tts-ms 150] [--search-ms 120] [--http-ms 80]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import threading
+import time
+import tracemalloc
+import typing
+
+import anthropic
+import googleapiclient.discovery
+import openai
+
+from benchmarks.bench_replay import (
+    Fixture,
+    ReplayAgent,
+    StubBackends,
+    load_fixtures,
+)
+from jarvis.config import Config, Room
+from jarvis.daemon import Daemon
+from jarvis.tools.audio_transciever import AudioTransciever
+from jarvis.utils import tracing
+from jarvis.utils.capture import AudioCapture
+from jarvis.utils.tracing import percentile
+
+
+class ReplayCapture(AudioCapture):
+    """Feeds a recording to the capture buffer in real time, over and over,
+    the way PyAudio's callback would."""
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.recording = b""
+        self.offset = 0
+        self._feeder: threading.Thread | None = None
+        self._feeding = threading.Event()
+
+    @typing.override
+    def start(self) -> None:
+        if self._feeder is not None:
+            return
+        self._feeding.set()
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    @typing.override
+    def stop(self) -> None:
+        self._feeding.clear()
+        if self._feeder is not None:
+            self._feeder.join()
+            self._feeder = None
+
+    @typing.override
+    def is_running(self) -> bool:
+        return self._feeding.is_set()
+
+    def _feed(self) -> None:
+        size = self._ring.frame_bytes
+        frames = len(self.recording) // size
+        index = self.offset // size
+        next_frame = time.monotonic()
+        while self._feeding.is_set():
+            offset = (index % frames) * size
+            self._callback(self.recording[offset : offset + size], 0, {}, 0)
+            index += 1
+            next_frame += self._frame_seconds
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+
+class RoomTransciever(AudioTransciever):
+    """The transciever the daemon builds, listening to a replayed recording
+    and discarding its speech."""
+
+    capture: ReplayCapture
+
+    @typing.override
+    def _new_capture(
+        self, input_device: int | None, capture_buffer_ms: int
+    ) -> ReplayCapture:
+        return ReplayCapture(
+            self.pyaudio_instance,
+            self.RATE,
+            self.CHANNELS,
+            self.FORMAT,
+            frame_duration_ms=self.FRAME_DURATION_MS,
+            max_buffered_ms=capture_buffer_ms,
+        )
+
+    @typing.override
+    def _play_pcm(
+        self, chunks: typing.Iterable[bytes], started_at: float | None = None
+    ) -> None:
+        for _ in chunks:
+            pass
+
+
+class RoomDaemon(Daemon):
+    transciever_type = RoomTransciever
+    agent_type = ReplayAgent
+
+
+class Result(typing.NamedTuple):
+    rooms: int
+    first_room: int
+    per_room: float
+    rss: int | None
+    cpu: float
+    cycles: int
+    activated: int
+    cycle_p50: float
+    cycle_p95: float
+    queued_p95: float
+    peak_calls: int
+
+
+def resident_bytes() -> int | None:
+    """Current resident set size, Linux only."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def build(
+    backends: StubBackends, rooms: int, max_llm_calls: int, buffer_ms: int
+) -> RoomDaemon:
+    config = Config()
+    config.rooms = [Room(f"room-{i}") for i in range(rooms)]
+    config.max_llm_calls = max_llm_calls
+    config.capture_buffer_ms = buffer_ms
+    config.fast_start = False
+    config.wake_word = None
+    config.pipelined_speech = False
+    config.streaming_responses = False
+    config.model_routing = False
+    config.browser_cache_dir = None
+    config.search_cache_path = None
+    config.google_search_engine_id = "replay"
+    return RoomDaemon(
+        config=config,
+        anthropic_client=anthropic.Client(
+            api_key="replay", base_url=backends.base_url, max_retries=0
+        ),
+        openai_client=openai.Client(
+            api_key="replay", base_url=f"{backends.base_url}/v1", max_retries=0
+        ),
+        google_client=googleapiclient.discovery.build(
+            "customsearch",
+            "v1",
+            developerKey="replay",
+            static_discovery=True,
+            cache_discovery=False,
+            client_options={"api_endpoint": f"{backends.base_url}/"},
+        ),
+    )
+
+
+def measure(
+    backends: StubBackends,
+    fixture: Fixture,
+    rooms: int,
+    seconds: float,
+    max_llm_calls: int,
+    buffer_ms: int,
+) -> Result:
+    daemon = build(backends, rooms, max_llm_calls, buffer_ms)
+    backends.set_transcript(fixture.transcript)
+    tracemalloc.start()
+    allocated = list[int]()
+    for room in daemon.config.rooms:
+        before = tracemalloc.get_traced_memory()[0]
+        session = daemon.add_session(room)
+        allocated.append(tracemalloc.get_traced_memory()[0] - before)
+        capture = typing.cast(RoomTransciever, session.audio_transciever).capture
+        capture.recording = fixture.pcm
+        # Out of phase, so the rooms don't all speak at once
+        capture.offset = len(daemon.sessions) * len(fixture.pcm) // (rooms + 1)
+    tracemalloc.stop()
+
+    spans = tracing.InMemoryExporter()
+    tracing.get_tracer().add_exporter(spans)
+    runner = threading.Thread(target=daemon.run)
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall, cpu = time.perf_counter(), time.process_time()
+        runner.start()
+        time.sleep(seconds)
+        daemon.stop()
+        runner.join()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    tracing.get_tracer().exporters.remove(spans)
+    for session in daemon.sessions:
+        session.audio_transciever.capture.stop()
+
+    cycles = [s for s in spans.spans if s.name == "daemon.cycle"]
+    activated = sorted(s.duration * 1000 for s in cycles if s.attributes["activated"])
+    queued = sorted(
+        float(s.attributes.get("queued_ms", 0.0))
+        for s in spans.spans
+        if s.name == "llm.create"
+    )
+    return Result(
+        rooms=rooms,
+        first_room=allocated[0],
+        per_room=sum(allocated[1:]) / (rooms - 1) if rooms > 1 else 0.0,
+        rss=resident_bytes(),
+        cpu=cpu / wall / rooms,
+        cycles=len(cycles),
+        activated=len(activated),
+        cycle_p50=percentile(activated, 50),
+        cycle_p95=percentile(activated, 95),
+        queued_p95=percentile(queued, 95),
+        peak_calls=daemon.llm_limit.peak,
+    )
+
+
+def report(results: list[Result]) -> None:
+    print(
+        f"{'rooms':>5}{'first room KiB':>16}{'per room KiB':>14}{'rss MiB':>9}"
+        f"{'cpu %/room':>12}{'cycles':>8}{'acted':>7}{'cycle p50':>11}"
+        f"{'cycle p95':>11}{'queued p95':>12}{'peak calls':>12}"
+    )
+    for r in results:
+        per_room = f"{r.per_room / 1024:,.0f}" if r.rooms > 1 else "-"
+        rss = f"{r.rss / 2**20:,.0f}" if r.rss is not None else "-"
+        print(
+            f"{r.rooms:>5}{r.first_room / 1024:>16,.0f}{per_room:>14}{rss:>9}"
+            f"{r.cpu * 100:>12.1f}{r.cycles:>8}{r.activated:>7}"
+            f"{r.cycle_p50:>9.0f}ms{r.cycle_p95:>9.0f}ms{r.queued_p95:>10.0f}ms"
+            f"{r.peak_calls:>12}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", default="1,2,4,8")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--max-llm-calls", type=int, default=4)
+    parser.add_argument("--buffer-ms", type=int, default=30_000)
+    parser.add_argument("--fixtures", default=None)
+    for service, default in (
+        ("llm", 600),
+        ("stt", 250),
+        ("tts", 150),
+        ("search", 120),
+        ("http", 80),
+    ):
+        parser.add_argument(f"--{service}-ms", type=float, default=default)
+    args = parser.parse_args()
+
+    fixture = load_fixtures(args.fixtures)[0]
+    if fixture.rate != AudioTransciever.RATE:
+        raise ValueError(f"{fixture.name}: expected {AudioTransciever.RATE}Hz audio")
+    latencies = list[str]()
+    for service in ("llm", "stt", "tts", "search", "http"):
+        latencies += [f"--{service}-ms", str(getattr(args, f"{service}_ms"))]
+    backends = StubBackends(latencies)
+    results = list[Result]()
+    try:
+        for rooms in (int(n) for n in args.rooms.split(",")):
+            results.append(
+                measure(
+                    backends,
+                    fixture,
+                    rooms,
+                    args.seconds,
+                    args.max_llm_calls,
+                    args.buffer_ms,
+                )
+            )
+    finally:
+        backends.close()
+
+    print(
+        f"{fixture.name} looped for {args.seconds:.0f}s per run, latencies (ms):"
+        f" {' '.join(latencies)}"
+    )
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Cold start benchmark, from a fresh interpreter to listening.
+
+Every run is a new process that imports `jarvis.daemon`, builds the daemon
+with `Daemon.default()` and opens the microphone. It reports:
+
+  import     - importing `jarvis.daemon`
+  default    - `Daemon.default()`
+  listening  - process start until the microphone is capturing
+  ready      - process start until the agent and its clients are built
+
+each as the median over `--runs`, with FAST_START off (every client built
+before listening) and on (clients built in the background). `--importtime`
+also lists the slowest modules imported by `jarvis.daemon`. Placeholder API
+keys are used when none are set, nothing is sent over the network.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--no-mic] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STAGES = ("import", "default", "listening", "ready")
+KEYS = ("ANTHROPIC_API_KEY", "OPENAI_API_KEY", "GOOGLE_API_KEY")
+
+
+def child(mic: bool) -> None:
+    start = time.perf_counter()
+    from jarvis.daemon import Daemon
+
+    imported = time.perf_counter()
+    daemon = Daemon.default()
+    built = time.perf_counter()
+    if mic:
+        daemon.audio_transciever.capture.start()
+    listening = time.perf_counter()
+    # Waits for the agent, and every client it needs, to be built
+    daemon.jarvis_agent.tool_descriptions()
+    ready = time.perf_counter()
+    if mic:
+        daemon.audio_transciever.capture.stop()
+    print(
+        json.dumps(
+            {
+                "import": imported - start,
+                "default": built - imported,
+                "listening": listening - start,
+                "ready": ready - start,
+            }
+        )
+    )
+
+
+def spawn(fast_start: bool, mic: bool) -> dict[str, float]:
+    env = dict(os.environ, FAST_START=str(fast_start).lower(), LOGLEVEL="WARNING")
+    for key in KEYS:
+        env.setdefault(key, "placeholder")
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child"]
+    if not mic:
+        command.append("--no-mic")
+    out = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def importtime(top: int) -> None:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import jarvis.daemon"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = list[tuple[int, str]]()
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    print(f"slowest imports (cumulative), top {top}:")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:>8.1f} ms {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-mic", dest="mic", action="store_false")
+    parser.add_argument("--importtime", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.mic)
+        return
+
+    print(f"{'':<12}" + "".join(f"{stage:>12}" for stage in STAGES))
+    for fast_start in (False, True):
+        runs = [spawn(fast_start, args.mic) for _ in range(args.runs)]
+        medians = [statistics.median(r[stage] for r in runs) for stage in STAGES]
+        print(
+            f"{'fast start' if fast_start else 'eager':<12}"
+            + "".join(f"{m * 1000:>10.0f}ms" for m in medians)
+        )
+    if args.importtime:
+        importtime(15)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Real-time factor benchmark for the transcription backends.
+
+Transcribes each WAV file (16-bit mono) with every requested backend and
+reports the real-time factor, processing time divided by audio duration,
+so anything below 1.0 keeps up with live speech. Model load and warm-up
+time of the local backend is reported separately since it is only paid once
+per process.
+
+Usage: python -m benchmarks.bench_transcription WAV [WAV ...]
+           [--backend local] [--backend openai] [--model base]
+"""
+
+import argparse
+import os
+import time
+import wave
+
+from jarvis.tools import (
+    LocalWhisperTranscriber,
+    OpenAITranscriber,
+    TranscriptionBackend,
+)
+
+
+def read_wav(path: str) -> tuple[bytes, int]:
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"{path}: expected 16-bit mono audio")
+        return wf.readframes(wf.getnframes()), wf.getframerate()
+
+
+def backend(name: str, model: str) -> TranscriptionBackend:
+    if name == "local":
+        transcriber = LocalWhisperTranscriber(model)
+        start = time.perf_counter()
+        transcriber.wait_until_loaded()
+        print(f"local: loaded `{model}` in {time.perf_counter() - start:.1f}s")
+        return transcriber
+    import openai
+
+    return OpenAITranscriber(openai.Client(api_key=os.environ["OPENAI_API_KEY"]))
+
+
+def run(name: str, transcriber: TranscriptionBackend, files: list[str]) -> None:
+    total_audio = 0.0
+    total_time = 0.0
+    for path in files:
+        pcm, rate = read_wav(path)
+        duration = len(pcm) / 2 / rate
+        start = time.perf_counter()
+        text = transcriber.transcribe(pcm, rate)
+        elapsed = time.perf_counter() - start
+        total_audio += duration
+        total_time += elapsed
+        print(
+            f"{name:<7} {os.path.basename(path):<32} {duration:>6.1f}s audio"
+            f"  {elapsed:>6.2f}s  rtf={elapsed / duration:.3f}  {text[:40]!r}"
+        )
+    print(f"{name:<7} overall rtf={total_time / total_audio:.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--backend", action="append", choices=("local", "openai"))
+    parser.add_argument("--model", default="base")
+    args = parser.parse_args()
+
+    for name in args.backend or ["local"]:
+        transcriber = backend(name, args.model)
+        run(name, transcriber, args.files)
+        transcriber.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Micro-benchmark for the VAD collector hot path.
+
+Compares the original list based collector against the streaming
+`VadCollector`. A scripted VAD with a fixed speech/silence pattern is used so
+the numbers only reflect the collector's own overhead rather than webrtcvad's.
+
+Usage: python -m benchmarks.bench_vad [--seconds 600] [--padding-ms 400]
+"""
+
+import argparse
+import collections
+import itertools
+import time
+
+from jarvis import utils
+
+SAMPLE_RATE = 32_000
+FRAME_DURATION_MS = 20
+
+
+class ScriptedVad:
+    """Replays a repeating pattern of speech decisions."""
+
+    def __init__(self, pattern: list[bool]) -> None:
+        self._decisions = itertools.cycle(pattern)
+
+    def is_speech(self, buf: object, sample_rate: int) -> bool:
+        return next(self._decisions)
+
+
+class LegacyFrame(object):
+    def __init__(self, bytes, timestamp, duration):
+        self.bytes = bytes
+        self.timestamp = timestamp
+        self.duration = duration
+
+
+def legacy_frame_generator(frame_duration_ms, audio, sample_rate):
+    frames = list[LegacyFrame]()
+    n = int(sample_rate * (frame_duration_ms / 1000.0) * 2)
+    offset = 0
+    timestamp = 0.0
+    duration = (float(n) / sample_rate) / 2.0
+    while offset + n < len(audio):
+        frames.append(LegacyFrame(audio[offset : offset + n], timestamp, duration))
+        timestamp += duration
+        offset += n
+    return frames
+
+
+def legacy_vad_collector(
+    sample_rate,
+    frame_duration_ms,
+    padding_duration_ms,
+    vad,
+    frames,
+    activation_ratio=0.9,
+    deactivation_ratio=0.9,
+):
+    num_padding_frames = int(padding_duration_ms / frame_duration_ms)
+    ring_buffer = collections.deque(maxlen=num_padding_frames)
+    triggered = False
+    all_voiced_frames = list[bytes]()
+    voiced_frames = list()
+    for frame in frames:
+        is_speech = vad.is_speech(frame.bytes, sample_rate)
+        if not triggered:
+            ring_buffer.append((frame, is_speech))
+            num_voiced = len([f for f, speech in ring_buffer if speech])
+            if num_voiced > activation_ratio * ring_buffer.maxlen:
+                triggered = True
+                for f, s in ring_buffer:
+                    voiced_frames.append(f)
+                ring_buffer.clear()
+        else:
+            voiced_frames.append(frame)
+            ring_buffer.append((frame, is_speech))
+            num_unvoiced = len([f for f, speech in ring_buffer if not speech])
+            if num_unvoiced > deactivation_ratio * ring_buffer.maxlen:
+                triggered = False
+                all_voiced_frames.append(b"".join(f.bytes for f in voiced_frames))
+                ring_buffer.clear()
+                voiced_frames = []
+    if voiced_frames:
+        all_voiced_frames.extend([f.bytes for f in voiced_frames])
+    return all_voiced_frames, triggered
+
+
+def speech_pattern(padding_frames: int) -> list[bool]:
+    # ~3s of speech followed by ~1s of silence
+    return [True] * 150 + [False] * (50 + padding_frames)
+
+
+def run(name: str, fn, audio: bytes, padding_ms: int) -> None:
+    vad = ScriptedVad(speech_pattern(padding_ms // FRAME_DURATION_MS))
+    start = time.perf_counter()
+    segments, _ = fn(audio, vad)
+    elapsed = time.perf_counter() - start
+    n_frames = len(audio) // (SAMPLE_RATE * FRAME_DURATION_MS // 1000 * 2)
+    print(
+        f"{name:<10} {n_frames / elapsed:>14,.0f} frames/s"
+        f" {elapsed * 1000:>10.1f} ms  segments={len(segments)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=600)
+    parser.add_argument("--padding-ms", type=int, default=400)
+    args = parser.parse_args()
+
+    audio = bytes(SAMPLE_RATE * 2 * args.seconds)
+
+    def before(audio: bytes, vad: ScriptedVad):
+        frames = legacy_frame_generator(FRAME_DURATION_MS, audio, SAMPLE_RATE)
+        return legacy_vad_collector(
+            SAMPLE_RATE, FRAME_DURATION_MS, args.padding_ms, vad, frames
+        )
+
+    def after(audio: bytes, vad: ScriptedVad):
+        frames = utils.frame_generator(FRAME_DURATION_MS, audio, SAMPLE_RATE)
+        return utils.vad_collector(
+            SAMPLE_RATE, FRAME_DURATION_MS, args.padding_ms, vad, frames
+        )
+
+    print(f"{args.seconds}s of audio, {args.padding_ms}ms padding window")
+    run("before", before, audio, args.padding_ms)
+    run("after", after, audio, args.padding_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Wake word stage benchmark over a recorded test set.
+
+Every WAV file (16-bit mono, one utterance each) under `--positives` should
+start with the wake word, none under `--negatives` should. Each is run
+through the chosen detector and the benchmark reports:
+
+  false accept rate  - negatives that would have been transcribed
+  false reject rate  - positives that were dropped
+  cpu                - CPU seconds per second of audio checked
+  stt calls avoided  - utterances never sent to full transcription, compared
+                       to transcribing every VAD segment
+
+Usage: python -m benchmarks.bench_wakeword --positives DIR --negatives DIR
+           [--detector spotter|transcript|both]
+"""
+
+import argparse
+import pathlib
+import wave
+
+from jarvis.config import Config
+from jarvis.daemon import Daemon
+from jarvis.tools import WakeWordDetector
+from jarvis.utils.activation import ActivationMatcher
+
+
+def load(directory: str) -> list[tuple[bytes, int]]:
+    clips = list[tuple[bytes, int]]()
+    for path in sorted(pathlib.Path(directory).glob("*.wav")):
+        with wave.open(str(path), "rb") as wf:
+            clips.append((wf.readframes(wf.getnframes()), wf.getframerate()))
+    return clips
+
+
+def detect_all(detector: WakeWordDetector, clips: list[tuple[bytes, int]]) -> int:
+    return sum(detector.accepts(pcm, rate) for pcm, rate in clips)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positives", required=True)
+    parser.add_argument("--negatives", required=True)
+    parser.add_argument(
+        "--detector", default="spotter", choices=("spotter", "transcript", "both")
+    )
+    args = parser.parse_args()
+
+    positives = load(args.positives)
+    negatives = load(args.negatives)
+    matcher = ActivationMatcher(Config().activation_phrases)
+    detector = Daemon.wake_word_detector(args.detector, matcher.matches)
+    assert detector is not None
+
+    accepted_positives = detect_all(detector, positives)
+    accepted_negatives = detect_all(detector, negatives)
+    stats = detector.stats
+
+    print(f"{args.detector}: {len(positives)} positives, {len(negatives)} negatives")
+    print(f"false accept rate  {accepted_negatives / max(1, len(negatives)):.3f}")
+    print(
+        f"false reject rate  "
+        f"{(len(positives) - accepted_positives) / max(1, len(positives)):.3f}"
+    )
+    print(
+        f"cpu                {stats.cpu_usage:.3f} s/s"
+        f" ({stats.cpu_seconds:.2f}s over {stats.audio_seconds:.1f}s of audio)"
+    )
+    print(f"stt calls avoided  {stats.stt_calls_avoided} of {stats.segments}")
+    detector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,16 @@
-from jarvis.agents._agents import Agent
-from jarvis.agents.base import AnthropicAgent
+from jarvis.agents._agents import Agent, AsyncAgent
+from jarvis.agents._memory import ConversationMemory
+from jarvis.agents._router import ModelRouter, ModelStats
+from jarvis.agents._scheduler import ToolScheduler
+from jarvis.agents.base import AnthropicAgent, AsyncAnthropicAgent
 
-__all__ = ["Agent", "AnthropicAgent"]
+__all__ = [
+    "Agent",
+    "AnthropicAgent",
+    "AsyncAgent",
+    "AsyncAnthropicAgent",
+    "ConversationMemory",
+    "ModelRouter",
+    "ModelStats",
+    "ToolScheduler",
+]
@@ -1,43 +1,91 @@
 import abc
 import logging
+import threading
 
-from anthropic.types import MessageParam
-
+from jarvis.agents._memory import ConversationMemory
 from jarvis.exceptions import RequestComplete
+from jarvis.utils import tracing
 
 _logger = logging.getLogger(__name__)
 
 
-class Agent(abc.ABC):
+class _BaseAgent(abc.ABC):
     _directive: str
-    _memory: list[MessageParam]
+    _memory: ConversationMemory
     _max_tokens: int
 
-    def __init__(self, directive: str, max_tokens: int):
+    def __init__(
+        self,
+        directive: str,
+        max_tokens: int,
+        memory: ConversationMemory | None = None,
+    ):
         self._directive = directive
         self._max_tokens = max_tokens
-        self._memory = list[MessageParam]()
+        self._memory = memory if memory is not None else ConversationMemory()
+        self._cancelled = threading.Event()
 
-    @abc.abstractmethod
-    def _act(self) -> None: ...
+    def cancel(self) -> None:
+        """Stops the agent for good: the request under way ends once its
+        current turn is over, later requests end right away."""
+        self._cancelled.set()
+
+    def close(self) -> None:
+        """Cancels the agent and releases what it runs on."""
+        self.cancel()
 
-    def clear_mem(self):
-        self._memory = list[MessageParam]()
+    def clear_mem(self) -> None:
+        self._memory.clear()
 
     def directive(self) -> str:
         return self._directive
 
+    def _begin_request(self, request: str) -> None:
+        """Called once per request before the first turn."""
+
+
+class Agent(_BaseAgent):
+    @abc.abstractmethod
+    def _act(self) -> None: ...
+
     def act(self, request: str) -> None:
-        try:
-            self._act_eventloop(request)
-        except RequestComplete as e:
-            print(e.reason)
-        except Exception as e:
-            _logger.error(f"Error trying to execute request: {e}")
-            _logger.error(f"Memory dump: {str(self._memory)}")
-            raise e
+        with tracing.span("agent.act", request_chars=len(request)):
+            try:
+                self._act_eventloop(request)
+            except RequestComplete as e:
+                print(e.reason)
+            except Exception as e:
+                _logger.error(f"Error trying to execute request: {e}")
+                _logger.error(f"Memory dump: {str(self._memory)}")
+                raise e
 
     def _act_eventloop(self, request: str) -> None:
+        self._begin_request(request)
         self._memory.append({"role": "user", "content": request})
-        while True:
+        while not self._cancelled.is_set():
             self._act()
+
+
+class AsyncAgent(_BaseAgent):
+    """asyncio counterpart of `Agent`. Each request runs as a coroutine, so
+    many agents can share one event loop and one set of async clients."""
+
+    @abc.abstractmethod
+    async def _act(self) -> None: ...
+
+    async def act(self, request: str) -> None:
+        with tracing.span("agent.act", request_chars=len(request)):
+            try:
+                await self._act_eventloop(request)
+            except RequestComplete as e:
+                print(e.reason)
+            except Exception as e:
+                _logger.error(f"Error trying to execute request: {e}")
+                _logger.error(f"Memory dump: {str(self._memory)}")
+                raise e
+
+    async def _act_eventloop(self, request: str) -> None:
+        self._begin_request(request)
+        self._memory.append({"role": "user", "content": request})
+        while not self._cancelled.is_set():
+            await self._act()
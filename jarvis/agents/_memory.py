@@ -0,0 +1,218 @@
+import json
+import logging
+import threading
+import typing
+
+from anthropic.types import MessageParam
+from pydantic import BaseModel
+
+_logger = logging.getLogger(__name__)
+
+type Summarizer = typing.Callable[[str | None, list[MessageParam]], str]
+
+
+def estimate_tokens(message: MessageParam) -> int:
+    """Cheap token estimate, roughly four characters of serialized content
+    per token."""
+    content = message["content"]
+    if isinstance(content, str):
+        return len(content) // 4 + 1
+    size = 0
+    for block in content:
+        if isinstance(block, BaseModel):
+            size += len(block.model_dump_json())
+        else:
+            size += len(json.dumps(block, default=str))
+    return size // 4 + 1
+
+
+class ConversationMemory:
+    """Conversation history kept within a token budget.
+
+    Once the history grows past `token_budget`, everything but the most recent
+    turns (about `recent_tokens` worth) is folded into a running summary on a
+    background thread, using `summarize`. Without a summarizer the old turns
+    are simply dropped. Requests keep using the full history until the
+    summary is ready, so compaction never blocks a turn.
+
+    History is cut right before a user message that doesn't carry tool
+    results, or right before an assistant message, so a `tool_use` block
+    always stays with its `tool_result` and a long tool loop within one
+    request can be compacted too. History cut before an assistant message
+    is sent after a placeholder user message, requests have to start with
+    one.
+    """
+
+    token_budget: int | None
+    recent_tokens: int
+    summary: str | None
+    summarize: Summarizer | None
+
+    def __init__(
+        self,
+        token_budget: int | None = None,
+        recent_tokens: int | None = None,
+        summarize: Summarizer | None = None,
+        count_tokens: typing.Callable[[MessageParam], int] = estimate_tokens,
+    ) -> None:
+        self.token_budget = token_budget
+        self.recent_tokens = (
+            recent_tokens
+            if recent_tokens is not None
+            else (token_budget // 2 if token_budget is not None else 0)
+        )
+        self.summary = None
+        self.summarize = summarize
+        self._count_tokens = count_tokens
+        self._messages = list[MessageParam]()
+        self._tokens = list[int]()
+        self._lock = threading.Lock()
+        self._compaction: threading.Thread | None = None
+        # Bumped by `clear()`, a compaction started before is discarded
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> typing.Iterator[MessageParam]:
+        return iter(self.messages())
+
+    def __str__(self) -> str:
+        return str(self._messages)
+
+    def messages(self) -> list[MessageParam]:
+        with self._lock:
+            messages = list(self._messages)
+        if messages and messages[0]["role"] == "assistant":
+            messages.insert(0, _EARLIER_TURNS)
+        return messages
+
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(self._tokens)
+
+    def append(self, message: MessageParam) -> None:
+        with self._lock:
+            self._messages.append(message)
+            self._tokens.append(self._count_tokens(message))
+        self.maybe_compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages = list[MessageParam]()
+            self._tokens = list[int]()
+            self.summary = None
+            self._generation += 1
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Blocks until a running compaction has finished."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join(timeout)
+
+    def _is_boundary(self, message: MessageParam) -> bool:
+        """Whether history can be cut right before `message`."""
+        if message["role"] == "assistant":
+            return True
+        content = message["content"]
+        if isinstance(content, str):
+            return True
+        return not any(_block_type(b) == "tool_result" for b in content)
+
+    def _cut_index(self) -> int:
+        """Index of the earliest turn boundary whose tail fits in
+        `recent_tokens`, always keeping at least the latest turn."""
+        cut = 0
+        tail = 0
+        for i in range(len(self._messages) - 1, 0, -1):
+            tail += self._tokens[i]
+            if not self._is_boundary(self._messages[i]):
+                continue
+            if cut != 0 and tail > self.recent_tokens:
+                break
+            cut = i
+        return cut
+
+    def maybe_compact(self) -> None:
+        if self.token_budget is None:
+            return
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            if sum(self._tokens) <= self.token_budget:
+                return
+            cut = self._cut_index()
+            if cut == 0:
+                return
+            head = self._messages[:cut]
+            previous = self.summary
+            self._compaction = threading.Thread(
+                target=self._compact,
+                args=(previous, head, self._generation),
+                daemon=True,
+            )
+            self._compaction.start()
+
+    def _compact(
+        self, previous: str | None, head: list[MessageParam], generation: int
+    ) -> None:
+        summary = previous
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(previous, head)
+            except Exception as e:
+                _logger.error(f"Unable to summarize conversation memory: {e}")
+                return
+
+        with self._lock:
+            # Cleared meanwhile, the summary is of a conversation that's gone
+            if generation != self._generation:
+                return
+            # Only appends happen meanwhile, the head is still at the front
+            if any(a is not b for a, b in zip(self._messages, head)):
+                return
+            dropped = sum(self._tokens[: len(head)])
+            del self._messages[: len(head)]
+            del self._tokens[: len(head)]
+            self.summary = summary
+        _logger.info(
+            f"[memory] compacted {len(head)} messages (~{dropped} tokens) into summary"
+        )
+
+
+# Stands in for the turns before a cut in the middle of a request
+_EARLIER_TURNS = MessageParam(
+    role="user", content="system-message: <earlier turns left out>"
+)
+
+
+def _block_type(block: typing.Any) -> str | None:
+    if isinstance(block, BaseModel):
+        return getattr(block, "type", None)
+    if isinstance(block, dict):
+        return block.get("type")
+    return None
+
+
+SUMMARY_PROMPT = """You maintain the long term memory of a voice assistant.
+Condense the conversation below into a short summary of everything worth
+remembering: facts about the user, their preferences, open requests and the
+outcome of any tool use. Build on the previous summary if there is one.
+Reply with the summary only."""
+
+
+def render_transcript(previous: str | None, messages: list[MessageParam]) -> str:
+    """Flattens messages into plain text for the summarizer, tool blocks are
+    inlined so no tool definitions are needed."""
+    lines = list[str]()
+    if previous:
+        lines.append(f"Previous summary: {previous}")
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            lines.append(f"{message['role']}: {content}")
+            continue
+        for block in content:
+            dumped = block.model_dump() if isinstance(block, BaseModel) else block
+            lines.append(f"{message['role']}: {json.dumps(dumped, default=str)}")
+    return "\n".join(lines)
@@ -0,0 +1,94 @@
+import logging
+import threading
+
+from anthropic.types import Usage
+from pydantic import BaseModel
+
+_logger = logging.getLogger(__name__)
+
+
+class RoutingSignals(BaseModel):
+    """Cheap per-turn signals the router decides on."""
+
+    request_chars: int = 0
+    depth: int = 0  # model calls already made for the current request
+    previous_error: bool = False
+    escalated: bool = False
+
+
+class ModelStats(BaseModel):
+    calls: int = 0
+    total_latency: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    escalations: int = 0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+
+class ModelRouter:
+    """Picks the model for each turn.
+
+    Short requests start on `fast_model`. A turn goes to `strong_model` when
+    the request is long, when the request has needed more than
+    `max_fast_depth` model calls, or when the previous turn had a tool
+    error or malformed tool input. Once escalated, the rest of the request
+    stays on the strong model.
+
+    Latency and token usage are recorded per model in `stats` to tune the
+    thresholds.
+    """
+
+    fast_model: str
+    strong_model: str
+    max_fast_chars: int
+    max_fast_depth: int
+    stats: dict[str, ModelStats]
+
+    def __init__(
+        self,
+        fast_model: str,
+        strong_model: str,
+        max_fast_chars: int = 160,
+        max_fast_depth: int = 3,
+    ) -> None:
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.max_fast_chars = max_fast_chars
+        self.max_fast_depth = max_fast_depth
+        self.stats = dict[str, ModelStats]()
+        self._lock = threading.Lock()
+
+    def choose(self, signals: RoutingSignals) -> str:
+        if signals.previous_error and not signals.escalated:
+            signals.escalated = True
+            with self._lock:
+                self._stats(self.strong_model).escalations += 1
+            _logger.info("[router] escalating after a tool error")
+
+        if (
+            signals.escalated
+            or signals.request_chars > self.max_fast_chars
+            or signals.depth >= self.max_fast_depth
+        ):
+            return self.strong_model
+        return self.fast_model
+
+    def record(self, model: str, latency: float, usage: Usage) -> None:
+        with self._lock:
+            stats = self._stats(model)
+            stats.calls += 1
+            stats.total_latency += latency
+            stats.input_tokens += usage.input_tokens
+            stats.output_tokens += usage.output_tokens
+            stats.cache_read_input_tokens += (
+                getattr(usage, "cache_read_input_tokens", None) or 0
+            )
+
+    def _stats(self, model: str) -> ModelStats:
+        if model not in self.stats:
+            self.stats[model] = ModelStats()
+        return self.stats[model]
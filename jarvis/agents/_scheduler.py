@@ -0,0 +1,163 @@
+import collections
+import contextvars
+import logging
+import threading
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pydantic import BaseModel
+
+from jarvis.tools._tool import Tool
+
+_logger = logging.getLogger(__name__)
+
+
+type _AnyTool = Tool[typing.Any, BaseModel]
+
+
+class _Lane:
+    """Calls that share a concurrency limit, the ones over it wait here
+    rather than on a pool thread."""
+
+    __slots__ = ("limit", "running", "waiting")
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.running = 0
+        self.waiting = collections.deque[typing.Callable[[], None]]()
+
+
+class ToolScheduler:
+    """Runs tool calls concurrently on a shared thread pool.
+
+    Each tool can cap how many of its calls run at once (`max_concurrency`)
+    and how long a caller waits for a result (`timeout`, counted from
+    submission). Tools marked `exclusive`, e.g. the ones driving the
+    microphone or speaker, take turns and never overlap each other. Calls
+    over a limit are queued and only handed to the pool once it's their
+    turn, so they don't hold threads other calls could run on. A queued call
+    that times out is dropped without running.
+
+    Several schedulers can run on one `executor`, e.g. one per session, so
+    each keeps its own exclusive lane and limits while sharing the threads.
+    A scheduler only shuts down an executor it created.
+    """
+
+    def __init__(
+        self, max_workers: int = 8, executor: ThreadPoolExecutor | None = None
+    ):
+        self._owns_executor = executor is None
+        self._executor = (
+            executor
+            if executor is not None
+            else ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="jarvis-tool"
+            )
+        )
+        self._exclusive = _Lane(1)
+        self._lanes = dict[str, _Lane]()
+        self._lanes_lock = threading.Lock()
+
+    def _lane(self, tool: _AnyTool) -> _Lane | None:
+        """The lane `tool`'s calls take turns in, None if they're unlimited.
+        Callers hold `_lanes_lock`."""
+        if tool.exclusive:
+            return self._exclusive
+        if tool.max_concurrency is None:
+            return None
+        name = tool.get_name()
+        if name not in self._lanes:
+            self._lanes[name] = _Lane(tool.max_concurrency)
+        return self._lanes[name]
+
+    def _release(self, lane: _Lane) -> None:
+        """Hands a finished call's turn to the next call waiting."""
+        with self._lanes_lock:
+            if lane.waiting:
+                start = lane.waiting.popleft()
+            else:
+                lane.running -= 1
+                return
+        start()
+
+    def submit(
+        self, tool: _AnyTool, input_: dict[str, typing.Any]
+    ) -> Future[BaseModel]:
+        """Schedules a tool call. The returned future fails with a
+        `TimeoutError` if the call hasn't finished within the tool's timeout,
+        a call that's already running keeps running in the background."""
+        result = Future[BaseModel]()
+        # Carries the current trace span over to the worker thread
+        context = contextvars.copy_context()
+
+        def resolve(done: Future[BaseModel]) -> None:
+            if result.done():
+                return
+            try:
+                exc = done.exception()
+                if exc is not None:
+                    result.set_exception(exc)
+                else:
+                    result.set_result(done.result())
+            except Exception:
+                pass  # lost the race against the timeout
+
+        with self._lanes_lock:
+            lane = self._lane(tool)
+
+        def start() -> None:
+            if lane is not None and result.done():
+                # Timed out while waiting for its turn
+                self._release(lane)
+                return
+            try:
+                call = self._executor.submit(context.run, tool.use, input_)
+            except RuntimeError as e:
+                # The executor was shut down
+                if lane is not None:
+                    self._release(lane)
+                if not result.done():
+                    result.set_exception(e)
+                return
+            if lane is not None:
+                call.add_done_callback(lambda _: self._release(lane))
+            call.add_done_callback(resolve)
+
+        if lane is None:
+            start()
+        else:
+            with self._lanes_lock:
+                queued = lane.running >= lane.limit
+                if queued:
+                    lane.waiting.append(start)
+                else:
+                    lane.running += 1
+            if not queued:
+                start()
+
+        timeout = tool.timeout
+        if timeout is not None:
+
+            def expire() -> None:
+                if result.done():
+                    return
+                try:
+                    result.set_exception(
+                        TimeoutError(
+                            f"`{tool.get_name()}` did not finish within {timeout}s"
+                        )
+                    )
+                    _logger.warning(f"Tool call timed out: {tool.get_name()}")
+                except Exception:
+                    pass  # lost the race against the result
+
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+            result.add_done_callback(lambda _: timer.cancel())
+
+        return result
+
+    def shutdown(self) -> None:
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,97 +1,614 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
 import json
 import logging
+import time
 import typing
+from concurrent.futures import Future
 
 import anthropic
 from anthropic.types import (
+    Message,
     MessageParam,
     TextBlockParam,
     ToolParam,
     ToolResultBlockParam,
+    ToolUseBlock,
+)
+from anthropic.types.beta.prompt_caching import (
+    PromptCachingBetaCacheControlEphemeralParam,
+    PromptCachingBetaImageBlockParam,
+    PromptCachingBetaMessageParam,
+    PromptCachingBetaTextBlockParam,
+    PromptCachingBetaToolParam,
+    PromptCachingBetaToolResultBlockParam,
+    PromptCachingBetaToolUseBlockParam,
 )
+from pydantic import BaseModel, ValidationError
 
-from jarvis.agents._agents import Agent
-from jarvis.tools._tool import AnthropicTool
+from jarvis.agents._agents import Agent, AsyncAgent
+from jarvis.agents._memory import SUMMARY_PROMPT, ConversationMemory, render_transcript
+from jarvis.agents._router import ModelRouter, RoutingSignals
+from jarvis.agents._scheduler import ToolScheduler
+from jarvis.tools._tool import AnthropicTool, AsyncAnthropicTool
+from jarvis.utils import tracing
+
+if typing.TYPE_CHECKING:
+    from jarvis.tools.audio_transciever import SpeechPipeline
+    from jarvis.utils.limits import CallLimit
 
 _logger = logging.getLogger(__name__)
 
+type _PendingCall = tuple[ToolUseBlock, Future[BaseModel] | None]
+type _PendingAsyncCall = tuple[ToolUseBlock, asyncio.Task[BaseModel] | None]
+type _AnyAnthropicTool = (
+    AnthropicTool[typing.Any, BaseModel] | AsyncAnthropicTool[typing.Any, BaseModel]
+)
 
-class AnthropicAgent(Agent):
-    _tools: dict[str, AnthropicTool[typing.Any, typing.Any]]
-    _anthropic_client: anthropic.Client
 
-    def __init__(
-        self, directive: str, max_tokens: int, anthropic_client: anthropic.Client
-    ):
-        self._tools = dict[str, AnthropicTool[typing.Any, typing.Any]]()
-        self._anthropic_client = anthropic_client
-        super().__init__(directive, max_tokens)
+class TurnMetrics(BaseModel):
+    """Latencies of a single model call, in seconds since the request was
+    sent."""
 
-    def sonnet(self):
-        return self._anthropic_client.messages.create(
-            max_tokens=self._max_tokens,
-            model="claude-3-5-sonnet-latest",
-            messages=self._memory,
-            tools=self.tool_descriptions(),
-            system=self.directive(),
+    model: str
+    time_to_first_token: float | None = None
+    time_to_first_tool_start: float | None = None
+    duration: float | None = None
+
+
+def _tool_output_result(cb: ToolUseBlock, output: BaseModel) -> ToolResultBlockParam:
+    return ToolResultBlockParam(
+        type="tool_result",
+        tool_use_id=cb.id,
+        is_error=bool(getattr(output, "error", False)),
+        content=output.model_dump_json(),
+    )
+
+
+def _tool_error_result(cb: ToolUseBlock, error: str) -> ToolResultBlockParam:
+    return ToolResultBlockParam(
+        type="tool_result",
+        tool_use_id=cb.id,
+        is_error=True,
+        content=json.dumps({"error": error}),
+    )
+
+
+def _missing_tool_result(cb: ToolUseBlock) -> ToolResultBlockParam:
+    return _tool_error_result(cb, f"Couldn't find tool with tool name: `{cb.name}`")
+
+
+def _invalid_input_result(cb: ToolUseBlock, e: ValidationError) -> ToolResultBlockParam:
+    return _tool_error_result(cb, f"Invalid input for `{cb.name}`: {e}")
+
+
+_EPHEMERAL: PromptCachingBetaCacheControlEphemeralParam = {"type": "ephemeral"}
+# Breakpoints on the last two messages: the newest one is written to the cache
+# and the previous one is where the last request's cache entry is read from.
+_MESSAGE_BREAKPOINTS = 2
+
+
+type _CacheableBlockParam = (
+    PromptCachingBetaTextBlockParam
+    | PromptCachingBetaImageBlockParam
+    | PromptCachingBetaToolUseBlockParam
+    | PromptCachingBetaToolResultBlockParam
+)
+
+
+def _with_cache_breakpoints(
+    memory: list[MessageParam],
+) -> list[MessageParam | PromptCachingBetaMessageParam]:
+    messages = list[MessageParam | PromptCachingBetaMessageParam](memory)
+    for i in range(max(0, len(messages) - _MESSAGE_BREAKPOINTS), len(messages)):
+        content = messages[i]["content"]
+        blocks: list[dict[str, object]]
+        if isinstance(content, str):
+            blocks = [dict(type="text", text=content)]
+        else:
+            blocks = [
+                b.model_dump(exclude_none=True) if isinstance(b, BaseModel) else dict(b)
+                for b in content
+            ]
+        if not blocks:
+            continue
+        blocks[-1] = {**blocks[-1], "cache_control": _EPHEMERAL}
+        messages[i] = PromptCachingBetaMessageParam(
+            role=messages[i]["role"],
+            content=typing.cast(list[_CacheableBlockParam], blocks),
         )
+    return messages
 
-    def haiku(self):
-        return self._anthropic_client.messages.create(
+
+class _AnthropicAgentBase[_ToolT: _AnyAnthropicTool]:
+    """State and request building shared by the sync and async Anthropic
+    agents."""
+
+    SONNET = "claude-3-5-sonnet-latest"
+    HAIKU = "claude-3-haiku-20240307"
+
+    _tools: dict[str, _ToolT]
+    _tool_descriptions: list[ToolParam] | None = None
+    _memory: ConversationMemory
+    _max_tokens: int
+    prompt_caching: bool = True
+    last_turn_metrics: TurnMetrics | None
+    router: ModelRouter | None = None
+    _signals: RoutingSignals
+    _streaming: bool = False
+
+    if typing.TYPE_CHECKING:
+
+        def directive(self) -> str: ...
+
+    def _system(self) -> list[TextBlockParam]:
+        system = [TextBlockParam(type="text", text=self.directive())]
+        if self._memory.summary is not None:
+            system.append(
+                TextBlockParam(
+                    type="text",
+                    text=f"Summary of the earlier conversation: {self._memory.summary}",
+                )
+            )
+        return system
+
+    def _request_params(self, model: str) -> dict[str, typing.Any]:
+        if not self.prompt_caching:
+            return dict(
+                max_tokens=self._max_tokens,
+                model=model,
+                messages=self._memory.messages(),
+                tools=self.tool_descriptions(),
+                system=self._system(),
+            )
+
+        # Cache breakpoints cover the tools, the system prompt and the
+        # conversation so far, so only the newest turn is processed from
+        # scratch. The stored memory itself is left untouched.
+        tools = list[ToolParam | PromptCachingBetaToolParam](self.tool_descriptions())
+        if tools:
+            tools[-1] = PromptCachingBetaToolParam(
+                **tools[-1], cache_control=_EPHEMERAL
+            )
+        system = list[TextBlockParam | PromptCachingBetaTextBlockParam](self._system())
+        system[0] = PromptCachingBetaTextBlockParam(
+            **system[0], cache_control=_EPHEMERAL
+        )
+        return dict(
             max_tokens=self._max_tokens,
-            model="claude-3-haiku-20240307",
-            messages=self._memory,
-            tools=self.tool_descriptions(),
-            system=self.directive(),
+            model=model,
+            messages=_with_cache_breakpoints(self._memory.messages()),
+            tools=tools,
+            system=system,
         )
 
     def tool_descriptions(self) -> list[ToolParam]:
-        return [t.tool_description() for t in self._tools.values()]
+        """Tool schemas are generated once and reused until the set of
+        registered tools changes, keeping the request prefix byte-for-byte
+        stable for prompt caching."""
+        if self._tool_descriptions is None:
+            self._tool_descriptions = [
+                t.tool_description() for t in self._tools.values()
+            ]
+        return self._tool_descriptions
 
-    def register_tool(self, tool: AnthropicTool[typing.Any, typing.Any]) -> None:
+    def register_tool(self, tool: _ToolT) -> None:
         self._tools[tool.get_name()] = tool
+        self._tool_descriptions = None
 
     def unregister_tool(self, name: str) -> None:
         del self._tools[name]
+        self._tool_descriptions = None
 
-    @typing.override
-    def _act(self) -> None:
-        response = self.sonnet()
+    def _summary_request(
+        self, previous: str | None, messages: list[MessageParam]
+    ) -> dict[str, typing.Any]:
+        return dict(
+            max_tokens=1024,
+            model=self.HAIKU,
+            system=SUMMARY_PROMPT,
+            messages=[
+                MessageParam(role="user", content=render_transcript(previous, messages))
+            ],
+        )
+
+    def _begin_request(self, request: str) -> None:
+        self._signals = RoutingSignals(request_chars=len(request))
+
+    def _choose_model(self) -> str:
+        """Model for the next turn, always sonnet unless a router is set."""
+        if self.router is None:
+            return self.SONNET
+        return self.router.choose(self._signals)
+
+    def _route_feedback(
+        self,
+        model: str,
+        response: Message,
+        results: list[ToolResultBlockParam],
+        latency: float,
+    ) -> None:
+        self._signals.depth += 1
+        self._signals.previous_error = any(r.get("is_error") for r in results)
+        if self.router is not None:
+            self.router.record(model, latency, response.usage)
+
+    def _trace_response(self, span: tracing.Span, response: Message) -> None:
+        usage = response.usage
+        span.set(
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            # Only reported by SDK versions with prompt caching
+            cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", None),
+            cache_creation_input_tokens=getattr(
+                usage, "cache_creation_input_tokens", None
+            ),
+            stop_reason=response.stop_reason,
+        )
+        if self._streaming and self.last_turn_metrics is not None:
+            ttft = self.last_turn_metrics.time_to_first_token
+            span.set(time_to_first_token_ms=ttft * 1000 if ttft is not None else None)
+
+    def _record_metrics(self, metrics: TurnMetrics, start: float) -> None:
+        metrics.duration = time.monotonic() - start
+        self.last_turn_metrics = metrics
+        _logger.info(f"[turn-metrics] {metrics.model_dump_json()}")
 
-        user_content = list[TextBlockParam | ToolResultBlockParam]()
+    def _remember(
+        self, response: Message, results: typing.Iterable[ToolResultBlockParam]
+    ) -> None:
         for cb in response.content:
             _logger.info(cb)
-            if cb.type == "tool_use":
-                tool_name = cb.name
-                tool = self._tools.get(tool_name)
-
-                if tool is not None:
-                    output = tool.use(cb.input)
-                    user_content.append(
-                        ToolResultBlockParam(
-                            type="tool_result",
-                            tool_use_id=cb.id,
-                            is_error=False,
-                            content=output.model_dump_json(),
-                        )
-                    )
-                else:
-                    user_content.append(
-                        ToolResultBlockParam(
-                            type="tool_result",
-                            tool_use_id=cb.id,
-                            is_error=True,
-                            content=json.dumps(
-                                {
-                                    "error": f"Couldn't find tool with tool name: `{tool_name}`"
-                                }
-                            ),
-                        )
-                    )
+        _logger.info(
+            "[usage] input={} cache_read={} cache_write={} output={}".format(
+                response.usage.input_tokens,
+                getattr(response.usage, "cache_read_input_tokens", None) or 0,
+                getattr(response.usage, "cache_creation_input_tokens", None) or 0,
+                response.usage.output_tokens,
+            )
+        )
 
+        user_content = list[TextBlockParam | ToolResultBlockParam](results)
         self._memory.append(MessageParam(role="assistant", content=response.content))
         if len(user_content) == 0:
             user_content.append(
                 TextBlockParam(type="text", text="system-message: <no output detected>")
             )
         self._memory.append(MessageParam(role="user", content=user_content))
+
+
+class AnthropicAgent(_AnthropicAgentBase[AnthropicTool[typing.Any, typing.Any]], Agent):
+    _tools: dict[str, AnthropicTool[typing.Any, typing.Any]]
+    _anthropic_client: anthropic.Client
+    _speech: SpeechPipeline | None
+    _streaming: bool
+    _scheduler: ToolScheduler
+    _llm_limit: CallLimit | None
+
+    def __init__(
+        self,
+        directive: str,
+        max_tokens: int,
+        anthropic_client: anthropic.Client,
+        speech: SpeechPipeline | None = None,
+        streaming: bool = False,
+        scheduler: ToolScheduler | None = None,
+        prompt_caching: bool = True,
+        memory: ConversationMemory | None = None,
+        router: ModelRouter | None = None,
+        llm_limit: CallLimit | None = None,
+    ):
+        self._tools = dict[str, AnthropicTool[typing.Any, typing.Any]]()
+        self.prompt_caching = prompt_caching
+        self.router = router
+        self._signals = RoutingSignals()
+        self._anthropic_client = anthropic_client
+        self._speech = speech
+        self._streaming = streaming or speech is not None
+        self._scheduler = scheduler if scheduler is not None else ToolScheduler()
+        # Shared with other agents to bound model calls in flight overall
+        self._llm_limit = llm_limit
+        self.last_turn_metrics = None
+        super().__init__(directive, max_tokens, memory)
+        if self._memory.summarize is None:
+            self._memory.summarize = self._summarize
+
+    @typing.override
+    def close(self) -> None:
+        """Also stops the speech pipeline's workers and the scheduler, which
+        leaves an executor it was given running."""
+        super().close()
+        if self._speech is not None:
+            self._speech.close()
+        self._scheduler.shutdown()
+
+    def _summarize(self, previous: str | None, messages: list[MessageParam]) -> str:
+        """Compacts old turns with the cheaper model, runs on the memory's
+        background thread."""
+        with self._llm_slot(), tracing.span("llm.summarize") as span:
+            response = self._anthropic_client.messages.create(
+                **self._summary_request(previous, messages)
+            )
+            self._trace_response(span, response)
+        return "".join(cb.text for cb in response.content if cb.type == "text")
+
+    def _llm_slot(self) -> typing.ContextManager[float | None]:
+        """Waits for a free slot when a limit is set, yields how long it
+        took."""
+        if self._llm_limit is None:
+            return contextlib.nullcontext(None)
+        return self._llm_limit.slot()
+
+    def create(self, model: str) -> Message:
+        # Not streamed, the params just can't say so to the type checker
+        return typing.cast(
+            Message,
+            self._anthropic_client.messages.create(**self._request_params(model)),
+        )
+
+    def sonnet(self) -> Message:
+        return self.create(self.SONNET)
+
+    def haiku(self) -> Message:
+        return self.create(self.HAIKU)
+
+    def _stream_response(
+        self, model: str
+    ) -> tuple[Message, list[_PendingCall | ToolUseBlock]]:
+        """Streams the response, dispatching each tool as soon as its input
+        has been fully generated rather than after the whole message arrives.
+
+        Text is handed to the speech pipeline as it is generated when one is
+        configured. Exclusive tools are then held back, returned undispatched,
+        so tools using the microphone or speaker don't overlap with speech.
+        """
+        metrics = TurnMetrics(model=model)
+        start = time.monotonic()
+        pending = list[_PendingCall | ToolUseBlock]()
+        with self._anthropic_client.messages.stream(
+            **self._request_params(model)
+        ) as stream:
+            for event in stream:
+                if metrics.time_to_first_token is None and event.type in (
+                    "text",
+                    "input_json",
+                ):
+                    metrics.time_to_first_token = time.monotonic() - start
+
+                if event.type == "text" and self._speech is not None:
+                    self._speech.feed(event.text)
+                elif (
+                    event.type == "content_block_stop"
+                    and event.content_block.type == "tool_use"
+                ):
+                    if metrics.time_to_first_tool_start is None:
+                        metrics.time_to_first_tool_start = time.monotonic() - start
+                    cb = event.content_block
+                    tool = self._tools.get(cb.name)
+                    if self._speech is not None and tool is not None and tool.exclusive:
+                        pending.append(cb)
+                    else:
+                        pending.append(self._dispatch(cb))
+            response = stream.get_final_message()
+
+        self._record_metrics(metrics, start)
+        return response, pending
+
+    def _dispatch(self, cb: ToolUseBlock) -> _PendingCall:
+        """Hands a tool call to the scheduler without waiting for it."""
+        tool = self._tools.get(cb.name)
+        if tool is None:
+            return cb, None
+        return cb, self._scheduler.submit(
+            tool, typing.cast(dict[str, typing.Any], cb.input)
+        )
+
+    def _tool_result(self, call: _PendingCall) -> ToolResultBlockParam:
+        """Waits for a dispatched tool call and wraps its output."""
+        cb, future = call
+        if future is None:
+            return _missing_tool_result(cb)
+        try:
+            return _tool_output_result(cb, future.result())
+        except ValidationError as e:
+            return _invalid_input_result(cb, e)
+        except TimeoutError as e:
+            return _tool_error_result(cb, str(e))
+        except Exception as e:
+            # Reported to the model, the other calls' results are kept
+            _logger.warning(f"Tool call `{cb.name}` failed: {e}")
+            return _tool_error_result(cb, str(e))
+
+    @typing.override
+    def _act(self) -> None:
+        model = self._choose_model()
+        pending: list[_PendingCall | ToolUseBlock]
+        try:
+            # The slot is held until the response is complete, not while its
+            # speech plays or its tool calls run
+            with self._llm_slot() as queued:
+                start = time.monotonic()
+                # Not current, tool calls dispatched while streaming belong to
+                # the request
+                with tracing.span(
+                    "llm.create",
+                    current=False,
+                    model=model,
+                    streaming=self._streaming,
+                ) as span:
+                    span.set(queued_ms=queued * 1000 if queued is not None else None)
+                    if self._streaming:
+                        response, pending = self._stream_response(model)
+                    else:
+                        response = self.create(model)
+                        pending = [
+                            self._dispatch(cb)
+                            for cb in response.content
+                            if cb.type == "tool_use"
+                        ]
+                    self._trace_response(span, response)
+                latency = time.monotonic() - start
+        finally:
+            if self._speech is not None:
+                self._speech.flush()
+
+        # Calls run concurrently, results are still reported in request order.
+        # Exclusive tools held back while streaming start now speech is done.
+        calls = [
+            self._dispatch(call) if isinstance(call, ToolUseBlock) else call
+            for call in pending
+        ]
+        results = [self._tool_result(call) for call in calls]
+        self._route_feedback(model, response, results, latency)
+        self._remember(response, results)
+
+
+class AsyncAnthropicAgent(_AnthropicAgentBase[_AnyAnthropicTool], AsyncAgent):
+    """asyncio variant of `AnthropicAgent`.
+
+    Responses are always streamed and each tool call becomes a task as soon
+    as its input is complete. `AsyncAnthropicTool`s run on the event loop,
+    plain `AnthropicTool`s are run on a worker thread. The same scheduling
+    hints as `ToolScheduler` apply: per-tool concurrency, timeouts and one
+    shared lock for exclusive tools.
+    """
+
+    _tools: dict[str, _AnyAnthropicTool]
+    _anthropic_client: anthropic.AsyncClient
+    _streaming = True
+
+    def __init__(
+        self,
+        directive: str,
+        max_tokens: int,
+        anthropic_client: anthropic.AsyncClient,
+        prompt_caching: bool = True,
+        memory: ConversationMemory | None = None,
+        router: ModelRouter | None = None,
+    ):
+        self._tools = dict[str, _AnyAnthropicTool]()
+        self.prompt_caching = prompt_caching
+        self.router = router
+        self._signals = RoutingSignals()
+        self._anthropic_client = anthropic_client
+        self._exclusive_lock = asyncio.Lock()
+        self._limits = dict[str, asyncio.Semaphore]()
+        self.last_turn_metrics = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        super().__init__(directive, max_tokens, memory)
+        if self._memory.summarize is None:
+            self._memory.summarize = self._summarize
+
+    def _summarize(self, previous: str | None, messages: list[MessageParam]) -> str:
+        """Runs on the memory's background thread, so the request is handed
+        back to the event loop the agent is running on."""
+        if self._loop is None:
+            raise RuntimeError("Agent hasn't acted on an event loop yet")
+        future = asyncio.run_coroutine_threadsafe(
+            self._anthropic_client.messages.create(
+                **self._summary_request(previous, messages)
+            ),
+            self._loop,
+        )
+        with tracing.span("llm.summarize") as span:
+            response = future.result()
+            self._trace_response(span, response)
+        return "".join(cb.text for cb in response.content if cb.type == "text")
+
+    async def create(self, model: str) -> Message:
+        return typing.cast(
+            Message,
+            await self._anthropic_client.messages.create(**self._request_params(model)),
+        )
+
+    async def sonnet(self) -> Message:
+        return await self.create(self.SONNET)
+
+    async def haiku(self) -> Message:
+        return await self.create(self.HAIKU)
+
+    async def _stream_response(
+        self, model: str
+    ) -> tuple[Message, list[_PendingAsyncCall]]:
+        metrics = TurnMetrics(model=model)
+        start = time.monotonic()
+        pending = list[_PendingAsyncCall]()
+        async with self._anthropic_client.messages.stream(
+            **self._request_params(model)
+        ) as stream:
+            async for event in stream:
+                if metrics.time_to_first_token is None and event.type in (
+                    "text",
+                    "input_json",
+                ):
+                    metrics.time_to_first_token = time.monotonic() - start
+                if (
+                    event.type == "content_block_stop"
+                    and event.content_block.type == "tool_use"
+                ):
+                    if metrics.time_to_first_tool_start is None:
+                        metrics.time_to_first_tool_start = time.monotonic() - start
+                    pending.append(self._dispatch(event.content_block))
+            response = await stream.get_final_message()
+
+        self._record_metrics(metrics, start)
+        return response, pending
+
+    def _dispatch(self, cb: ToolUseBlock) -> _PendingAsyncCall:
+        tool = self._tools.get(cb.name)
+        if tool is None:
+            return cb, None
+        input_ = typing.cast(dict[str, typing.Any], cb.input)
+        return cb, asyncio.create_task(self._run_tool(tool, input_))
+
+    async def _run_tool(
+        self, tool: _AnyAnthropicTool, input_: dict[str, typing.Any]
+    ) -> BaseModel:
+        limit: typing.AsyncContextManager[typing.Any] = contextlib.nullcontext()
+        if tool.max_concurrency is not None:
+            if tool.get_name() not in self._limits:
+                self._limits[tool.get_name()] = asyncio.Semaphore(tool.max_concurrency)
+            limit = self._limits[tool.get_name()]
+        exclusive: typing.AsyncContextManager[typing.Any] = contextlib.nullcontext()
+        if tool.exclusive:
+            exclusive = self._exclusive_lock
+
+        async with limit, exclusive:
+            if isinstance(tool, AsyncAnthropicTool):
+                return await tool.use(input_)
+            return await asyncio.to_thread(tool.use, input_)
+
+    async def _tool_result(self, call: _PendingAsyncCall) -> ToolResultBlockParam:
+        cb, task = call
+        if task is None:
+            return _missing_tool_result(cb)
+        tool = self._tools[cb.name]
+        try:
+            # Cancelled on timeout, so it lets go of its limit and lock
+            return _tool_output_result(cb, await asyncio.wait_for(task, tool.timeout))
+        except ValidationError as e:
+            return _invalid_input_result(cb, e)
+        except TimeoutError:
+            return _tool_error_result(
+                cb, f"`{cb.name}` did not finish within {tool.timeout}s"
+            )
+        except Exception as e:
+            _logger.warning(f"Tool call `{cb.name}` failed: {e}")
+            return _tool_error_result(cb, str(e))
+
+    @typing.override
+    async def _act(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        model = self._choose_model()
+        start = time.monotonic()
+        with tracing.span(
+            "llm.create", current=False, model=model, streaming=True
+        ) as span:
+            response, pending = await self._stream_response(model)
+            self._trace_response(span, response)
+        latency = time.monotonic() - start
+        results = await asyncio.gather(*(self._tool_result(call) for call in pending))
+        self._route_feedback(model, response, results, latency)
+        self._remember(response, results)
@@ -2,12 +2,65 @@ import os
 import typing
 
 
+class Room(typing.NamedTuple):
+    """An input device, and optionally the output device to answer on, served
+    by its own session. `None` is the system default device."""
+
+    name: str
+    input_device: int | None = None
+    output_device: int | None = None
+
+
+def _parse_rooms(value: str) -> list[Room]:
+    """`name=input[:output]` pairs separated by commas, device indices as
+    listed by PyAudio, e.g. `kitchen=2:3,office=5`."""
+    rooms = list[Room]()
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, devices = entry.partition("=")
+        input_device, _, output_device = devices.partition(":")
+        rooms.append(
+            Room(
+                name.strip(),
+                int(input_device) if input_device.strip() else None,
+                int(output_device) if output_device.strip() else None,
+            )
+        )
+    return rooms or [Room("default")]
+
+
 class Config:
     anthropic_api_key: str
     openai_api_key: str
     google_api_key: str
     google_search_engine_id: str
     loglevel: str
+    audio_debug_dir: str | None
+    audio_debug_max_files: int
+    audio_debug_max_bytes: int
+    pipelined_speech: bool
+    streaming_responses: bool
+    memory_token_budget: int
+    model_routing: bool
+    search_cache_ttl: float
+    search_cache_size: int
+    search_cache_path: str | None
+    browser_cache_dir: str | None
+    search_prefetch: int
+    transcription_backend: str
+    local_whisper_model: str
+    wake_word: str | None
+    activation_phrases: list[str]
+    fast_start: bool
+    trace_file: str | None
+    trace_otel: str | None
+    rooms: list[Room]
+    max_llm_calls: int
+    capture_buffer_ms: int
+    ingress_host: str
+    ingress_port: int | None
+    ingress_max_clients: int
 
     def __init__(self, *args: typing.Any, **kwargs: typing.Any):
         self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
@@ -15,3 +68,54 @@ class Config:
         self.google_api_key = os.environ.get("GOOGLE_API_KEY")
         self.google_search_engine_id = os.environ.get("GOOGLE_SEARCH_ENGINE_ID")
         self.loglevel = os.environ.get("LOGLEVEL", "INFO")
+        self.audio_debug_dir = os.environ.get("AUDIO_DEBUG_DIR")
+        self.audio_debug_max_files = int(os.environ.get("AUDIO_DEBUG_MAX_FILES", "100"))
+        self.audio_debug_max_bytes = int(
+            os.environ.get("AUDIO_DEBUG_MAX_BYTES", str(100 * 1024 * 1024))
+        )
+        self.pipelined_speech = (
+            os.environ.get("PIPELINED_SPEECH", "false").lower() == "true"
+        )
+        self.streaming_responses = (
+            os.environ.get("STREAMING_RESPONSES", "false").lower() == "true"
+        )
+        self.memory_token_budget = int(os.environ.get("MEMORY_TOKEN_BUDGET", "30000"))
+        self.model_routing = os.environ.get("MODEL_ROUTING", "false").lower() == "true"
+        self.search_cache_ttl = float(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+        self.search_cache_size = int(os.environ.get("SEARCH_CACHE_SIZE", "256"))
+        self.search_cache_path = os.environ.get("SEARCH_CACHE_PATH")
+        self.browser_cache_dir = os.environ.get("BROWSER_CACHE_DIR")
+        self.search_prefetch = int(os.environ.get("SEARCH_PREFETCH", "0"))
+        self.transcription_backend = os.environ.get("TRANSCRIPTION_BACKEND", "openai")
+        self.local_whisper_model = os.environ.get("LOCAL_WHISPER_MODEL", "base")
+        # "spotter", "transcript" or "both", unset transcribes every utterance
+        self.wake_word = os.environ.get("WAKE_WORD")
+        # Comma separated, any of them wakes the assistant up
+        self.activation_phrases = [
+            phrase.strip()
+            for phrase in os.environ.get(
+                "ACTIVATION_PHRASES", "jarvis,hey jarvis,oye jarvis"
+            ).split(",")
+            if phrase.strip()
+        ]
+        # Build SDK clients in the background instead of before listening
+        self.fast_start = os.environ.get("FAST_START", "false").lower() == "true"
+        # Spans are appended to this JSONL file, see `jarvis.utils.tracing`
+        self.trace_file = os.environ.get("TRACE_FILE")
+        # "console" or "otlp", needs opentelemetry-sdk (and the OTLP exporter)
+        self.trace_otel = os.environ.get("TRACE_OTEL")
+        # Satellites stream audio and commands to this port, see
+        # `jarvis.ingress`, unset turns the network ingress off. Bind to
+        # 0.0.0.0 to accept other devices
+        port = os.environ.get("INGRESS_PORT")
+        self.ingress_port = int(port) if port else None
+        self.ingress_host = os.environ.get("INGRESS_HOST", "127.0.0.1")
+        self.ingress_max_clients = int(os.environ.get("INGRESS_MAX_CLIENTS", "32"))
+        # One session per room, see `_parse_rooms`. Unset is a single session
+        # on the default devices, or none when the ingress is on
+        rooms = os.environ.get("ROOMS", "")
+        self.rooms = _parse_rooms(rooms) if rooms or self.ingress_port is None else []
+        # Model calls in flight at once, across every session
+        self.max_llm_calls = int(os.environ.get("MAX_LLM_CALLS", "4"))
+        # Audio kept per room while the agent is busy, about 64KB a second
+        self.capture_buffer_ms = int(os.environ.get("CAPTURE_BUFFER_MS", "30000"))
@@ -1,24 +1,48 @@
 from __future__ import annotations
 
+import contextlib
 import logging
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
 
-import anthropic
 import dotenv
-import openai
+import pyaudio
 import webrtcvad
-from anthropic.types import MessageParam, ToolParam
 from pydantic import BaseModel
 
-from jarvis.agents import AnthropicAgent
-from jarvis.config import Config
-from jarvis.tools import AudioTransciever
+from jarvis import utils
+from jarvis.config import Config, Room
+from jarvis.tools import (
+    AudioTransciever,
+    CascadeWakeWordDetector,
+    HttpCache,
+    LocalWhisperTranscriber,
+    OpenWakeWordDetector,
+    ResponseCache,
+    TranscriptionBackend,
+    TranscriptWakeWordDetector,
+    WakeWordDetector,
+)
 from jarvis.tools.audio_transciever import (
     AudioTranscieverControls,
     RecordAdaptiveVoiceInput,
+    RecordAdaptiveVoiceOutput,
+    SpeechPipeline,
 )
-from jarvis.tools.google_search import GoogleSearch
-from jarvis.tools.browser import Browser
-import googleapiclient
+from jarvis.utils import tracing
+from jarvis.utils.activation import ActivationMatcher
+from jarvis.utils.deferred import Deferred
+from jarvis.utils.limits import CallLimit
+
+if typing.TYPE_CHECKING:
+    import anthropic
+    import openai
+    from googleapiclient._apis.customsearch.v1 import CustomSearchAPIResource
+
+    from jarvis.agents import AnthropicAgent
+    from jarvis.ingress import IngressServer
+    from jarvis.tools._tool import AnthropicTool
 
 _logger = logging.getLogger(__name__)
 
@@ -30,113 +54,453 @@ class DaemonControl(BaseModel):
     activate: bool
 
 
-class Daemon:
+class Session:
+    """One room: its own capture and VAD pipeline, speaker and conversation
+    memory. The clients, tool caches and model call limit belong to the
+    `Daemon` and are shared by every session."""
+
+    name: str
     audio_transciever: AudioTransciever
-    anthropic_client: anthropic.Client
     jarvis_agent: AnthropicAgent
-    config: Config
+    activation_matcher: ActivationMatcher
 
     def __init__(
         self,
+        name: str,
         audio_transciever: AudioTransciever,
         jarvis_agent: AnthropicAgent,
-        config: Config,
-        anthropic_client: anthropic.Client,
+        activation_matcher: ActivationMatcher,
     ) -> None:
+        self.name = name
         self.audio_transciever = audio_transciever
         self.jarvis_agent = jarvis_agent
-        self.anthropic_client = anthropic_client
+        self.activation_matcher = activation_matcher
+        self._stopped = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._close_lock = threading.Lock()
+        self._closed = False
+
+    def run(self) -> None:
+        # A wake word detector has already vetted whatever gets transcribed
+        wake_word = self.audio_transciever.wake_word is not None
+        self._idle.clear()
+        try:
+            while not self._stopped.is_set():
+                with tracing.span("daemon.cycle", session=self.name) as cycle:
+                    cycle.set(activated=self._cycle(wake_word))
+        finally:
+            self._idle.set()
+
+    def stop(self) -> None:
+        """Stops once the current cycle is over, a request under way ends
+        after its current turn."""
+        self._stopped.set()
+        self._if_agent_built(lambda agent: agent.cancel())
+        self.audio_transciever.capture.interrupt()
+
+    def close(self) -> None:
+        """Stops the session and, once its current cycle is over, releases
+        what it owns: the transciever with its capture and wake word
+        detector, and the agent with its speech pipeline. The shared clients,
+        tools and transcribers are left to the `Daemon`. Closing it again
+        waits for the first close to finish."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self.stop()
+            self._idle.wait()
+            self._if_agent_built(lambda agent: agent.close())
+            self.audio_transciever.close()
+
+    def _if_agent_built(self, fn: typing.Callable[[AnthropicAgent], None]) -> None:
+        """Calls `fn` with the agent, unless it's deferred and was never
+        built, then there's nothing to cancel or close."""
+        agent = self.jarvis_agent
+        if isinstance(agent, Deferred):
+            agent.if_built(fn)
+        else:
+            fn(agent)
+
+    def submit(self, command: str) -> None:
+        """Queues a typed command, it doesn't need the wake phrase. Listening
+        is interrupted so it's handled right away, by the agent's next
+        recording when a request is under way."""
+        self.audio_transciever.submit(command)
+
+    def _cycle(self, wake_word: bool) -> bool:
+        """Takes the next command, or listens for one utterance, and hands it
+        to the agent if it's meant for it, returns whether it was."""
+        tool_output = self.audio_transciever.use(
+            AudioTranscieverControls(
+                input=RecordAdaptiveVoiceInput(wake_word=wake_word)
+            )
+        )
+        output = tool_output.output
+        if not isinstance(output, RecordAdaptiveVoiceOutput):
+            raise RuntimeError(f"Unable to listen: {tool_output.reason}")
+        text = output.text
+        command = output.typed
+
+        if text == "" or self._stopped.is_set():
+            return False
+        match = self.activation_matcher.search(text)
+        if match is None and not (wake_word or command):
+            return False
+        # Only what follows the wake phrase is meant for the agent
+        self.jarvis_agent.act(match.command if match and match.command else text)
+        return True
+
+
+class Daemon:
+    """Serves one session per room from a single process.
+
+    Each session captures from its own input device and keeps its own
+    conversation, while the SDK clients, the search and browser tools with
+    their caches, the tool thread pool and the PortAudio instance are shared.
+    Model calls from all sessions are bounded by one `CallLimit`.
+    """
+
+    config: Config
+    anthropic_client: anthropic.Client
+    openai_client: openai.Client
+    google_client: CustomSearchAPIResource
+    activation_matcher: ActivationMatcher
+    llm_limit: CallLimit
+    sessions: list[Session]
+    ingress: IngressServer | None
+    # Overridden by benchmarks that replay recorded audio, the agent type
+    # defaults to `AnthropicAgent`, imported when the first agent is built
+    transciever_type: type[AudioTransciever] = AudioTransciever
+    agent_type: type[AnthropicAgent] | None = None
+
+    def __init__(
+        self,
+        config: Config,
+        anthropic_client: anthropic.Client,
+        openai_client: openai.Client,
+        google_client: CustomSearchAPIResource,
+        transcriber: TranscriptionBackend | None = None,
+        debug_sink: utils.DebugSink | None = None,
+    ) -> None:
         self.config = config
+        self.anthropic_client = anthropic_client
+        self.openai_client = openai_client
+        self.google_client = google_client
+        self.activation_matcher = ActivationMatcher(config.activation_phrases)
+        self.llm_limit = CallLimit(config.max_llm_calls)
+        self.sessions = list[Session]()
+        self._transcriber = transcriber
+        self._debug_sink = debug_sink
+        self._pyaudio = pyaudio.PyAudio()
+        self.ingress = None
+        sessions = len(config.rooms)
+        if config.ingress_port is not None:
+            from jarvis.ingress import IngressServer
+
+            self.ingress = IngressServer(
+                self,
+                config.ingress_host,
+                config.ingress_port,
+                max_clients=config.ingress_max_clients,
+            )
+            sessions += config.ingress_max_clients
+        # Threads are only started as needed
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=8 * max(1, sessions), thread_name_prefix="jarvis-tool"
+        )
+        self._tools = Deferred(self._shared_tools, "tools")
+        # The transcript wake word model is loaded once for every session
+        self._wake_word_transcriber = None
+        if config.wake_word in ("transcript", "both"):
+            self._wake_word_transcriber = LocalWhisperTranscriber("tiny")
         logging.basicConfig(level=config.loglevel)
 
+    @property
+    def audio_transciever(self) -> AudioTransciever:
+        """The first session's, the only one unless several rooms are set."""
+        return self.sessions[0].audio_transciever
+
+    @property
+    def jarvis_agent(self) -> AnthropicAgent:
+        return self.sessions[0].jarvis_agent
+
     @classmethod
     def default(cls) -> Daemon:
         config = Config()
-        audio_transciever = AudioTransciever(
-            openai_client=openai.Client(
-                api_key=config.openai_api_key,
-            ),
+        _configure_tracing(config)
+        debug_sink = None
+        if config.audio_debug_dir is not None:
+            debug_sink = utils.DebugSink(
+                config.audio_debug_dir,
+                max_files=config.audio_debug_max_files,
+                max_bytes=config.audio_debug_max_bytes,
+            )
+        transcriber = None
+        if config.transcription_backend == "local":
+            transcriber = LocalWhisperTranscriber(config.local_whisper_model)
+
+        # SDK clients are slow to import and build, none of them are needed
+        # to start listening
+        openai_client = Deferred(lambda: _openai_client(config), "openai")
+        anthropic_client = Deferred(lambda: _anthropic_client(config), "anthropic")
+        google_client = Deferred(lambda: _google_client(config), "google")
+        daemon = cls(
+            config=config,
+            anthropic_client=typing.cast("anthropic.Client", anthropic_client),
+            openai_client=typing.cast("openai.Client", openai_client),
+            google_client=typing.cast("CustomSearchAPIResource", google_client),
+            transcriber=transcriber,
+            debug_sink=debug_sink,
+        )
+        for client in (openai_client, anthropic_client, google_client):
+            if config.fast_start:
+                # Built in the background while the microphone starts listening
+                client.warm()
+            else:
+                client.get()
+        for room in config.rooms:
+            daemon.add_session(room)
+        _logger.info(
+            f"Successfully started daemon with {len(daemon.sessions)} session(s)"
+        )
+        return daemon
+
+    def add_session(
+        self,
+        room: Room,
+        transciever_type: type[AudioTransciever] | None = None,
+        **transciever_kwargs: typing.Any,
+    ) -> Session:
+        """Starts serving a room with a transciever on its devices and an
+        agent with a memory of its own. A different kind of transciever, e.g.
+        one talking to a network client, takes its own arguments on top of
+        the shared ones."""
+        if transciever_type is None:
+            transciever_type = self.transciever_type
+        audio_transciever = transciever_type(
+            **transciever_kwargs,
+            openai_client=self.openai_client,
             vad=webrtcvad.Vad(mode=2),
+            debug_sink=self._debug_sink,
+            transcriber=self._transcriber,
+            input_device=room.input_device,
+            output_device=room.output_device,
+            pyaudio_instance=self._pyaudio,
+            capture_buffer_ms=self.config.capture_buffer_ms,
+        )
+        audio_transciever.wake_word = Daemon.wake_word_detector(
+            self.config.wake_word,
+            self.activation_matcher.matches,
+            self._wake_word_transcriber,
+        )
+        jarvis_agent = Deferred(
+            lambda: self._agent(audio_transciever), f"agent-{room.name}"
+        )
+        if self.config.fast_start:
+            jarvis_agent.warm()
+        else:
+            jarvis_agent.get()
+        session = Session(
+            room.name,
+            audio_transciever,
+            typing.cast("AnthropicAgent", jarvis_agent),
+            self.activation_matcher,
+        )
+        self.sessions.append(session)
+        return session
+
+    def remove_session(self, session: Session) -> None:
+        """Stops serving a session and closes it, blocks until a request
+        under way has ended. A session already removed is left as is."""
+        with contextlib.suppress(ValueError):
+            self.sessions.remove(session)
+        session.close()
+
+    def _shared_tools(self) -> list[AnthropicTool[typing.Any, typing.Any]]:
+        from jarvis.tools.browser import Browser
+        from jarvis.tools.google_search import GoogleSearch
+
+        config = self.config
+        browser = Browser(
+            cache=(
+                HttpCache(config.browser_cache_dir)
+                if config.browser_cache_dir is not None
+                else None
+            )
         )
         google_search = GoogleSearch(
-            googleapiclient.discovery.build(
-                "customsearch",
-                "v1",
-                developerKey=config.google_api_key,
-            ),
+            self.google_client,
             config.google_search_engine_id,
+            cache=ResponseCache(
+                max_entries=config.search_cache_size,
+                ttl=config.search_cache_ttl,
+                path=config.search_cache_path,
+            ),
+            browser=browser,
+            prefetch=config.search_prefetch,
         )
-        browser = Browser()
+        return [google_search, browser]
 
-        anthropic_client = anthropic.Client(api_key=config.anthropic_api_key)
-        jarvis_agent = AnthropicAgent(
-            directive="""
+    def _agent(self, audio_transciever: AudioTransciever) -> AnthropicAgent:
+        from jarvis.agents import (
+            AnthropicAgent,
+            ConversationMemory,
+            ModelRouter,
+            ToolScheduler,
+        )
+
+        config = self.config
+        directive = """
             You are an agent and your goal is to engage with the user and chat
             with to learn more about them. Use the transciever to prompt the
             user with questions and to hear their feedback. Tool use blocks
             should be kept separately from text blocks.
-            """,
+            """
+        speech = None
+        if config.pipelined_speech:
+            speech = SpeechPipeline(audio_transciever)
+            directive += """
+            Any text you write outside of tool use blocks is spoken out loud to
+            the user as it is written, there is no need to use the transciever
+            to speak.
+            """
+        agent_type = self.agent_type if self.agent_type is not None else AnthropicAgent
+        jarvis_agent = agent_type(
+            directive=directive,
             max_tokens=4096,
-            anthropic_client=anthropic_client,
+            anthropic_client=self.anthropic_client,
+            speech=speech,
+            streaming=config.streaming_responses,
+            # Its own exclusive lock, sessions only keep their own microphone
+            # and speaker to themselves
+            scheduler=ToolScheduler(executor=self._tool_executor),
+            memory=ConversationMemory(token_budget=config.memory_token_budget),
+            router=(
+                ModelRouter(AnthropicAgent.HAIKU, AnthropicAgent.SONNET)
+                if config.model_routing
+                else None
+            ),
+            llm_limit=self.llm_limit,
         )
         jarvis_agent.register_tool(audio_transciever)
-        jarvis_agent.register_tool(google_search)
-        jarvis_agent.register_tool(browser)
-        daemon = Daemon(
-            audio_transciever=audio_transciever,
-            jarvis_agent=jarvis_agent,
-            config=config,
-            anthropic_client=anthropic_client,
-        )
-        _logger.info("Successfully started daemon")
-        return daemon
+        for tool in self._tools.get():
+            jarvis_agent.register_tool(tool)
+        return jarvis_agent
 
-    def activation_func(self, activation_phrase, sensitivity, input_):
-        """Scans through the input and checks if a a word
-        similar to the activation phrase can be found. Activation is triggered
-        based on the configured sensitivity. Higher sensitivity will match words
-        with only a few similar characters while lower sensitivity requires matching
-        more characters.
-        """
-
-        ap_idx = 0
-        left = 0
-        activation_phrase_map = dict()
-        for char in activation_phrase.lower():
-            cnt = activation_phrase_map.get(char, 0)
-            activation_phrase_map[char] = cnt + 1
-
-        input_ = input_.lower()
-        matches = 0
-        for right, char in enumerate(input_):
-            if (
-                input_[right] in activation_phrase_map
-                and activation_phrase_map[input_[right]] == 0
-            ):
-                while activation_phrase_map[input_[right]] == 0:
-                    if input_[left] in activation_phrase_map:
-                        activation_phrase_map[input_[left]] += 1
-                    left += 1
-            elif input_[right] not in activation_phrase_map:
-                while left <= right:
-                    if input_[left] in activation_phrase_map:
-                        activation_phrase_map[input_[left]] += 1
-                    left += 1
-            else:
-                matches = max(matches, right - left + 1)
-                activation_phrase_map[input_[right]] -= 1
+    @staticmethod
+    def wake_word_detector(
+        kind: str | None,
+        matches: typing.Callable[[str], bool],
+        transcriber: TranscriptionBackend | None = None,
+    ) -> WakeWordDetector | None:
+        """Builds the on-device stage that gates transcription, see
+        `Config.wake_word`. `matches` checks a transcript for the wake word,
+        `transcriber` is the cheap model used to get one, by default a tiny
+        local Whisper."""
+        if kind is None:
+            return None
 
-        portion = matches / len(activation_phrase)
-        return portion > (1.0 - sensitivity)
+        detectors = list[WakeWordDetector]()
+        if kind in ("spotter", "both"):
+            detectors.append(OpenWakeWordDetector())
+        if kind in ("transcript", "both"):
+            detectors.append(
+                TranscriptWakeWordDetector(
+                    (
+                        transcriber
+                        if transcriber is not None
+                        else LocalWhisperTranscriber("tiny")
+                    ),
+                    matches,
+                    # One passed in is shared, it's closed by its owner
+                    close_transcriber=transcriber is None,
+                )
+            )
+        if not detectors:
+            raise ValueError(f"Unknown wake word detector `{kind}`")
+        if len(detectors) == 1:
+            return detectors[0]
+        return CascadeWakeWordDetector(*detectors)
 
     def run(self) -> None:
-        activation_phrase = "jarvis"
-        while True:
-            tool_output = self.audio_transciever.use(
-                AudioTranscieverControls(input=RecordAdaptiveVoiceInput())
-            )
+        """Runs every session, and the network ingress if enabled, until
+        they're stopped, each on its own thread when there are several.
+        Sessions of network clients run on threads of their own."""
+        threads = [
+            threading.Thread(target=session.run, name=f"session-{session.name}")
+            for session in self.sessions
+        ]
+        if self.ingress is not None:
+            threads.append(threading.Thread(target=self.ingress.run, name="ingress"))
+        if len(threads) == 1:
+            threads[0].run()
+            return
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self) -> None:
+        """Stops every session and, once their requests have ended and
+        they're closed, releases what they share."""
+        if self.ingress is not None:
+            self.ingress.stop()
+        sessions = list(self.sessions)
+        # All told to stop first, so they wind down together
+        for session in sessions:
+            session.stop()
+        for session in sessions:
+            self.remove_session(session)
+        for transcriber in (self._transcriber, self._wake_word_transcriber):
+            if transcriber is not None:
+                transcriber.close()
+        self._transcriber = self._wake_word_transcriber = None
+        self._tool_executor.shutdown(wait=False, cancel_futures=True)
+        self._pyaudio.terminate()
+
+
+def _openai_client(config: Config) -> openai.Client:
+    import openai
+
+    return openai.Client(api_key=config.openai_api_key)
+
+
+def _anthropic_client(config: Config) -> anthropic.Client:
+    import anthropic
+
+    return anthropic.Client(api_key=config.anthropic_api_key)
+
+
+def _google_client(config: Config) -> CustomSearchAPIResource:
+    import googleapiclient.discovery
+
+    # The discovery document ships with the client library, read it from
+    # there instead of fetching it, and skip the discovery file cache
+    return googleapiclient.discovery.build(
+        "customsearch",
+        "v1",
+        developerKey=config.google_api_key,
+        static_discovery=True,
+        cache_discovery=False,
+    )
+
+
+def _configure_tracing(config: Config) -> None:
+    tracer = tracing.get_tracer()
+    if config.trace_file is not None:
+        tracer.add_exporter(tracing.JsonlExporter(config.trace_file))
+    if config.trace_otel == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        tracer.add_exporter(tracing.OpenTelemetryExporter(ConsoleSpanExporter()))
+    elif config.trace_otel == "otlp":
+        # Configured through the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
 
-            if tool_output.output.text != "" and self.activation_func(
-                activation_phrase, 0.50, tool_output.output.text
-            ):
-                self.jarvis_agent.act(tool_output.output.text)
+        tracer.add_exporter(tracing.OpenTelemetryExporter(OTLPSpanExporter()))
+    elif config.trace_otel is not None:
+        raise ValueError(f"Unknown OpenTelemetry exporter `{config.trace_otel}`")
@@ -0,0 +1,393 @@
+"""Network ingress: satellites in other rooms stream audio to the daemon.
+
+Each client connection gets a session of its own, with its own VAD,
+activation and agent memory, exactly like a local microphone. Audio it
+sends goes through the same pipeline, the agent's speech is streamed back
+over the same connection.
+
+The protocol is a stream of messages over TCP, each a one byte kind and a
+four byte big-endian payload length followed by the payload:
+
+  client -> server
+    H  hello, JSON `{"room": name, "rate": sample rate}`, optional, first
+    A  16-bit signed little-endian mono PCM at the hello's rate, in chunks
+       of any size
+    T  a typed command, UTF-8, handed to the agent without a wake phrase
+
+  server -> client
+    H  hello reply, JSON `{"session": name, "rate": ..., "tts_rate": ...}`
+    T  transcript of an utterance, UTF-8
+    A  speech, 16-bit mono PCM at `tts_rate`
+    D  the end of a piece of speech
+    E  error, UTF-8, the connection is closed after it
+
+Backpressure goes both ways. Audio is no longer read from a client whose
+buffer is full, until the session catches up, so the client's writes
+stall instead of audio being dropped. Speech is written no faster than
+the client reads it.
+
+A satellite streaming a recording and saving the reply:
+
+    python -m jarvis.ingress --port 8765 --wav request.wav --out reply.wav
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import struct
+import threading
+import time
+import typing
+import wave
+
+from jarvis.config import Room
+from jarvis.tools.audio_transciever import AudioTransciever
+from jarvis.utils import tracing
+from jarvis.utils.capture import RemoteCapture
+
+if typing.TYPE_CHECKING:
+    from jarvis.daemon import Daemon, Session
+
+_logger = logging.getLogger(__name__)
+
+HELLO = b"H"
+AUDIO = b"A"
+TEXT = b"T"
+DONE = b"D"
+ERROR = b"E"
+
+# Rates webrtcvad accepts
+RATES = (8_000, 16_000, 32_000, 48_000)
+MAX_PAYLOAD = 1 << 20
+# Longest a session waits on a client to read its speech
+SEND_TIMEOUT = 30.0
+
+_HEADER = struct.Struct(">cI")
+
+
+def encode_message(kind: bytes, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+    """Raises `asyncio.IncompleteReadError` once the peer has gone away."""
+    kind, size = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > MAX_PAYLOAD:
+        raise ValueError(f"Message of {size} bytes is too large")
+    return kind, await reader.readexactly(size)
+
+
+class Connection:
+    """Server side of a client connection. Messages can be sent from any
+    thread, writes are serialized and wait for the socket to drain."""
+
+    def __init__(
+        self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop
+    ) -> None:
+        self._writer = writer
+        self._loop = loop
+        self._lock = asyncio.Lock()
+
+    async def send(self, kind: bytes, payload: bytes = b"") -> None:
+        async with self._lock:
+            self._writer.write(encode_message(kind, payload))
+            await self._writer.drain()
+
+    def send_threadsafe(self, kind: bytes, payload: bytes = b"") -> None:
+        """Blocks until the message has been handed to the socket, raises if
+        the client has gone away."""
+        asyncio.run_coroutine_threadsafe(self.send(kind, payload), self._loop).result(
+            SEND_TIMEOUT
+        )
+
+
+class RemoteTransciever(AudioTransciever):
+    """Listens to and speaks through a client connection instead of the
+    local devices."""
+
+    capture: RemoteCapture
+    connection: Connection
+
+    def __init__(self, connection: Connection, rate: int, **kwargs: typing.Any):
+        self.connection = connection
+        # Shadows the class wide rate of the local microphone
+        self.RATE = rate
+        super().__init__(**kwargs)
+
+    @typing.override
+    def _new_capture(
+        self, input_device: int | None, capture_buffer_ms: int
+    ) -> RemoteCapture:
+        return RemoteCapture(
+            self.RATE, self.FRAME_DURATION_MS, max_buffered_ms=capture_buffer_ms
+        )
+
+    @typing.override
+    def _transcribe(self, pcm: bytes | bytearray, filename: str) -> str:
+        text = super()._transcribe(pcm, filename)
+        self.connection.send_threadsafe(TEXT, text.encode())
+        return text
+
+    @typing.override
+    def _play_pcm(
+        self, chunks: typing.Iterable[bytes], started_at: float | None = None
+    ) -> None:
+        size = 0
+        with tracing.span("tts.playback", remote=True) as span, self.capture.muted():
+            for chunk in chunks:
+                if started_at is not None:
+                    self._record_time_to_first_audio(started_at)
+                    started_at = None
+                self.connection.send_threadsafe(AUDIO, chunk)
+                size += len(chunk)
+            self.connection.send_threadsafe(DONE)
+            span.set(bytes=size, audio_seconds=size / 2 / self.TTS_RATE)
+
+
+class IngressServer:
+    """Accepts clients over TCP, see the module docstring for the protocol,
+    and serves each one with its own `Daemon` session for as long as it
+    stays connected. At most `max_clients` are served at once."""
+
+    host: str
+    port: int
+    max_clients: int
+
+    def __init__(
+        self, daemon: Daemon, host: str, port: int, max_clients: int = 32
+    ) -> None:
+        self.daemon = daemon
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self._server: asyncio.Server | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._writers = set[asyncio.StreamWriter]()
+
+    async def start(self) -> None:
+        """Starts accepting clients, with port 0 `port` is set to the one
+        picked by the OS."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        _logger.info(f"[ingress] listening on {self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    def run(self) -> None:
+        """Serves on an event loop of its own until `stop()`."""
+        asyncio.run(self.serve_forever())
+
+    def stop(self) -> None:
+        """Callable from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.close(), self._loop)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        connection = Connection(writer, asyncio.get_running_loop())
+        host, port = writer.get_extra_info("peername")[:2]
+        session: Session | None = None
+        try:
+            if len(self._writers) >= self.max_clients:
+                raise ValueError("Too many clients")
+            self._writers.add(writer)
+            kind, payload = await read_message(reader)
+            hello = json.loads(payload) if kind == HELLO else {}
+            rate = int(hello.get("rate", 16_000))
+            if rate not in RATES:
+                raise ValueError(f"Unsupported sample rate {rate}, use one of {RATES}")
+            name = str(hello.get("room") or f"{host}:{port}")
+
+            # Builds the session's agent, which may take a while
+            session = await asyncio.to_thread(
+                self.daemon.add_session,
+                Room(name),
+                RemoteTransciever,
+                connection=connection,
+                rate=rate,
+            )
+            await connection.send(
+                HELLO,
+                json.dumps(
+                    {
+                        "session": name,
+                        "rate": rate,
+                        "tts_rate": AudioTransciever.TTS_RATE,
+                    }
+                ).encode(),
+            )
+            threading.Thread(
+                target=session.run, name=f"session-{name}", daemon=True
+            ).start()
+            _logger.info(f"[ingress] {host}:{port} connected as `{name}`")
+
+            if kind != HELLO:
+                await self._receive(session, kind, payload)
+            while True:
+                kind, payload = await read_message(reader)
+                await self._receive(session, kind, payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            _logger.warning(f"[ingress] {host}:{port}: {e}")
+            with contextlib.suppress(ConnectionError):
+                await connection.send(ERROR, str(e).encode())
+        finally:
+            if session is not None:
+                # Waits for the session's request, and may build its agent
+                await asyncio.to_thread(self.daemon.remove_session, session)
+            self._writers.discard(writer)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+            _logger.info(f"[ingress] {host}:{port} disconnected")
+
+    async def _receive(self, session: Session, kind: bytes, payload: bytes) -> None:
+        if kind == AUDIO:
+            capture = typing.cast(RemoteCapture, session.audio_transciever.capture)
+            view = memoryview(payload)
+            while view:
+                # Stops reading from the client until the session catches up
+                while (room := capture.room()) == 0:
+                    await asyncio.sleep(capture.frame_duration_ms / 1000)
+                capture.push(view[:room])
+                view = view[room:]
+        elif kind == TEXT:
+            session.submit(payload.decode())
+        else:
+            raise ValueError(f"Unknown message kind {kind!r}")
+
+
+class IngressClient:
+    """Client side of the protocol, for satellites and tests."""
+
+    session: str
+    rate: int
+    tts_rate: int
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(
+        cls, host: str, port: int, room: str | None = None, rate: int = 16_000
+    ) -> IngressClient:
+        client = cls(*await asyncio.open_connection(host, port))
+        await client._send(HELLO, json.dumps({"room": room, "rate": rate}).encode())
+        kind, payload = await client.receive()
+        if kind != HELLO:
+            await client.close()
+            raise ConnectionError(payload.decode())
+        hello = json.loads(payload)
+        client.session = hello["session"]
+        client.rate = hello["rate"]
+        client.tts_rate = hello["tts_rate"]
+        return client
+
+    async def _send(self, kind: bytes, payload: bytes) -> None:
+        self._writer.write(encode_message(kind, payload))
+        # Waits while the server holds off reading
+        await self._writer.drain()
+
+    async def send_audio(self, pcm: bytes) -> None:
+        await self._send(AUDIO, pcm)
+
+    async def send_text(self, text: str) -> None:
+        await self._send(TEXT, text.encode())
+
+    async def receive(self) -> tuple[bytes, bytes]:
+        return await read_message(self._reader)
+
+    async def close(self) -> None:
+        self._writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self._writer.wait_closed()
+
+
+async def _satellite(args: argparse.Namespace) -> None:
+    rate = 16_000
+    pcm = b""
+    if args.wav is not None:
+        with wave.open(args.wav, "rb") as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                raise ValueError(f"{args.wav}: expected 16-bit mono audio")
+            rate, pcm = wf.getframerate(), wf.readframes(wf.getnframes())
+    client = await IngressClient.connect(args.host, args.port, args.room, rate)
+
+    async def stream() -> None:
+        if args.text is not None:
+            await client.send_text(args.text)
+            return
+        # In real time, with a second of silence to close the utterance
+        chunk = rate * 2 // 50
+        for offset in range(0, len(pcm) + rate * 2, chunk):
+            await client.send_audio(pcm[offset : offset + chunk].ljust(chunk, b"\0"))
+            await asyncio.sleep(0.02)
+
+    sender = asyncio.create_task(stream())
+    speech = bytearray()
+    start = time.monotonic()
+    while True:
+        kind, payload = await client.receive()
+        if kind == TEXT:
+            print(f"heard: {payload.decode()}")
+        elif kind == AUDIO:
+            if not speech:
+                print(f"first audio after {time.monotonic() - start:.2f}s")
+            speech += payload
+        elif kind == ERROR:
+            raise ConnectionError(payload.decode())
+        elif kind == DONE:
+            break
+    sender.cancel()
+    await client.close()
+
+    print(f"received {len(speech) / 2 / client.tts_rate:.1f}s of speech")
+    if args.out is not None:
+        with wave.open(args.out, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(client.tts_rate)
+            out.writeframes(speech)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m jarvis.ingress",
+        description="Sends a recording or a command to a daemon's ingress and"
+        " waits for the first spoken reply.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--room", default=None)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--wav", help="16-bit mono recording of a request")
+    source.add_argument("--text", help="typed command")
+    parser.add_argument("--out", help="WAV file the reply is written to")
+    asyncio.run(_satellite(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,29 @@
+from jarvis.tools._cache import ResponseCache
+from jarvis.tools._http_cache import HttpCache
+from jarvis.tools._transcription import (
+    LocalWhisperTranscriber,
+    OpenAITranscriber,
+    TranscriptionBackend,
+)
+from jarvis.tools._wakeword import (
+    CascadeWakeWordDetector,
+    OpenWakeWordDetector,
+    TranscriptWakeWordDetector,
+    WakeWordDetector,
+    WakeWordStats,
+)
 from jarvis.tools.audio_transciever import AudioTransciever
 
-__all__ = ["AudioTransciever"]
+__all__ = [
+    "AudioTransciever",
+    "CascadeWakeWordDetector",
+    "HttpCache",
+    "LocalWhisperTranscriber",
+    "OpenAITranscriber",
+    "OpenWakeWordDetector",
+    "ResponseCache",
+    "TranscriptWakeWordDetector",
+    "TranscriptionBackend",
+    "WakeWordDetector",
+    "WakeWordStats",
+]
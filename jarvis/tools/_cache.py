@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+from pydantic import BaseModel
+
+if typing.TYPE_CHECKING:
+    import sqlite3
+
+_logger = logging.getLogger(__name__)
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # lookups that waited on an identical in-flight call
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace insensitive form of a search query."""
+    return " ".join(query.casefold().split())
+
+
+class ResponseCache:
+    """LRU cache of serialized tool responses with a time to live.
+
+    Entries are kept in memory up to `max_entries`, least recently used first
+    out. With `path` set, entries are also written through to a SQLite file
+    and read back on a miss, so they survive restarts. Hits don't write to
+    the file, when entries were last used is written with the next store.
+
+    `get_or_compute` and `aget_or_compute` also coalesce identical lookups
+    that are in flight at the same time, the value is computed once and
+    every caller gets the same result. Failures aren't cached.
+    """
+
+    max_entries: int
+    ttl: float
+    path: str | None
+    stats: CacheStats
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        path: str | None = None,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries = collections.OrderedDict[str, tuple[float, str]]()
+        self._lock = threading.Lock()
+        self._in_flight = dict[str, Future[str]]()
+        self._in_flight_async = dict[str, asyncio.Future[str]]()
+        # When entries were last used, not yet written to the file
+        self._used = dict[str, float]()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            import sqlite3
+
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache"
+                " (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)"
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._used.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._write_used()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def get_or_compute(self, key: str, compute: typing.Callable[[], str]) -> str:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.stats.hits += 1
+                return value
+            future = self._in_flight.get(key)
+            owner = future is None
+            if future is None:
+                self.stats.misses += 1
+                future = self._in_flight[key] = Future[str]()
+            else:
+                self.stats.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        # Stored before the call stops being in flight, so a lookup in
+        # between finds one or the other
+        with self._lock:
+            self._store(key, value)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    async def aget_or_compute(
+        self, key: str, compute: typing.Callable[[], typing.Awaitable[str]]
+    ) -> str:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.stats.hits += 1
+                return value
+            future = self._in_flight_async.get(key)
+            if future is not None:
+                self.stats.coalesced += 1
+            else:
+                self.stats.misses += 1
+
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._in_flight_async[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+        except BaseException as e:
+            del self._in_flight_async[key]
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited on isn't logged
+            future.exception()
+            raise
+        with self._lock:
+            self._store(key, value)
+        del self._in_flight_async[key]
+        future.set_result(value)
+        return value
+
+    def _lookup(self, key: str) -> str | None:
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT expires, value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= now:
+            self._forget(key)
+            return None
+        self._entries.move_to_end(key)
+        if self._db is not None:
+            # Keeps the file's eviction least recently used, not first in
+            self._used[key] = now
+        return value
+
+    def _store(self, key: str, value: str) -> None:
+        entry = (self._clock() + self.ttl, value)
+        self._remember(key, entry)
+        if self._db is not None:
+            self._write_used()
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, value, entry[0], self._clock()),
+            )
+            self._db.execute(
+                "DELETE FROM cache WHERE key NOT IN"
+                " (SELECT key FROM cache ORDER BY used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _write_used(self) -> None:
+        assert self._db is not None
+        if self._used:
+            self._db.executemany(
+                "UPDATE cache SET used = ? WHERE key = ?",
+                [(used, key) for key, used in self._used.items()],
+            )
+            self._used.clear()
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._used.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._db.commit()
@@ -0,0 +1,281 @@
+import codecs
+import importlib.util
+import logging
+import re
+import typing
+from html.parser import HTMLParser
+
+from pydantic import BaseModel
+
+_logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+CHUNK_SIZE = 64 * 1024
+
+# Text in these never reaches the model
+_SKIP_TAGS = frozenset(
+    {
+        "aside",
+        "button",
+        "footer",
+        "head",
+        "iframe",
+        "nav",
+        "noscript",
+        "script",
+        "select",
+        "style",
+        "svg",
+        "template",
+    }
+)
+_MAIN_TAGS = frozenset({"main", "article"})
+# Below this much text a <main>/<article> is assumed to be a stray wrapper
+_MIN_MAIN_CHARS = 200
+# Without a main element parsing stops after this many pages worth of text
+_MAX_PAGES_SCANNED = 8
+_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+_HEADER_CHARSET = re.compile(r"""charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+BACKENDS = ("lxml", "html.parser")
+DEFAULT_BACKEND = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+class ExtractedPage(BaseModel):
+    text: str
+    page: int
+    has_more: bool
+
+
+class _BudgetReached(Exception):
+    pass
+
+
+class _TextCollector:
+    """Parser target collecting text outside of boilerplate tags.
+
+    Text inside `<main>`/`<article>` is also collected on its own so it can be
+    preferred over the whole document. Raises `_BudgetReached` once enough
+    text has been seen, so the rest of the document is never parsed.
+    """
+
+    def __init__(self, sep_len: int, need_chars: int) -> None:
+        self.sep_len = sep_len
+        self.need_chars = need_chars
+        self.blocks = list[str]()
+        self.main_blocks = list[str]()
+        self.chars = 0
+        self.main_chars = 0
+        self.truncated = False
+        self._skipping = list[str]()
+        self._main_depth = 0
+        self._pending = list[str]()
+
+    def start(self, tag: str, attrib: typing.Any = None) -> None:
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag == "body":
+            # An unclosed <head> ends here
+            self._skipping.clear()
+        elif tag in _SKIP_TAGS:
+            self._skipping.append(tag)
+        elif tag in _MAIN_TAGS:
+            self._main_depth += 1
+
+    def end(self, tag: str) -> None:
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if self._skipping and self._skipping[-1] == tag:
+            self._skipping.pop()
+        elif tag in _MAIN_TAGS and self._main_depth > 0:
+            self._main_depth -= 1
+
+    def data(self, text: str) -> None:
+        if not self._skipping:
+            self._pending.append(text)
+
+    def close(self) -> None:
+        self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        text = " ".join("".join(self._pending).split())
+        self._pending.clear()
+        if not text:
+            return
+
+        self.blocks.append(text)
+        self.chars += len(text) + self.sep_len
+        if self._main_depth > 0:
+            self.main_blocks.append(text)
+            self.main_chars += len(text) + self.sep_len
+
+        if not self.truncated and (
+            self.main_chars > self.need_chars
+            or self.chars > self.need_chars * _MAX_PAGES_SCANNED
+        ):
+            self.truncated = True
+            raise _BudgetReached()
+
+    def content(self) -> list[str]:
+        if self.main_chars >= _MIN_MAIN_CHARS:
+            return self.main_blocks
+        return self.blocks
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target: _TextCollector) -> None:
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag: str, attrs: typing.Any) -> None:
+        self.target.start(tag)
+
+    def handle_startendtag(self, tag: str, attrs: typing.Any) -> None:
+        pass
+
+    def handle_endtag(self, tag: str) -> None:
+        self.target.end(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.target.data(data)
+
+
+def charset_from_header(content_type: str | None) -> str | None:
+    """Charset named by a `Content-Type` header, if any."""
+    if content_type is None:
+        return None
+    match = _HEADER_CHARSET.search(content_type)
+    return match.group(1) if match is not None else None
+
+
+def _sniff_encoding(head: bytes, declared: str | None = None) -> str:
+    """Encoding declared by the response or else a `<meta charset>`.
+    Undeclared pages are UTF-8 when they decode as such, Windows-1252
+    otherwise."""
+    candidates = [declared] if declared is not None else []
+    match = _CHARSET.search(head[:4096])
+    if match is not None:
+        candidates.append(match.group(1).decode("ascii", "replace"))
+    for candidate in candidates:
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            pass
+    try:
+        # Not final, a character cut off at the end of the chunk is fine
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _parse_stdlib(
+    chunks: typing.Iterator[bytes], target: _TextCollector, encoding: str | None
+) -> None:
+    first = next(chunks, b"")
+    decoder = codecs.getincrementaldecoder(_sniff_encoding(first, encoding))("replace")
+
+    parser = _StdlibParser(target)
+    parser.feed(decoder.decode(first))
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+
+
+def _parse_lxml(
+    chunks: typing.Iterator[bytes], target: _TextCollector, encoding: str | None
+) -> None:
+    from lxml import etree
+
+    first = next(chunks, b"")
+    parser = etree.HTMLParser(
+        target=target, encoding=_sniff_encoding(first, encoding), no_network=True
+    )
+    parser.feed(first)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+def _chunked(content: bytes | typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+    if not isinstance(content, (bytes, bytearray)):
+        yield from content
+        return
+    view = memoryview(content)
+    for offset in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[offset : offset + CHUNK_SIZE])
+
+
+def _paginate(
+    blocks: list[str], sep: str, page_chars: int, page: int
+) -> tuple[str, bool]:
+    """Greedily packs blocks into pages of at most `page_chars`, returns the
+    requested page and whether anything follows it."""
+    current = list[str]()
+    size = 0
+    number = 1
+    for block in blocks:
+        while block:
+            sep_len = len(sep) if current else 0
+            room = page_chars - size - sep_len
+            # Start a new page rather than split a block that fits on one
+            if current and (room <= 0 or room < len(block) <= page_chars):
+                if number == page:
+                    return sep.join(current), True
+                current, size, number = list[str](), 0, number + 1
+                continue
+            piece, block = block[:room], block[room:]
+            current.append(piece)
+            size += len(piece) + sep_len
+    if number == page:
+        return sep.join(current), False
+    return "", False
+
+
+def extract_text(
+    content: bytes | typing.Iterable[bytes],
+    sep: str,
+    max_tokens: int = 4000,
+    page: int = 1,
+    backend: str | None = None,
+    encoding: str | None = None,
+) -> ExtractedPage:
+    """Extracts the readable text of an HTML document.
+
+    The document is parsed incrementally, chunk by chunk, skipping scripts,
+    styles and navigation boilerplate and preferring the `<main>`/`<article>`
+    content when there is any. Text is split into pages of about
+    `max_tokens` and only page `page` (1-based) is returned. Parsing stops
+    as soon as enough text for the requested page has been seen.
+
+    `backend` is "lxml" or "html.parser", lxml is used when installed.
+    `encoding` is the charset the response declared, it takes precedence
+    over one declared by the document.
+    """
+    backend = backend if backend is not None else DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown html backend `{backend}`, expected one of {BACKENDS}"
+        )
+    page = max(1, page)
+    page_chars = max(1, max_tokens) * CHARS_PER_TOKEN
+    target = _TextCollector(len(sep), page * page_chars)
+
+    try:
+        if backend == "lxml":
+            _parse_lxml(_chunked(content), target, encoding)
+        else:
+            _parse_stdlib(_chunked(content), target, encoding)
+    except _BudgetReached:
+        pass
+    target.close()
+
+    text, has_more = _paginate(target.content(), sep, page_chars, page)
+    return ExtractedPage(text=text, page=page, has_more=has_more or target.truncated)
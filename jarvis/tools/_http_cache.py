@@ -0,0 +1,187 @@
+import email.utils
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import typing
+
+from pydantic import BaseModel, ConfigDict
+
+from jarvis.utils import FileRetention
+
+_logger = logging.getLogger(__name__)
+
+
+class HttpCacheEntry(BaseModel):
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
+    url: str
+    etag: str | None = None
+    last_modified: str | None = None
+    expires: float = 0.0
+    content_type: str | None = None
+    body: bytes = b""
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        return (now if now is not None else time.time()) < self.expires
+
+    def validators(self) -> dict[str, str]:
+        """Headers turning a request for this URL into a conditional one."""
+        headers = dict[str, str]()
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """On-disk cache of fetched pages honoring `Cache-Control`, `Expires`,
+    `ETag` and `Last-Modified`.
+
+    A fresh entry is served without touching the network. A stale entry with
+    validators is revalidated with a conditional request, so an unchanged
+    page costs a 304 instead of a full download. Responses marked `no-store`
+    or carrying neither freshness information nor validators aren't kept.
+
+    The oldest entries are removed once `max_entries` or `max_bytes` is
+    exceeded.
+    """
+
+    directory: str
+    max_entries: int
+    max_bytes: int
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: int = 512,
+        max_bytes: int = 50 * 1024 * 1024,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._retention = FileRetention(directory, max_entries, max_bytes, ".json")
+        os.makedirs(directory, exist_ok=True)
+
+    def lookup(self, url: str) -> HttpCacheEntry | None:
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                entry = HttpCacheEntry.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            _logger.warning(f"Dropping unreadable http cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        return entry if entry.url == url else None
+
+    def is_fresh(self, entry: HttpCacheEntry) -> bool:
+        """Whether `entry` can be served without revalidating it, by the
+        cache's clock."""
+        return entry.is_fresh(self._clock())
+
+    def store(
+        self, url: str, headers: typing.Mapping[str, str], body: bytes
+    ) -> HttpCacheEntry | None:
+        """Caches a 200 response, returns the entry or None if the response
+        isn't cacheable."""
+        directives = _cache_control(headers)
+        if "no-store" in directives:
+            return None
+        entry = HttpCacheEntry(
+            url=url,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            expires=self._expires(headers, directives),
+            content_type=headers.get("Content-Type"),
+            body=body,
+        )
+        if not entry.is_fresh(self._clock()) and not entry.validators():
+            return None
+        self._write(entry)
+        return entry
+
+    def refresh(
+        self, entry: HttpCacheEntry, headers: typing.Mapping[str, str]
+    ) -> HttpCacheEntry:
+        """Updates an entry after the server answered 304 Not Modified."""
+        directives = _cache_control(headers)
+        entry = entry.model_copy(
+            update=dict(
+                etag=headers.get("ETag", entry.etag),
+                last_modified=headers.get("Last-Modified", entry.last_modified),
+                expires=self._expires(headers, directives),
+            )
+        )
+        self._write(entry)
+        return entry
+
+    def clear(self) -> None:
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    self._remove(entry.path)
+        self._retention.reset()
+
+    def _expires(
+        self, headers: typing.Mapping[str, str], directives: dict[str, str | None]
+    ) -> float:
+        now = self._clock()
+        if "no-cache" in directives:
+            return now
+        max_age = directives.get("max-age")
+        if max_age is not None:
+            try:
+                return now + max(0, int(max_age))
+            except ValueError:
+                return now
+        expires = headers.get("Expires")
+        if expires is not None:
+            try:
+                return email.utils.parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                return now
+        return now
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _write(self, entry: HttpCacheEntry) -> None:
+        path = self._path(entry.url)
+        tmp: str | None = None
+        try:
+            # A file of its own, concurrent writes of one URL don't collide
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory, suffix=".tmp", delete=False
+            ) as f:
+                tmp = f.name
+                data = entry.model_dump_json().encode()
+                f.write(data)
+            os.replace(tmp, path)
+            self._retention.added(path, len(data))
+        except OSError as e:
+            _logger.warning(f"Unable to write http cache entry {path}: {e}")
+            if tmp is not None:
+                self._remove(tmp)
+
+    def _remove(self, path: str) -> None:
+        self._retention.removed(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _cache_control(headers: typing.Mapping[str, str]) -> dict[str, str | None]:
+    directives = dict[str, str | None]()
+    for part in headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') if value else None
+    return directives
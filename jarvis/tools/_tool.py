@@ -1,23 +1,26 @@
+from __future__ import annotations
+
 import abc
 import json
 import logging
 import typing
 
-from anthropic.types import ToolParam
 from pydantic import BaseModel
 
+from jarvis.utils import tracing
+
+if typing.TYPE_CHECKING:
+    from anthropic.types import ToolParam
+
 _logger = logging.getLogger(__name__)
 
 
-class Tool[_Controls: BaseModel, _Output: BaseModel](abc.ABC):
+class _BaseTool[_Controls: BaseModel, _Output: BaseModel](abc.ABC):
     controls: BaseModel
-
-    def use(self, input_: dict) -> _Output:
-        try:
-            return self._use(self.transform(input_))
-        except Exception as e:
-            _logger.error(f"Error trying to utilize tool", e)
-            raise e
+    # Scheduling hints, see `jarvis.agents.ToolScheduler`
+    exclusive: typing.ClassVar[bool] = False
+    max_concurrency: typing.ClassVar[int | None] = None
+    timeout: typing.ClassVar[float | None] = 60.0
 
     @classmethod
     def transform(cls, input_: dict) -> _Output:
@@ -44,9 +47,6 @@ class Tool[_Controls: BaseModel, _Output: BaseModel](abc.ABC):
             _logger.error(f"Unable to deserialize input obj, e: {e}, input: {input_}")
             raise e
 
-    @abc.abstractmethod
-    def _use(cls, control_request: _Controls) -> _Output: ...
-
     @classmethod
     @abc.abstractmethod
     def get_name(cls) -> str: ...
@@ -56,13 +56,65 @@ class Tool[_Controls: BaseModel, _Output: BaseModel](abc.ABC):
     def get_description(cls) -> str: ...
 
 
+class Tool[_Controls: BaseModel, _Output: BaseModel](_BaseTool[_Controls, _Output]):
+    def use(self, input_: dict) -> _Output:
+        try:
+            with tracing.span("tool.use", tool=self.get_name()) as span:
+                output = self._use(self.transform(input_))
+                span.set(error=getattr(output, "error", None))
+                return output
+        except Exception as e:
+            _logger.error(f"Error trying to utilize tool: {e}")
+            raise e
+
+    @abc.abstractmethod
+    def _use(cls, control_request: _Controls) -> _Output: ...
+
+
+class AsyncTool[_Controls: BaseModel, _Output: BaseModel](
+    _BaseTool[_Controls, _Output]
+):
+    """Tool whose work is done on the event loop, e.g. with an async HTTP
+    client, so many calls can be in flight without a thread each."""
+
+    async def use(self, input_: dict) -> _Output:
+        try:
+            with tracing.span("tool.use", tool=self.get_name()) as span:
+                output = await self._use(self.transform(input_))
+                span.set(error=getattr(output, "error", None))
+                return output
+        except Exception as e:
+            _logger.error(f"Error trying to utilize tool: {e}")
+            raise e
+
+    @abc.abstractmethod
+    async def _use(self, control_request: _Controls) -> _Output: ...
+
+
+def _anthropic_tool_description(
+    tool: type[_BaseTool[typing.Any, typing.Any]],
+) -> ToolParam:
+    # Importing anthropic is slow, tools shouldn't pay for it until needed
+    from anthropic.types import ToolParam
+
+    return ToolParam(
+        input_schema=tool.controls.model_json_schema(),
+        name=tool.get_name(),
+        description=tool.get_description(),
+    )
+
+
 class AnthropicTool[_Controls: BaseModel, _Output: BaseModel](
     Tool[_Controls, _Output], abc.ABC
 ):
     @classmethod
     def tool_description(cls) -> ToolParam:
-        return ToolParam(
-            input_schema=cls.controls.model_json_schema(),
-            name=cls.get_name(),
-            description=cls.get_description(),
-        )
+        return _anthropic_tool_description(cls)
+
+
+class AsyncAnthropicTool[_Controls: BaseModel, _Output: BaseModel](
+    AsyncTool[_Controls, _Output], abc.ABC
+):
+    @classmethod
+    def tool_description(cls) -> ToolParam:
+        return _anthropic_tool_description(cls)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import abc
+import collections.abc
+import logging
+import threading
+import time
+import typing
+
+from jarvis import utils
+
+if typing.TYPE_CHECKING:
+    import openai
+    from faster_whisper import WhisperModel
+
+_logger = logging.getLogger(__name__)
+
+
+class TranscriptionBackend(abc.ABC):
+    """Turns 16-bit mono PCM into text."""
+
+    @abc.abstractmethod
+    def transcribe(self, pcm: bytes | bytearray, sample_rate: int) -> str: ...
+
+    def close(self) -> None:
+        pass
+
+
+class OpenAITranscriber(TranscriptionBackend):
+    """Uploads the audio to OpenAI's hosted Whisper."""
+
+    openai_client: openai.Client
+    model: str
+
+    def __init__(self, openai_client: openai.Client, model: str = "whisper-1"):
+        self.openai_client = openai_client
+        self.model = model
+
+    @typing.override
+    def transcribe(self, pcm: bytes | bytearray, sample_rate: int) -> str:
+        wav = utils.encode_wav(pcm, sample_rate)
+        return self.openai_client.audio.transcriptions.create(
+            file=wav, model=self.model
+        ).text
+
+
+class LocalWhisperTranscriber(TranscriptionBackend):
+    """Runs Whisper on the CPU with faster-whisper (CTranslate2), int8
+    quantized by default.
+
+    The model is loaded once, on a background thread as soon as the backend
+    is created, and warmed up with a short silent clip so the first real
+    utterance doesn't pay for the load. Calls are serialized, the model
+    already uses `cpu_threads` threads per call.
+    """
+
+    SAMPLE_RATE = 16_000  # what Whisper expects
+
+    model_size: str
+    language: str | None
+    beam_size: int
+
+    def __init__(
+        self,
+        model_size: str = "base",
+        device: str = "cpu",
+        compute_type: str = "int8",
+        cpu_threads: int = 0,
+        language: str | None = None,
+        beam_size: int = 1,
+        download_root: str | None = None,
+        preload: bool = True,
+    ) -> None:
+        self.model_size = model_size
+        self.language = language
+        self.beam_size = beam_size
+        self._model_kwargs = dict(
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            download_root=download_root,
+        )
+        self._model: WhisperModel | None = None
+        self._load_error: Exception | None = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._loader: threading.Thread | None = None
+        if preload:
+            self._loader = threading.Thread(target=self._load, daemon=True)
+            self._loader.start()
+
+    def _load(self) -> None:
+        try:
+            from faster_whisper import WhisperModel
+
+            start = time.monotonic()
+            model = WhisperModel(self.model_size, **self._model_kwargs)
+            # Warm up, the first inference allocates most of the buffers
+            list(model.transcribe(_silence(0.5), beam_size=1)[0])
+            self._model = model
+            _logger.info(
+                "[transcription] loaded whisper `{}` in {:.1f}s".format(
+                    self.model_size, time.monotonic() - start
+                )
+            )
+        except Exception as e:
+            self._load_error = e
+            _logger.error(f"Unable to load whisper model `{self.model_size}`: {e}")
+        finally:
+            self._loaded.set()
+
+    def wait_until_loaded(self, timeout: float | None = None) -> bool:
+        if self._loader is None:
+            with self._lock:
+                if self._loader is None:
+                    self._loader = threading.Thread(target=self._load, daemon=True)
+                    self._loader.start()
+        return self._loaded.wait(timeout)
+
+    @typing.override
+    def transcribe(self, pcm: bytes | bytearray, sample_rate: int) -> str:
+        self.wait_until_loaded()
+        if self._model is None:
+            raise RuntimeError(f"Whisper model unavailable: {self._load_error}")
+
+        audio = _to_float_audio(pcm, sample_rate, self.SAMPLE_RATE)
+        with self._lock:
+            segments, _ = self._model.transcribe(
+                audio,
+                language=self.language,
+                beam_size=self.beam_size,
+                condition_on_previous_text=False,
+            )
+            return " ".join(s.text.strip() for s in segments).strip()
+
+    @typing.override
+    def close(self) -> None:
+        self._model = None
+
+
+def _silence(seconds: float) -> typing.Any:
+    import numpy as np
+
+    return np.zeros(int(LocalWhisperTranscriber.SAMPLE_RATE * seconds), np.float32)
+
+
+def _to_float_audio(
+    pcm: collections.abc.Buffer, sample_rate: int, target_rate: int
+) -> typing.Any:
+    """16-bit PCM to float32 samples in [-1, 1] at `target_rate`."""
+    import numpy as np
+
+    audio = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+    if sample_rate == target_rate or len(audio) == 0:
+        return audio
+    if sample_rate % target_rate == 0:
+        # Integer ratio (e.g. the 32kHz capture), average each group of samples
+        factor = sample_rate // target_rate
+        usable = len(audio) - len(audio) % factor
+        return audio[:usable].reshape(-1, factor).mean(axis=1)
+    duration = len(audio) / sample_rate
+    target = np.linspace(0, duration, int(duration * target_rate), endpoint=False)
+    source = np.arange(len(audio)) / sample_rate
+    return np.interp(target, source, audio).astype(np.float32)
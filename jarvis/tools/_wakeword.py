@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import abc
+import logging
+import time
+import typing
+
+from pydantic import BaseModel
+
+from jarvis.tools._transcription import TranscriptionBackend, _to_float_audio
+from jarvis.utils import tracing
+
+if typing.TYPE_CHECKING:
+    from openwakeword.model import Model
+
+_logger = logging.getLogger(__name__)
+
+
+class WakeWordStats(BaseModel):
+    segments: int = 0
+    accepted: int = 0
+    cpu_seconds: float = 0.0
+    audio_seconds: float = 0.0
+
+    @property
+    def stt_calls_avoided(self) -> int:
+        """Segments that never reached full transcription."""
+        return self.segments - self.accepted
+
+    @property
+    def cpu_usage(self) -> float:
+        """CPU seconds spent per second of audio checked."""
+        return self.cpu_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+
+class WakeWordDetector(abc.ABC):
+    """Checks whether a voiced segment starts with the wake word, before it
+    is sent off for full transcription.
+
+    Only the first `head_ms` of each segment is looked at. Decisions and the
+    CPU time they cost are counted in `stats`.
+    """
+
+    head_ms: int
+    stats: WakeWordStats
+
+    def __init__(self, head_ms: int = 1500) -> None:
+        self.head_ms = head_ms
+        self.stats = WakeWordStats()
+
+    def accepts(self, pcm: bytes | bytearray | memoryview, sample_rate: int) -> bool:
+        head = memoryview(pcm)[: sample_rate * 2 * self.head_ms // 1000]
+        # Process wide, model runtimes do their work on their own threads
+        start = time.process_time()
+        try:
+            with tracing.span("wake_word", detector=type(self).__name__) as span:
+                accepted = self._detect(head, sample_rate)
+                span.set(accepted=accepted, bytes=len(head))
+        finally:
+            self.stats.cpu_seconds += time.process_time() - start
+        self.stats.segments += 1
+        self.stats.audio_seconds += len(head) / 2 / sample_rate
+        if accepted:
+            self.stats.accepted += 1
+        _logger.debug(f"[wake-word] accepted={accepted} {self.stats}")
+        return accepted
+
+    @abc.abstractmethod
+    def _detect(self, head: memoryview, sample_rate: int) -> bool: ...
+
+    def close(self) -> None:
+        pass
+
+
+class OpenWakeWordDetector(WakeWordDetector):
+    """On-device keyword spotter using openWakeWord's small ONNX models, e.g.
+    the pretrained `hey_jarvis`. Scores the head in 80ms steps and accepts
+    once any step reaches `threshold`."""
+
+    SAMPLE_RATE = 16_000
+    STEP = 1_280  # 80ms at 16kHz, openWakeWord's frame size
+
+    model_name: str
+    threshold: float
+
+    def __init__(
+        self,
+        model_name: str = "hey_jarvis",
+        threshold: float = 0.5,
+        head_ms: int = 2000,
+    ) -> None:
+        super().__init__(head_ms)
+        self.model_name = model_name
+        self.threshold = threshold
+        self._model: Model | None = None
+
+    def _get_model(self) -> Model:
+        if self._model is None:
+            from openwakeword.model import Model
+
+            self._model = Model(
+                wakeword_models=[self.model_name], inference_framework="onnx"
+            )
+        return self._model
+
+    @typing.override
+    def _detect(self, head: memoryview, sample_rate: int) -> bool:
+        import numpy as np
+
+        model = self._get_model()
+        model.reset()
+        audio = _to_float_audio(head, sample_rate, self.SAMPLE_RATE)
+        samples = (audio * 32767).astype(np.int16)
+        for offset in range(0, len(samples) - self.STEP + 1, self.STEP):
+            scores = model.predict(samples[offset : offset + self.STEP])
+            if max(scores.values(), default=0.0) >= self.threshold:
+                return True
+        return False
+
+
+class TranscriptWakeWordDetector(WakeWordDetector):
+    """Transcribes just the head with a cheap local model, e.g. a tiny
+    Whisper, and looks for the wake word in the text.
+
+    The transcriber is closed along with the detector unless
+    `close_transcriber` is off, for one shared with other detectors."""
+
+    transcriber: TranscriptionBackend
+    matches: typing.Callable[[str], bool]
+    close_transcriber: bool
+
+    def __init__(
+        self,
+        transcriber: TranscriptionBackend,
+        matches: typing.Callable[[str], bool],
+        head_ms: int = 1500,
+        close_transcriber: bool = True,
+    ) -> None:
+        super().__init__(head_ms)
+        self.transcriber = transcriber
+        self.matches = matches
+        self.close_transcriber = close_transcriber
+
+    @typing.override
+    def _detect(self, head: memoryview, sample_rate: int) -> bool:
+        text = self.transcriber.transcribe(bytes(head), sample_rate)
+        return text != "" and self.matches(text)
+
+    @typing.override
+    def close(self) -> None:
+        if self.close_transcriber:
+            self.transcriber.close()
+
+
+class CascadeWakeWordDetector(WakeWordDetector):
+    """Accepts only if every detector does, asking them in order, so the
+    cheapest one should come first."""
+
+    detectors: list[WakeWordDetector]
+
+    def __init__(self, *detectors: WakeWordDetector) -> None:
+        super().__init__(max(d.head_ms for d in detectors))
+        self.detectors = list(detectors)
+
+    @typing.override
+    def _detect(self, head: memoryview, sample_rate: int) -> bool:
+        return all(d.accepts(head, sample_rate) for d in self.detectors)
+
+    @typing.override
+    def close(self) -> None:
+        for detector in self.detectors:
+            detector.close()
@@ -1,20 +1,27 @@
-import contextlib
+from __future__ import annotations
+
 import logging
-import os
-import tempfile
+import queue
+import re
+import threading
+import time
 import typing
-import uuid
-import wave
 from typing import Literal
 
-import openai
 import pyaudio
-import webrtcvad
 from pydantic import BaseModel, Field
-from pydub import AudioSegment
+from pydantic.json_schema import SkipJsonSchema
 
 from jarvis import utils
 from jarvis.tools._tool import AnthropicTool
+from jarvis.tools._transcription import OpenAITranscriber, TranscriptionBackend
+from jarvis.tools._wakeword import WakeWordDetector
+from jarvis.utils import tracing
+from jarvis.utils.capture import AudioCapture
+
+if typing.TYPE_CHECKING:
+    import openai
+    import webrtcvad
 
 _logger = logging.getLogger(__name__)
 
@@ -42,12 +49,16 @@ class OutputVoiceOutput(BaseModel):
 
 class RecordAdaptiveVoiceInput(BaseModel):
     control_type: Literal["record_voice_adaptive"] = "record_voice_adaptive"
-    frame_duration: int = 5  # in ms (milliseconds)
+    frame_duration: int = 5  # in s (seconds) to wait for speech to start
+    # Only transcribe speech starting with the wake word, used by the daemon
+    wake_word: SkipJsonSchema[bool] = False
 
 
 class RecordAdaptiveVoiceOutput(BaseModel):
     control_type: Literal["record_voice_adaptive"] = "record_voice_adaptive"
     text: str
+    # Typed by the user rather than spoken, e.g. sent by a satellite
+    typed: bool = False
 
 
 class AudioTranscieverControls(BaseModel):
@@ -66,17 +77,85 @@ class AudioTranscieverOutput(BaseModel):
 
 class AudioTransciever(AnthropicTool[AudioTranscieverControls, AudioTranscieverOutput]):
     controls = AudioTranscieverControls
+    # Owns the microphone and speaker, and waits on the user to speak
+    exclusive = True
+    timeout = None
     vad: webrtcvad.Vad
     openai_client: openai.Client
     pyaudio_instance: pyaudio.PyAudio
+    capture: AudioCapture
+    debug_sink: utils.DebugSink | None
+    transcriber: TranscriptionBackend
+    wake_word: WakeWordDetector | None
+    output_device: int | None
     CHANNELS = 1
     RATE = 32_000
     FORMAT = pyaudio.paInt16
-
-    def __init__(self, openai_client: openai.Client, vad: webrtcvad.Vad) -> None:
-        self.pyaudio_instance = pyaudio.PyAudio()
+    FRAME_DURATION_MS = 20
+    PADDING_DURATION_MS = 400
+    # OpenAI's `pcm` speech format: 24kHz, 16-bit signed little-endian, mono
+    TTS_RATE = 24_000
+    TTS_CHUNK_SIZE = 4_800  # 100ms of audio
+
+    def __init__(
+        self,
+        openai_client: openai.Client,
+        vad: webrtcvad.Vad,
+        debug_sink: utils.DebugSink | None = None,
+        transcriber: TranscriptionBackend | None = None,
+        wake_word: WakeWordDetector | None = None,
+        input_device: int | None = None,
+        output_device: int | None = None,
+        pyaudio_instance: pyaudio.PyAudio | None = None,
+        capture_buffer_ms: int = 30_000,
+    ) -> None:
+        # Transcievers for different devices can share one PortAudio instance
+        self.pyaudio_instance = (
+            pyaudio_instance if pyaudio_instance is not None else pyaudio.PyAudio()
+        )
         self.openai_client = openai_client
         self.vad = vad
+        self.debug_sink = debug_sink
+        self.wake_word = wake_word
+        self.output_device = output_device
+        self.transcriber = (
+            transcriber if transcriber is not None else OpenAITranscriber(openai_client)
+        )
+        # A transcriber passed in may be shared, it's closed by its owner
+        self._owns_transcriber = transcriber is None
+        self.last_time_to_first_audio: float | None = None
+        self._output_stream: pyaudio.Stream | None = None
+        self._commands = queue.SimpleQueue[str]()
+        self.capture = self._new_capture(input_device, capture_buffer_ms)
+
+    def _new_capture(
+        self, input_device: int | None, capture_buffer_ms: int
+    ) -> AudioCapture:
+        """Where utterances are captured from, overridden by transcievers
+        that don't listen to a local input device."""
+        return AudioCapture(
+            self.pyaudio_instance,
+            self.RATE,
+            self.CHANNELS,
+            self.FORMAT,
+            frame_duration_ms=self.FRAME_DURATION_MS,
+            max_buffered_ms=capture_buffer_ms,
+            input_device_index=input_device,
+        )
+
+    def submit(self, command: str) -> None:
+        """Queues a typed command, the next adaptive recording returns it
+        instead of listening. A recording under way is interrupted."""
+        self._commands.put(command)
+        self.capture.interrupt()
+
+    def close(self) -> None:
+        self.capture.stop()
+        if self._owns_transcriber:
+            self.transcriber.close()
+        if self.wake_word is not None:
+            self.wake_word.close()
+        self._close_output_stream()
 
     @typing.override
     @classmethod
@@ -101,127 +180,355 @@ class AudioTransciever(AnthropicTool[AudioTranscieverControls, AudioTranscieverO
                 return self._output_voice(control_request.input.text)
             elif isinstance(control_request.input, RecordAdaptiveVoiceInput):
                 return self._record_voice_adaptively(
-                    control_request.input.frame_duration
+                    control_request.input.frame_duration,
+                    control_request.input.wake_word,
                 )
         except Exception as e:
             return AudioTranscieverOutput(output=None, error=True, reason=str(e))
 
-    def _get_tmp_fp(self, filename: str, ext: str):
-        temp_dir_base = tempfile.gettempdir()
-        jarvis_tmp_dir = os.path.join(temp_dir_base, "jarvis", "tmp")
-        os.makedirs(jarvis_tmp_dir, exist_ok=True)
-        filepath = os.path.join(jarvis_tmp_dir, f"{filename}_{uuid.uuid4().hex}.{ext}")
-        return filepath
-
-    def _record_voice_adaptively(self, base_recording_time: int):
-        record = True
-        voice_segments = list[bytes]()
-        frame_length = 20
-        chunksize = self.RATE * (frame_length / 1000)
-        frames_per_buffer = int(self.RATE // chunksize * base_recording_time)
-
-        try:
-            stream = self.pyaudio_instance.open(
+    def _transcribe(self, pcm: bytes | bytearray, filename: str) -> str:
+        if self.debug_sink is not None:
+            wav = utils.encode_wav(
+                pcm,
                 self.RATE,
-                self.CHANNELS,
-                self.FORMAT,
-                input=True,
-                frames_per_buffer=frames_per_buffer,
+                channels=self.CHANNELS,
+                sample_width=self.pyaudio_instance.get_sample_size(self.FORMAT),
+                name=f"{filename}.wav",
             )
-            while record:
-                if stream.is_stopped():
-                    stream.start_stream()
-
-                audiodata_chunks = list[bytes]()
-                for _ in range(0, frames_per_buffer):
-                    audiodata_chunks.append(stream.read(frames_per_buffer))
-                stream.stop_stream()
-                frames = utils.frame_generator(
-                    20, b"".join(audiodata_chunks), self.RATE
-                )
-                new_voice_segments, cont = utils.vad_collector(
-                    self.RATE, 20, 400, self.vad, frames
-                )
-                voice_segments.extend(new_voice_segments)
-                record = cont
-        except Exception as e:
-            _logger.error(f"error occured: {e}")
-        finally:
-            stream.stop_stream()
-            stream.close()
-
-        if len(voice_segments) == 0:
+            self.debug_sink.write(filename, "wav", wav.getbuffer())
+
+        with tracing.span(
+            "transcription",
+            backend=type(self.transcriber).__name__,
+            bytes=len(pcm),
+            audio_seconds=len(pcm) / 2 / self.RATE,
+        ) as span:
+            transcribed_audio = self.transcriber.transcribe(pcm, self.RATE)
+            span.set(chars=len(transcribed_audio))
+        _logger.info("[transcription] - {}".format(transcribed_audio))
+        return transcribed_audio
+
+    def _record_voice_adaptively(
+        self, base_recording_time: int, wake_word: bool = False
+    ) -> AudioTranscieverOutput:
+        """Pulls frames from the continuous capture and runs them through the
+        VAD as they arrive. Returns as soon as an utterance closes, or with no
+        text if no speech started within `base_recording_time` seconds.
+
+        With `wake_word` set and a detector configured, utterances that don't
+        start with the wake word are dropped without being transcribed.
+
+        Typed commands are returned first, and end listening when they come
+        in before any speech."""
+        command = self._next_command()
+        if command is not None:
+            return command
+        self.capture.start()
+        collector = utils.VadCollector(
+            self.RATE, self.FRAME_DURATION_MS, self.PADDING_DURATION_MS, self.vad
+        )
+        deadline = time.monotonic() + base_recording_time
+        voice_segment = bytearray()
+
+        # Includes waiting for speech to start
+        with tracing.span("voice.capture") as span:
+            for frame in self.capture.frames():
+                segment = collector.push(frame)
+                if segment is not None:
+                    voice_segment = segment
+                    break
+                if not collector.triggered and time.monotonic() > deadline:
+                    break
+            span.set(bytes=len(voice_segment))
+
+        if len(voice_segment) == 0:
+            # Interrupted by a command, or nothing was said
+            command = self._next_command()
+            if command is not None:
+                return command
+        if len(voice_segment) == 0 or (
+            wake_word
+            and self.wake_word is not None
+            and not self.wake_word.accepts(voice_segment, self.RATE)
+        ):
             return AudioTranscieverOutput(output=RecordAdaptiveVoiceOutput(text=""))
 
-        voiceonly_fp = self._get_tmp_fp("temp_recording_voiceonly", "wav")
-        with wave.open(voiceonly_fp, "wb") as wf:
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(2)
-            wf.setframerate(self.RATE)
-            wf.writeframes(b"".join(voice_segments))
+        transcribed_audio = self._transcribe(voice_segment, "recording_voiceonly")
+        return AudioTranscieverOutput(
+            output=RecordAdaptiveVoiceOutput(text=transcribed_audio)
+        )
 
-        with open(voiceonly_fp, "rb") as read_buffer:
-            audio_transcribe = self.openai_client.audio.transcriptions.create(
-                file=read_buffer, model="whisper-1"
-            )
-            transcribed_audio = audio_transcribe.text
-            _logger.info("[transcription] - {}".format(transcribed_audio))
-            return AudioTranscieverOutput(
-                output=RecordAdaptiveVoiceOutput(text=transcribed_audio)
-            )
+    def _next_command(self) -> AudioTranscieverOutput | None:
+        try:
+            command = self._commands.get_nowait()
+        except queue.Empty:
+            return None
+        return AudioTranscieverOutput(
+            output=RecordAdaptiveVoiceOutput(text=command, typed=True)
+        )
 
     def _record_voice_manual(self, record_intervals: int) -> AudioTranscieverOutput:
-        record_fp = self._get_tmp_fp("temp_recording", "wav")
-        with wave.open(record_fp, "wb") as write_buffer:
-            stream = self.pyaudio_instance.open(
-                self.RATE, self.CHANNELS, self.FORMAT, input=True
-            )
-            write_buffer.setnchannels(self.CHANNELS)
-            write_buffer.setsampwidth(
-                self.pyaudio_instance.get_sample_size(self.FORMAT)
+        recording = bytearray()
+        self.capture.start()
+        self.capture.clear()
+        _logger.info("[recording-start]")
+        recorded = 0.0
+        for frame in self.capture.frames():
+            recording += frame.bytes
+            recorded += frame.duration
+            if recorded >= record_intervals:
+                break
+        _logger.info("[recording-end]")
+
+        transcribed_audio = self._transcribe(recording, "recording")
+        return AudioTranscieverOutput(
+            output=RecordVoiceOutput(
+                control_type="record_voice", text=transcribed_audio
             )
-            write_buffer.setframerate(self.RATE)
-
-            _logger.info("[recording-start]")
-            for _ in range(0, self.RATE // 1024 * record_intervals):
-                write_buffer.writeframes(stream.read(1024))
-            _logger.info("[recording-end]")
+        )
 
-        with wave.open(record_fp, "rb") as read_buffer:
-            audio_transcribe = self.openai_client.audio.transcriptions.create(
-                file=read_buffer, model="whisper-1"
+    def _get_output_stream(self) -> pyaudio.Stream:
+        if self._output_stream is None:
+            self._output_stream = self.pyaudio_instance.open(
+                format=self.FORMAT,
+                channels=self.CHANNELS,
+                rate=self.TTS_RATE,
+                output=True,
+                output_device_index=self.output_device,
             )
-            transcribed_audio = audio_transcribe.text
-            _logger.info("[transcription] - {}".format(transcribed_audio))
-            return AudioTranscieverOutput(
-                output=RecordVoiceOutput(
-                    control_type="record_voice", text=transcribed_audio
-                )
-            )
-
-    def _output_voice(self, text: str) -> AudioTranscieverOutput:
-        voice_output_fp = self._get_tmp_fp("voice_output", "mp3")
+        return self._output_stream
 
-        with contextlib.closing(
-            self.openai_client.audio.speech.create(
-                input=text, model="tts-1", voice="alloy", response_format="mp3"
+    def _close_output_stream(self) -> None:
+        stream, self._output_stream = self._output_stream, None
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except OSError as e:
+                _logger.warning(f"Unable to close the output stream: {e}")
+
+    def _synthesize(self, text: str) -> typing.Iterator[bytes]:
+        """Yields raw PCM chunks of the synthesized speech as they download."""
+        # Not current, the caller's spans carry on while this is suspended
+        tracer = tracing.get_tracer()
+        span = tracer.start_span("tts.synthesis", chars=len(text))
+        size = 0
+        error: Exception | None = None
+        try:
+            with self.openai_client.audio.speech.with_streaming_response.create(
+                input=text, model="tts-1", voice="alloy", response_format="pcm"
+            ) as response:
+                for chunk in response.iter_bytes(self.TTS_CHUNK_SIZE):
+                    if size == 0:
+                        span.set(time_to_first_byte_ms=span.duration * 1000)
+                    size += len(chunk)
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            span.set(bytes=size)
+            tracer.end_span(span, error)
+
+    def _play_pcm(
+        self, chunks: typing.Iterable[bytes], started_at: float | None = None
+    ) -> None:
+        """Writes PCM chunks to the output stream as they arrive. When
+        `started_at` is given the delay until the first write is recorded as
+        the time-to-first-audio."""
+        stream = self._get_output_stream()
+        played = bytearray() if self.debug_sink is not None else None
+        remainder = b""
+        size = 0
+        with tracing.span("tts.playback") as span, self.capture.muted():
+            for chunk in chunks:
+                # Keep writes aligned to whole 16-bit samples
+                data = remainder + chunk
+                aligned = len(data) - len(data) % 2
+                remainder = data[aligned:]
+                if aligned == 0:
+                    continue
+                if started_at is not None:
+                    self._record_time_to_first_audio(started_at)
+                    started_at = None
+                try:
+                    stream.write(data[:aligned])
+                except Exception:
+                    # Reopened on the next playback, the device may be back
+                    self._close_output_stream()
+                    raise
+                size += aligned
+                if played is not None:
+                    played += data[:aligned]
+            span.set(bytes=size, audio_seconds=size / 2 / self.TTS_RATE)
+
+        if played is not None and self.debug_sink is not None:
+            wav = utils.encode_wav(played, self.TTS_RATE, channels=self.CHANNELS)
+            self.debug_sink.write("voice_output", "wav", wav.getbuffer())
+
+    def _record_time_to_first_audio(self, started_at: float) -> None:
+        self.last_time_to_first_audio = time.monotonic() - started_at
+        _logger.info(
+            "[tts] time-to-first-audio: {:.0f}ms".format(
+                self.last_time_to_first_audio * 1000
             )
-        ) as response, open(voice_output_fp, mode="wb") as audio_file:
-            audio_file.write(response.content)
-
-        audio = AudioSegment.from_mp3(voice_output_fp)
-        raw_data = audio.raw_data
-
-        stream = self.pyaudio_instance.open(
-            format=self.pyaudio_instance.get_format_from_width(audio.sample_width),
-            channels=audio.channels,
-            rate=audio.frame_rate,
-            output=True,
         )
-        stream.write(raw_data)
+
+    def _output_voice(self, text: str) -> AudioTranscieverOutput:
+        """Streams synthesized speech straight to the speaker, playback starts
+        with the first chunk instead of after the whole response has been
+        downloaded and decoded."""
+        self._play_pcm(self._synthesize(text), started_at=time.monotonic())
 
         return AudioTranscieverOutput(
             output=OutputVoiceOutput(
                 status="success",
             )
         )
+
+
+class _Closed:
+    """Queued after the last sentence to stop a `SpeechPipeline`'s workers."""
+
+
+_CLOSED = _Closed()
+
+
+class SpeechPipeline:
+    """Speaks text while it is still being generated.
+
+    Text is fed in as it streams from the model and cut into sentences. Each
+    complete sentence is handed to a synthesis worker right away, which queues
+    the synthesized audio for a playback worker. Later sentences are therefore
+    generated and synthesized while earlier ones are playing, and the user
+    hears the answer after roughly the latency of its first sentence.
+    """
+
+    _SENTENCE_END = re.compile(r"(?<=[.!?;:。！？])[\"')\]]*\s+|\n+")
+    # Playback is retried after failing, e.g. with the output device gone, the
+    # delay doubling up to the maximum while it keeps failing
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 8.0
+
+    transciever: AudioTransciever
+    min_sentence_length: int
+
+    def __init__(
+        self,
+        transciever: AudioTransciever,
+        min_sentence_length: int = 20,
+        max_queued_chunks: int = 256,
+    ) -> None:
+        self.transciever = transciever
+        self.min_sentence_length = min_sentence_length
+        self._pending = ""
+        self._speaking = False
+        self._started_at: float | None = None
+        self._sentences = queue.Queue[str | _Closed]()
+        self._audio = queue.Queue[bytes | _Closed | None](maxsize=max_queued_chunks)
+        self._workers = list[threading.Thread]()
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        self._workers = [
+            threading.Thread(target=self._synthesis_worker, daemon=True),
+            threading.Thread(target=self._playback_worker, daemon=True),
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def feed(self, text: str) -> None:
+        """Adds streamed text, queueing any sentences it completes."""
+        if not self._speaking:
+            self._speaking = True
+            self._started_at = time.monotonic()
+        self._pending += text
+
+        start = 0
+        for match in self._SENTENCE_END.finditer(self._pending):
+            if match.end() - start < self.min_sentence_length:
+                continue
+            self._enqueue(self._pending[start : match.end()])
+            start = match.end()
+        self._pending = self._pending[start:]
+
+    def flush(self) -> None:
+        """Queues whatever text is left and blocks until it has all been
+        spoken."""
+        self._enqueue(self._pending)
+        self._pending = ""
+        self._sentences.join()
+        self._audio.join()
+        self._speaking = False
+        self._started_at = None
+
+    def close(self) -> None:
+        """Stops the workers once whatever was queued has been spoken, they
+        are started again if more is fed."""
+        workers, self._workers = self._workers, []
+        if not workers:
+            return
+        self._sentences.put(_CLOSED)
+        for worker in workers:
+            worker.join()
+
+    def _enqueue(self, sentence: str) -> None:
+        sentence = sentence.strip()
+        if sentence == "":
+            return
+        self._ensure_workers()
+        self._sentences.put(sentence)
+
+    def _synthesis_worker(self) -> None:
+        while True:
+            sentence = self._sentences.get()
+            if isinstance(sentence, _Closed):
+                self._audio.put(sentence)
+                self._sentences.task_done()
+                return
+            try:
+                for chunk in self.transciever._synthesize(sentence):
+                    self._audio.put(chunk)
+            except Exception as e:
+                _logger.error(f"Unable to synthesize sentence: {e}")
+            finally:
+                # Marks the end of the sentence for the playback worker
+                self._audio.put(None)
+                self._sentences.task_done()
+
+    def _sentence_chunks(self, chunk: bytes | None) -> typing.Iterator[bytes]:
+        """Chunks of one sentence, starting with `chunk` already taken off the
+        queue."""
+        while True:
+            try:
+                if chunk is None:
+                    return
+                if self._started_at is not None:
+                    self.transciever._record_time_to_first_audio(self._started_at)
+                    self._started_at = None
+                yield chunk
+            finally:
+                self._audio.task_done()
+            # Never `_CLOSED`, it only follows the end of a sentence
+            chunk = typing.cast(bytes | None, self._audio.get())
+
+    def _playback_worker(self) -> None:
+        delay = self.RETRY_DELAY
+        while True:
+            first = self._audio.get()
+            if isinstance(first, _Closed):
+                self._audio.task_done()
+                return
+            chunks = self._sentence_chunks(first)
+            try:
+                self.transciever._play_pcm(chunks)
+                delay = self.RETRY_DELAY
+            except Exception as e:
+                _logger.error(f"Unable to play sentence, retrying in {delay}s: {e}")
+                # Drops the rest of the sentence, so it isn't played as the
+                # next one and `flush()` isn't left waiting on it
+                for _ in chunks:
+                    pass
+                time.sleep(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
@@ -1,35 +1,121 @@
 from __future__ import annotations
 
-from typing import Any, Literal, override
+import asyncio
+import contextlib
+import time
 import typing
-import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+import httpx
 from pydantic import BaseModel, Field
-from jarvis.tools._tool import AnthropicTool
+
+from jarvis.tools._extract import charset_from_header, extract_text
+from jarvis.tools._http_cache import HttpCache, HttpCacheEntry
+from jarvis.tools._tool import AnthropicTool, AsyncAnthropicTool
+
+if typing.TYPE_CHECKING:
+    import requests
+
+_CHUNK_SIZE = 64 * 1024
 
 
 class VisitInput(BaseModel):
     control_type: Literal["visit"] = "visit"
     url: str
+    page: int = 1
 
 
 class VisitOutput(BaseModel):
     control_type: Literal["visit"] = "visit"
     text: str
+    page: int = 1
+    has_more: bool = False
+
+
+class VisitManyInput(BaseModel):
+    control_type: Literal["visit_many"] = "visit_many"
+    urls: list[str] = Field(..., max_length=10)
+    page: int = 1
+
+
+class PageResult(BaseModel):
+    url: str
+    text: str | None = None
+    page: int = 1
+    has_more: bool = False
+    error: bool = False
+    reason: str | None = None
+
+
+class VisitManyOutput(BaseModel):
+    control_type: Literal["visit_many"] = "visit_many"
+    results: list[PageResult]
 
 
 class BrowserControls(BaseModel):
-    input: VisitInput = Field(..., discriminator="control_type")
+    input: VisitInput | VisitManyInput = Field(..., discriminator="control_type")
 
 
 class BrowserOutput(BaseModel):
-    output: VisitOutput | None = Field(..., discriminator="control_type")
+    output: VisitOutput | VisitManyOutput | None = Field(
+        ..., discriminator="control_type"
+    )
     error: bool = False
     reason: str | None = None
 
 
 class Browser(AnthropicTool[BrowserControls, BrowserOutput]):
+    """Fetches pages through a pooled `requests.Session`, so repeated visits
+    to a host reuse the connection instead of paying a new TCP and TLS
+    handshake. At most `max_concurrency` connections are kept per host.
+
+    Every request is bounded by `connect_timeout`/`read_timeout` and bodies
+    are cut off after `max_bytes`. With a `cache` a fresh page is served
+    locally and a stale one is revalidated with a conditional request.
+
+    Only the main content of a page is returned, in pages of about
+    `max_tokens`. Pages are parsed as they download and the download stops
+    once the requested page is complete, only pages read to the end are
+    cached.
+
+    `visit_many` fetches up to `max_parallel` urls at a time, each one given
+    at most `url_timeout` seconds, and reports errors per url.
+    """
+
     controls = BrowserControls
+    max_concurrency = 4
+    timeout = 45.0
     sep = "</sep/>"
+    session: requests.Session
+    cache: HttpCache | None
+    connect_timeout: float
+    read_timeout: float
+    max_bytes: int
+    max_tokens: int
+    url_timeout: float
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        cache: HttpCache | None = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        max_bytes: int = 2 * 1024 * 1024,
+        max_tokens: int = 4000,
+        max_parallel: int = 8,
+        url_timeout: float = 15.0,
+    ) -> None:
+        self.session = (
+            session if session is not None else _pooled_session(self.max_concurrency)
+        )
+        self.cache = cache
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.url_timeout = url_timeout
+        self._pool = ThreadPoolExecutor(max_parallel, thread_name_prefix="browser")
 
     @typing.override
     @classmethod
@@ -41,6 +127,10 @@ class Browser(AnthropicTool[BrowserControls, BrowserOutput]):
     def get_description(cls) -> str:
         return f"""This tool can be used to browse the web, visit sites and get their text content.
         The text content is each leaf element that has text concatenated by `{cls.sep}`.
+        Long pages are split up, when `has_more` is set visit the url again with the
+        next `page` number to read on.
+        Use `visit_many` to read several urls (up to 10) at once, e.g. the results of
+        a search, instead of visiting them one by one.
         Make sure to always include the control_type for all inputs, this is what defines
         which exact control to use for the tool.
         """
@@ -48,18 +138,275 @@ class Browser(AnthropicTool[BrowserControls, BrowserOutput]):
     @typing.override
     def _use(self, control_request: BrowserControls) -> BrowserOutput:
         try:
+            output: VisitOutput | VisitManyOutput
             if isinstance(control_request.input, VisitInput):
-                output = self._visit(control_request.input.url)
+                output = self._visit(
+                    control_request.input.url, control_request.input.page
+                )
+            elif isinstance(control_request.input, VisitManyInput):
+                output = self.visit_many(
+                    control_request.input.urls, control_request.input.page
+                )
             return BrowserOutput(output=output)
         except Exception as e:
             return BrowserOutput(output=None, error=True, reason=str(e))
 
-    def _visit(self, url: str) -> VisitOutput:
-        from bs4 import BeautifulSoup
-        import requests
+    def _visit(
+        self,
+        url: str,
+        page: int = 1,
+        deadline: float | None = None,
+        max_tokens: int | None = None,
+    ) -> VisitOutput:
+        with self._fetch(url, deadline) as (content, encoding):
+            extracted = extract_text(
+                content,
+                self.sep,
+                max_tokens if max_tokens is not None else self.max_tokens,
+                page,
+                encoding=encoding,
+            )
+        return VisitOutput(
+            control_type="visit",
+            text=extracted.text,
+            page=extracted.page,
+            has_more=extracted.has_more,
+        )
+
+    def visit_many(
+        self, urls: list[str], page: int = 1, max_tokens: int | None = None
+    ) -> VisitManyOutput:
+        """Reads `urls` concurrently, also used by other tools to fetch pages
+        directly."""
+
+        def visit(url: str) -> PageResult:
+            try:
+                deadline = time.monotonic() + self.url_timeout
+                output = self._visit(url, page, deadline, max_tokens)
+                return _page_result(url, output)
+            except Exception as e:
+                return PageResult(url=url, error=True, reason=str(e))
+
+        return VisitManyOutput(results=list(self._pool.map(visit, urls)))
+
+    @contextlib.contextmanager
+    def _fetch(
+        self, url: str, deadline: float | None = None
+    ) -> typing.Iterator[tuple[bytes | typing.Iterable[bytes], str | None]]:
+        """Opens the body of `url` along with the charset the response
+        declared. A download is only read as far as the body is iterated,
+        bodies read to their end are cached."""
+        cache = self.cache
+        entry = cache.lookup(url) if cache is not None else None
+        if cache is not None and entry is not None and cache.is_fresh(entry):
+            yield entry.body, charset_from_header(entry.content_type)
+            return
+
+        with self.session.get(
+            url,
+            headers=entry.validators() if entry is not None else None,
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=True,
+        ) as resp:
+            if resp.status_code == 304 and cache is not None and entry is not None:
+                entry = cache.refresh(entry, resp.headers)
+                yield entry.body, charset_from_header(entry.content_type)
+                return
+            body = _CappedBody(resp.iter_content(_CHUNK_SIZE), self.max_bytes, deadline)
+            yield body, charset_from_header(resp.headers.get("Content-Type"))
+
+        if cache is not None and resp.status_code == 200 and body.complete:
+            cache.store(url, resp.headers, body.read())
+
+
+class AsyncBrowser(AsyncAnthropicTool[BrowserControls, BrowserOutput]):
+    """`Browser` on top of a shared `httpx.AsyncClient`. Pages are fetched on
+    the event loop and parsed on a worker thread, cache files are read and
+    written on a worker thread too.
+
+    httpx has no per-host pool limit, the default client caps the total
+    number of connections instead.
+    """
+
+    controls = BrowserControls
+    max_concurrency = Browser.max_concurrency
+    timeout = Browser.timeout
+    sep = Browser.sep
+    http_client: httpx.AsyncClient
+    cache: HttpCache | None
+    max_bytes: int
+    max_tokens: int
+    url_timeout: float
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient | None = None,
+        cache: HttpCache | None = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        max_bytes: int = 2 * 1024 * 1024,
+        max_tokens: int = 4000,
+        max_parallel: int = 8,
+        url_timeout: float = 15.0,
+    ) -> None:
+        self.http_client = (
+            http_client
+            if http_client is not None
+            else httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=4 * self.max_concurrency,
+                    max_keepalive_connections=4 * self.max_concurrency,
+                ),
+            )
+        )
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.url_timeout = url_timeout
+        self._max_parallel = max_parallel
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return Browser.get_name()
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return Browser.get_description()
+
+    @typing.override
+    async def _use(self, control_request: BrowserControls) -> BrowserOutput:
+        try:
+            output: VisitOutput | VisitManyOutput
+            if isinstance(control_request.input, VisitInput):
+                output = await self._visit(
+                    control_request.input.url, control_request.input.page
+                )
+            elif isinstance(control_request.input, VisitManyInput):
+                output = await self.visit_many(
+                    control_request.input.urls, control_request.input.page
+                )
+            return BrowserOutput(output=output)
+        except Exception as e:
+            return BrowserOutput(output=None, error=True, reason=str(e))
+
+    async def _visit(
+        self, url: str, page: int = 1, max_tokens: int | None = None
+    ) -> VisitOutput:
+        content, encoding = await self._fetch(url)
+        extracted = await asyncio.to_thread(
+            extract_text,
+            content,
+            self.sep,
+            max_tokens if max_tokens is not None else self.max_tokens,
+            page,
+            encoding=encoding,
+        )
+        return VisitOutput(
+            control_type="visit",
+            text=extracted.text,
+            page=extracted.page,
+            has_more=extracted.has_more,
+        )
+
+    async def visit_many(
+        self, urls: list[str], page: int = 1, max_tokens: int | None = None
+    ) -> VisitManyOutput:
+        parallel = asyncio.Semaphore(self._max_parallel)
+
+        async def visit(url: str) -> PageResult:
+            async with parallel:
+                try:
+                    output = await asyncio.wait_for(
+                        self._visit(url, page, max_tokens), self.url_timeout
+                    )
+                    return _page_result(url, output)
+                except TimeoutError:
+                    reason = f"Timed out after {self.url_timeout}s"
+                    return PageResult(url=url, error=True, reason=reason)
+                except Exception as e:
+                    return PageResult(url=url, error=True, reason=str(e))
+
+        results = await asyncio.gather(*(visit(url) for url in urls))
+        return VisitManyOutput(results=list(results))
+
+    async def _fetch(self, url: str) -> tuple[bytes, str | None]:
+        """The body of `url` and the charset the response declared."""
+        cache = self.cache
+        entry: HttpCacheEntry | None = None
+        if cache is not None:
+            entry = await asyncio.to_thread(cache.lookup, url)
+        if cache is not None and entry is not None and cache.is_fresh(entry):
+            return entry.body, charset_from_header(entry.content_type)
+
+        async with self.http_client.stream(
+            "GET", url, headers=entry.validators() if entry is not None else None
+        ) as resp:
+            if resp.status_code == 304 and cache is not None and entry is not None:
+                entry = await asyncio.to_thread(cache.refresh, entry, resp.headers)
+                return entry.body, charset_from_header(entry.content_type)
+            chunks = list[bytes]()
+            size = 0
+            truncated = False
+            async for chunk in resp.aiter_bytes(_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    truncated = True
+                    break
+            body = b"".join(chunks)[: self.max_bytes]
+
+        if cache is not None and resp.status_code == 200 and not truncated:
+            await asyncio.to_thread(cache.store, url, resp.headers, body)
+        return body, charset_from_header(resp.headers.get("Content-Type"))
+
+
+def _pooled_session(max_per_host: int) -> requests.Session:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max_per_host, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _page_result(url: str, output: VisitOutput) -> PageResult:
+    return PageResult(
+        url=url, text=output.text, page=output.page, has_more=output.has_more
+    )
+
+
+class _CappedBody:
+    """Chunks of a body up to `max_bytes`, kept as they are read. Gives up
+    once `deadline` (`time.monotonic()`) has passed."""
+
+    def __init__(
+        self,
+        chunks: typing.Iterable[bytes],
+        max_bytes: int,
+        deadline: float | None = None,
+    ) -> None:
+        self.complete = False
+        self._chunks = chunks
+        self._max_bytes = max_bytes
+        self._deadline = deadline
+        self._body = bytearray()
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        for chunk in self._chunks:
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                raise TimeoutError("Timed out reading the page")
+            chunk = chunk[: self._max_bytes - len(self._body)]
+            self._body += chunk
+            yield chunk
+            if len(self._body) >= self._max_bytes:
+                return
+        self.complete = True
 
-        resp = requests.get(url)
-        resp.content
-        soup = BeautifulSoup(resp.content, features="html.parser")
-        text = soup.get_text(self.sep)
-        return VisitOutput(control_type="visit", text=text)
+    def read(self) -> bytes:
+        return bytes(self._body)
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
-from typing import Any, Literal, override
+import threading
 import typing
-import os
-import googleapiclient.discovery
+from typing import Literal
+
+import httpx
 from pydantic import BaseModel, Field
-from jarvis.tools._tool import AnthropicTool
+
+from jarvis.tools._cache import ResponseCache, normalize_query
+from jarvis.tools._tool import AnthropicTool, AsyncAnthropicTool
 
 if typing.TYPE_CHECKING:
+    import httplib2
     from googleapiclient._apis.customsearch.v1 import CustomSearchAPIResource
 
+    from jarvis.tools.browser import AsyncBrowser, Browser, PageResult
+
 
 class RunQueryInput(BaseModel):
     control_type: Literal["run_query"] = "run_query"
@@ -20,6 +26,7 @@ class SearchResult(BaseModel):
     url: str
     title: str
     description: str
+    content: str | None = None
 
 
 class RunQueryOutput(BaseModel):
@@ -38,15 +45,46 @@ class GoogleSearchOutput(BaseModel):
 
 
 class GoogleSearch(AnthropicTool[GoogleSearchControls, GoogleSearchOutput]):
+    """Queries the Custom Search API. Results are served from `cache` when one
+    is given, keyed on the normalized query and the search engine id.
+
+    With a `browser` and `prefetch` > 0 the top `prefetch` result pages are
+    read in parallel right after the search and returned inline, trimmed to
+    about `prefetch_tokens` each, saving the model a round trip per page.
+
+    The client's `httplib2.Http` isn't thread-safe, and one search tool is
+    shared by every session's scheduler, so each thread sends its requests
+    over an `Http` of its own. Schedulers only limit their own calls, the
+    tool itself keeps at most `max_concurrency` requests in flight overall.
+    """
+
     controls = GoogleSearchControls
+    max_concurrency: typing.ClassVar[int] = 2
+    timeout = 30.0
     google_client: CustomSearchAPIResource
     search_engine_id: str
+    cache: ResponseCache | None
+    browser: Browser | None
+    prefetch: int
+    prefetch_tokens: int
 
     def __init__(
-        self, google_client: CustomSearchAPIResource, search_engine_id: str
+        self,
+        google_client: CustomSearchAPIResource,
+        search_engine_id: str,
+        cache: ResponseCache | None = None,
+        browser: Browser | None = None,
+        prefetch: int = 0,
+        prefetch_tokens: int = 500,
     ) -> None:
         self.google_client = google_client
         self.search_engine_id = search_engine_id
+        self.cache = cache
+        self.browser = browser
+        self.prefetch = prefetch
+        self.prefetch_tokens = prefetch_tokens
+        self._local = threading.local()
+        self._requests = threading.BoundedSemaphore(self.max_concurrency)
 
     @typing.override
     @classmethod
@@ -57,7 +95,9 @@ class GoogleSearch(AnthropicTool[GoogleSearchControls, GoogleSearchOutput]):
     @classmethod
     def get_description(cls) -> str:
         return """This tool can be used to query the google search engine for 
-        information. Make sure to always include the control_type for all inputs.
+        information. The top results may come with the text `content` of the page
+        already read, there is no need to visit those with the Browser.
+        Make sure to always include the control_type for all inputs.
         This is what defines which exact control to use for the tool.
         """
 
@@ -65,30 +105,166 @@ class GoogleSearch(AnthropicTool[GoogleSearchControls, GoogleSearchOutput]):
     def _use(self, control_request: GoogleSearchControls) -> GoogleSearchOutput:
         try:
             if isinstance(control_request.input, RunQueryInput):
-                output = self._run_query(control_request.input.query)
+                output = self._prefetch(self._run_query(control_request.input.query))
             return GoogleSearchOutput(output=output)
         except Exception as e:
             return GoogleSearchOutput(output=None, error=True, reason=str(e))
 
+    def _prefetch(self, output: RunQueryOutput) -> RunQueryOutput:
+        if self.browser is None or self.prefetch <= 0:
+            return output
+        top = output.results[: self.prefetch]
+        pages = self.browser.visit_many(
+            [r.url for r in top], max_tokens=self.prefetch_tokens
+        )
+        return _with_content(output, pages.results)
+
     def _run_query(self, query: str) -> RunQueryOutput:
-        try:
-            res = (
-                self.google_client.cse()
-                .list(q=query, cx=self.search_engine_id)
-                .execute()
+        if self.cache is None:
+            return self._query_api(query)
+        return RunQueryOutput.model_validate_json(
+            self.cache.get_or_compute(
+                _cache_key(self.search_engine_id, query),
+                lambda: self._query_api(query).model_dump_json(),
             )
-            search_results = list()
-            for item in res.get("items"):
-                search_results.append(
-                    SearchResult(
-                        url=item.get("link"),
-                        title=item.get("title"),
-                        description=item.get("htmlSnippet"),
-                    )
+        )
+
+    def _query_api(self, query: str) -> RunQueryOutput:
+        try:
+            with self._requests:
+                res = (
+                    self.google_client.cse()
+                    .list(q=query, cx=self.search_engine_id)
+                    .execute(http=self._http())
                 )
-            return RunQueryOutput(
-                control_type="run_query",
-                results=search_results,
-            )
+            return _parse_results(res)
         except Exception as e:
             raise e
+
+    def _http(self) -> httplib2.Http:
+        """The calling thread's `Http`, kept so its connections are reused."""
+        http: httplib2.Http | None = getattr(self._local, "http", None)
+        if http is None:
+            from googleapiclient.http import build_http
+
+            http = self._local.http = build_http()
+        return http
+
+
+class AsyncGoogleSearch(AsyncAnthropicTool[GoogleSearchControls, GoogleSearchOutput]):
+    """`GoogleSearch` calling the Custom Search JSON API directly through a
+    shared `httpx.AsyncClient`, the discovery based client only offers
+    blocking calls."""
+
+    ENDPOINT = "https://customsearch.googleapis.com/customsearch/v1"
+
+    controls = GoogleSearchControls
+    max_concurrency = GoogleSearch.max_concurrency
+    timeout = GoogleSearch.timeout
+    api_key: str
+    search_engine_id: str
+    http_client: httpx.AsyncClient
+    cache: ResponseCache | None
+    browser: AsyncBrowser | None
+    prefetch: int
+    prefetch_tokens: int
+
+    def __init__(
+        self,
+        api_key: str,
+        search_engine_id: str,
+        http_client: httpx.AsyncClient | None = None,
+        cache: ResponseCache | None = None,
+        browser: AsyncBrowser | None = None,
+        prefetch: int = 0,
+        prefetch_tokens: int = 500,
+    ) -> None:
+        self.api_key = api_key
+        self.search_engine_id = search_engine_id
+        self.http_client = (
+            http_client if http_client is not None else httpx.AsyncClient()
+        )
+        self.cache = cache
+        self.browser = browser
+        self.prefetch = prefetch
+        self.prefetch_tokens = prefetch_tokens
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return GoogleSearch.get_name()
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return GoogleSearch.get_description()
+
+    @typing.override
+    async def _use(self, control_request: GoogleSearchControls) -> GoogleSearchOutput:
+        try:
+            if isinstance(control_request.input, RunQueryInput):
+                output = await self._prefetch(
+                    await self._run_query(control_request.input.query)
+                )
+            return GoogleSearchOutput(output=output)
+        except Exception as e:
+            return GoogleSearchOutput(output=None, error=True, reason=str(e))
+
+    async def _prefetch(self, output: RunQueryOutput) -> RunQueryOutput:
+        if self.browser is None or self.prefetch <= 0:
+            return output
+        top = output.results[: self.prefetch]
+        pages = await self.browser.visit_many(
+            [r.url for r in top], max_tokens=self.prefetch_tokens
+        )
+        return _with_content(output, pages.results)
+
+    async def _run_query(self, query: str) -> RunQueryOutput:
+        if self.cache is None:
+            return await self._query_api(query)
+
+        async def compute() -> str:
+            return (await self._query_api(query)).model_dump_json()
+
+        return RunQueryOutput.model_validate_json(
+            await self.cache.aget_or_compute(
+                _cache_key(self.search_engine_id, query), compute
+            )
+        )
+
+    async def _query_api(self, query: str) -> RunQueryOutput:
+        resp = await self.http_client.get(
+            self.ENDPOINT,
+            params={"key": self.api_key, "cx": self.search_engine_id, "q": query},
+        )
+        resp.raise_for_status()
+        return _parse_results(resp.json())
+
+
+def _with_content(output: RunQueryOutput, pages: list[PageResult]) -> RunQueryOutput:
+    results = [
+        result.model_copy(update=dict(content=page.text))
+        for result, page in zip(output.results, pages)
+    ]
+    results.extend(output.results[len(pages) :])
+    return output.model_copy(update=dict(results=results))
+
+
+def _cache_key(search_engine_id: str, query: str) -> str:
+    return f"{search_engine_id}:{normalize_query(query)}"
+
+
+def _parse_results(res: dict[str, typing.Any]) -> RunQueryOutput:
+    search_results = list()
+    for item in res.get("items", []):
+        search_results.append(
+            SearchResult(
+                url=item.get("link"),
+                title=item.get("title"),
+                description=item.get("htmlSnippet"),
+            )
+        )
+    return RunQueryOutput(
+        control_type="run_query",
+        results=search_results,
+    )
@@ -1,59 +1,238 @@
+from __future__ import annotations
+
 import collections
+import collections.abc
+import io
+import logging
+import os
+import threading
+import typing
+import uuid
+import wave
+
+if typing.TYPE_CHECKING:
+    import webrtcvad
+
+_logger = logging.getLogger(__name__)
 
 
 class Frame(object):
     """Represents a "frame" of audio data."""
 
-    def __init__(self, bytes, timestamp, duration):
+    __slots__ = ("bytes", "timestamp", "duration")
+
+    bytes: collections.abc.Buffer
+    timestamp: float
+    duration: float
+
+    def __init__(
+        self, bytes: collections.abc.Buffer, timestamp: float, duration: float
+    ) -> None:
         self.bytes = bytes
         self.timestamp = timestamp
         self.duration = duration
 
 
-def frame_generator(frame_duration_ms, audio, sample_rate):
+def frame_generator(
+    frame_duration_ms: int, audio: collections.abc.Buffer, sample_rate: int
+) -> typing.Iterator[Frame]:
     """Generates audio frames from PCM audio data.
 
     Takes the desired frame duration in milliseconds, the PCM data, and
     the sample rate.
 
-    Yields Frames of the requested duration.
+    Yields Frames of the requested duration lazily. Each frame's bytes are a
+    `memoryview` slice of `audio`, so no audio is copied.
     """
-    frames = list[Frame]()
     n = int(sample_rate * (frame_duration_ms / 1000.0) * 2)
     offset = 0
     timestamp = 0.0
     duration = (float(n) / sample_rate) / 2.0
-    while offset + n < len(audio):
-        frame = Frame(audio[offset : offset + n], timestamp, duration)
-        frames.append(frame)
+    view = memoryview(audio).toreadonly()
+    while offset + n < len(view):
+        yield Frame(view[offset : offset + n], timestamp, duration)
         timestamp += duration
         offset += n
-    return frames
 
 
-def vad_collector(
-    sample_rate,
-    frame_duration_ms,
-    padding_duration_ms,
-    vad,
-    frames,
-    activation_ratio=0.9,
-    deactivation_ratio=0.9,
-):
-    """Filters out non-voiced audio frames.
+class FrameRing(object):
+    """Fixed size ring of audio frames backed by one preallocated bytearray.
+
+    `put` copies a frame into its slot and `get` hands out a read-only
+    `memoryview` over that slot, so frames are never allocated individually.
+    Once `capacity` frames are waiting to be read the oldest unread frame is
+    dropped. A view stays valid until `retain` further frames have been read,
+    which must cover however many frames the consumer holds on to (e.g. the
+    VAD padding window).
+
+    Not thread safe, callers are expected to hold their own lock.
+    """
+
+    frame_bytes: int
+    capacity: int
+    dropped: int
+
+    def __init__(self, frame_bytes: int, capacity: int, retain: int = 64) -> None:
+        self.frame_bytes = frame_bytes
+        self.capacity = capacity
+        self.dropped = 0
+        self._slots = capacity + retain
+        self._buffer = bytearray(frame_bytes * self._slots)
+        self._view = memoryview(self._buffer)
+        self._read = 0
+        self._write = 0
+
+    def __len__(self) -> int:
+        return self._write - self._read
+
+    def put(self, data: collections.abc.Buffer) -> bool:
+        """Copies a frame into the ring. Returns False if the oldest unread
+        frame had to be dropped to make room."""
+        kept = True
+        if self._write - self._read >= self.capacity:
+            self._read += 1
+            self.dropped += 1
+            kept = False
+        offset = (self._write % self._slots) * self.frame_bytes
+        self._view[offset : offset + self.frame_bytes] = data
+        self._write += 1
+        return kept
+
+    def get(self) -> memoryview | None:
+        """Returns a view over the oldest unread frame, or None if empty."""
+        if self._read == self._write:
+            return None
+        offset = (self._read % self._slots) * self.frame_bytes
+        self._read += 1
+        return self._view[offset : offset + self.frame_bytes].toreadonly()
+
+    def clear(self) -> None:
+        self._read = self._write
 
-    Given a webrtcvad.Vad and a source of audio frames, yields only
-    the voiced audio.
 
-    Uses a padded, sliding window algorithm over the audio frames.
-    When more than 90% of the frames in the window are voiced (as
-    reported by the VAD), the collector triggers and begins yielding
-    audio frames. Then the collector waits until 90% of the frames in
-    the window are unvoiced to detrigger.
+class VadCollector(object):
+    """Streaming voice activity collector.
 
-    The window is padded at the front and back to provide a small
-    amount of silence or the beginnings/endings of speech around the
-    voiced frames.
+    Frames are pushed in one at a time as they are captured and a complete
+    voiced segment is handed back as soon as the window detriggers, instead of
+    waiting for a whole batch of audio to be recorded first.
+
+    Uses a padded, sliding window algorithm over the audio frames. When more
+    than `activation_ratio` of the frames in the window are voiced (as
+    reported by the VAD), the collector triggers and begins collecting audio
+    frames. Then the collector waits until `deactivation_ratio` of the frames
+    in the window are unvoiced to detrigger.
+
+    The number of voiced frames in the window is kept as a running counter so
+    each frame costs O(1) regardless of the padding duration. Frame bytes may
+    be `bytes` or read-only `memoryview` slices. Only the frames in the padding
+    window are referenced, once triggered each frame is copied exactly once
+    into the segment buffer, so views over a reused capture buffer are safe.
+
+    Arguments:
+
+    sample_rate - The audio sample rate, in Hz.
+    frame_duration_ms - The frame duration in milliseconds.
+    padding_duration_ms - The amount to pad the window, in milliseconds.
+    vad - An instance of webrtcvad.Vad.
+    """
+
+    sample_rate: int
+    vad: webrtcvad.Vad
+    padding_frames: int
+    activation_threshold: float
+    deactivation_threshold: float
+    num_voiced: int
+    triggered: bool
+    segment: bytearray
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_duration_ms: int,
+        padding_duration_ms: int,
+        vad: webrtcvad.Vad,
+        activation_ratio: float = 0.9,
+        deactivation_ratio: float = 0.9,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.vad = vad
+        self.padding_frames = int(padding_duration_ms / frame_duration_ms)
+        self.activation_threshold = activation_ratio * self.padding_frames
+        self.deactivation_threshold = deactivation_ratio * self.padding_frames
+        self.ring_buffer = collections.deque[tuple[Frame, bool]]()
+        self.num_voiced = 0
+        self.triggered = False
+        self.segment = bytearray()
+
+    def _window_append(self, frame: Frame, is_speech: bool) -> None:
+        if len(self.ring_buffer) == self.padding_frames:
+            _, evicted_speech = self.ring_buffer.popleft()
+            self.num_voiced -= evicted_speech
+        self.ring_buffer.append((frame, is_speech))
+        self.num_voiced += is_speech
+
+    def _window_clear(self) -> None:
+        self.ring_buffer.clear()
+        self.num_voiced = 0
+
+    def push(self, frame: Frame) -> bytearray | None:
+        """Feeds a single frame to the collector.
+
+        Returns the PCM audio of the voiced segment when this frame closes it,
+        otherwise None.
+        """
+        is_speech = self.vad.is_speech(frame.bytes, self.sample_rate)
+        self._window_append(frame, is_speech)
+
+        if not self.triggered:
+            if self.num_voiced > self.activation_threshold:
+                self.triggered = True
+                # Start the segment with the audio already in the window
+                for f, _ in self.ring_buffer:
+                    self.segment += f.bytes
+                self._window_clear()
+            return None
+
+        self.segment += frame.bytes
+        num_unvoiced = len(self.ring_buffer) - self.num_voiced
+        if num_unvoiced > self.deactivation_threshold:
+            return self.flush()
+        return None
+
+    def flush(self) -> bytearray:
+        """Closes the current segment, returning whatever voiced audio has
+        been collected so far."""
+        segment = self.segment
+        self.triggered = False
+        self._window_clear()
+        self.segment = bytearray()
+        return segment
+
+    def segments(self, frames: typing.Iterable[Frame]) -> typing.Iterator[bytearray]:
+        """Consumes a source of audio frames and yields each voiced segment
+        as soon as it closes. Leftover voiced audio is yielded once the source
+        runs out."""
+        for frame in frames:
+            segment = self.push(frame)
+            if segment is not None:
+                yield segment
+        if self.segment:
+            yield self.flush()
+
+
+def vad_collector(
+    sample_rate: int,
+    frame_duration_ms: int,
+    padding_duration_ms: int,
+    vad: webrtcvad.Vad,
+    frames: typing.Iterable[Frame],
+    activation_ratio: float = 0.9,
+    deactivation_ratio: float = 0.9,
+) -> tuple[list[bytearray], bool]:
+    """Filters out non-voiced audio frames.
+
+    Batch wrapper around `VadCollector` for a finite source of frames.
 
     Arguments:
 
@@ -63,52 +242,150 @@ def vad_collector(
     vad - An instance of webrtcvad.Vad.
     frames - a source of audio frames (sequence or generator).
 
-    Returns: A generator that yields PCM audio data.
+    Returns: The list of voiced PCM segments and whether the collector was
+    still triggered when the frames ran out.
     """
-    num_padding_frames = int(padding_duration_ms / frame_duration_ms)
-    # We use a deque for our sliding window/ring buffer.
-    ring_buffer = collections.deque(maxlen=num_padding_frames)
-    # We have two states: TRIGGERED and NOTTRIGGERED. We start in the
-    # NOTTRIGGERED state.
-    triggered = False
-    all_voiced_frames = list[bytes]()
-    voiced_frames = list[bytes]()
-
+    collector = VadCollector(
+        sample_rate,
+        frame_duration_ms,
+        padding_duration_ms,
+        vad,
+        activation_ratio,
+        deactivation_ratio,
+    )
+    all_voiced_frames = list[bytearray]()
     for frame in frames:
-        is_speech = vad.is_speech(frame.bytes, sample_rate)
-
-        if not triggered:
-            ring_buffer.append((frame, is_speech))
-            num_voiced = len([f for f, speech in ring_buffer if speech])
-            # If we're NOTTRIGGERED and more than 90% of the frames in
-            # the ring buffer are voiced frames, then enter the
-            # TRIGGERED state.
-            if num_voiced > activation_ratio * ring_buffer.maxlen:
-                triggered = True
-                # We want to yield all the audio we see from now until
-                # we are NOTTRIGGERED, but we have to start with the
-                # audio that's already in the ring buffer.
-                for f, s in ring_buffer:
-                    voiced_frames.append(f)
-                ring_buffer.clear()
-        else:
-            # We're in the TRIGGERED state, so collect the audio data
-            # and add it to the ring buffer.
-            voiced_frames.append(frame)
-            ring_buffer.append((frame, is_speech))
-            num_unvoiced = len([f for f, speech in ring_buffer if not speech])
-            # If more than 90% of the frames in the ring buffer are
-            # unvoiced, then enter NOTTRIGGERED and yield whatever
-            # audio we've collected.
-            if num_unvoiced > deactivation_ratio * ring_buffer.maxlen:
-                triggered = False
-                # yield b"".join([f.bytes for f in voiced_frames]), False
-                all_voiced_frames.append(b"".join(f.bytes for f in voiced_frames))
-                ring_buffer.clear()
-                voiced_frames = []
-    # If we have any leftover voiced audio when we run out of input,
-    # yield it.
-    if voiced_frames:
-        all_voiced_frames.extend([f.bytes for f in voiced_frames])
-        # yield b"".join([f.bytes for f in voiced_frames]), True
+        segment = collector.push(frame)
+        if segment is not None:
+            all_voiced_frames.append(segment)
+    triggered = collector.triggered
+    if collector.segment:
+        all_voiced_frames.append(collector.flush())
     return all_voiced_frames, triggered
+
+
+def encode_wav(
+    pcm: collections.abc.Buffer,
+    sample_rate: int,
+    channels: int = 1,
+    sample_width: int = 2,
+    name: str = "audio.wav",
+) -> io.BytesIO:
+    """Wraps raw PCM audio in a WAV container held in memory.
+
+    Returns a file-like object positioned at the start, with `name` set so
+    upload clients can infer the format from it.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+class FileRetention(object):
+    """Keeps the files in `directory` ending in `suffix` to at most
+    `max_files` files and `max_bytes` bytes, removing the oldest first.
+
+    The directory is scanned on the first write and again every `max_files`
+    writes to pick up files added or removed by others. In between, writes
+    are tallied in memory, so `added` costs no directory scan.
+    """
+
+    directory: str
+    max_files: int
+    max_bytes: int
+    suffix: str
+
+    def __init__(
+        self, directory: str, max_files: int, max_bytes: int, suffix: str = ""
+    ) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        # Oldest first, path to size
+        self._files: collections.OrderedDict[str, int] | None = None
+        self._bytes = 0
+        self._writes = 0
+
+    def added(self, path: str, size: int) -> None:
+        """Records that `path` was (re)written with `size` bytes and removes
+        the oldest files while over either limit."""
+        with self._lock:
+            self._writes += 1
+            if self._files is None or self._writes >= self.max_files:
+                self._scan()
+            else:
+                self._bytes -= self._files.pop(path, 0)
+                self._files[path] = size
+                self._bytes += size
+            assert self._files is not None
+            while self._files and (
+                len(self._files) > self.max_files or self._bytes > self.max_bytes
+            ):
+                oldest, size = self._files.popitem(last=False)
+                self._bytes -= size
+                try:
+                    os.remove(oldest)
+                except FileNotFoundError:
+                    pass
+
+    def removed(self, path: str) -> None:
+        with self._lock:
+            if self._files is not None:
+                self._bytes -= self._files.pop(path, 0)
+
+    def reset(self) -> None:
+        """Forgets what was tallied, the next write scans the directory."""
+        with self._lock:
+            self._files = None
+
+    def _scan(self) -> None:
+        entries = list[tuple[int, str, int]]()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        entries.sort()
+        self._files = collections.OrderedDict((path, size) for _, path, size in entries)
+        self._bytes = sum(self._files.values())
+        self._writes = 0
+
+
+class DebugSink(object):
+    """Opt-in on-disk copy of audio that passes through the assistant.
+
+    Files are written to `directory` and the oldest ones are removed as soon
+    as either `max_files` or `max_bytes` is exceeded, so the directory can't
+    grow without bound on a long running daemon.
+    """
+
+    directory: str
+    max_files: int
+    max_bytes: int
+
+    def __init__(
+        self, directory: str, max_files: int = 100, max_bytes: int = 100 * 1024 * 1024
+    ) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._retention = FileRetention(directory, max_files, max_bytes)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, filename: str, ext: str, data: collections.abc.Buffer) -> str:
+        filepath = os.path.join(self.directory, f"{filename}_{uuid.uuid4().hex}.{ext}")
+        try:
+            with open(filepath, "wb") as f:
+                f.write(data)
+            self._retention.added(filepath, memoryview(data).nbytes)
+        except OSError as e:
+            _logger.warning(f"Unable to write debug audio to {filepath}: {e}")
+        return filepath
@@ -0,0 +1,216 @@
+import collections
+import re
+import typing
+import unicodedata
+
+_WORD = re.compile(r"\w+")
+_PUNCTUATION = " \t\n,.;:!?¡¿-—'\""
+
+# Spelling rewrites applied before building a phonetic key, so that words
+# that sound alike in English or Spanish transcripts end up with the same key
+_PHONETIC_REWRITES = (
+    ("ph", "f"),
+    ("qu", "k"),
+    ("ll", "y"),
+    ("ce", "se"),
+    ("ci", "si"),
+    ("ge", "he"),
+    ("gi", "hi"),
+)
+_PHONETIC_CLASSES = str.maketrans(
+    {
+        "v": "b",
+        "w": "b",
+        "z": "s",
+        "c": "k",
+        "q": "k",
+        "j": "h",
+        "y": "h",
+        "g": "k",
+    }
+)
+_VOWELS = frozenset("aeiou")
+# Distinct transcript words whose verdicts are remembered
+_MAX_SEEN = 16_384
+
+
+def normalize(word: str) -> str:
+    """Casefolds and strips accents, `Jarvís` and `jarvis` compare equal."""
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def phonetic_key(word: str) -> str:
+    """Rough sound-alike key of a normalized word tuned for English and
+    Spanish, e.g. `jarvis`, `harvis`, `yarvis` and `jarbis` share the key
+    `hrbs`. The first letter is kept, later vowels and repeats are dropped."""
+    for source, target in _PHONETIC_REWRITES:
+        word = word.replace(source, target)
+    word = word.translate(_PHONETIC_CLASSES)
+    key = word[:1]
+    for c in word[1:]:
+        if c not in _VOWELS and c != key[-1]:
+            key += c
+    return key
+
+
+def max_edits(word: str) -> int:
+    """Edits tolerated when matching `word`, one per four letters."""
+    return len(word) // 4
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Whether the Levenshtein distance between `a` and `b` is at most
+    `limit`. Only a band of width 2 * limit + 1 is computed, so this is
+    O(limit * len) rather than O(len(a) * len(b))."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0:
+        return a == b
+    big = limit + 1
+    previous = [j if j <= limit else big for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [big] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        lo = max(1, i - limit)
+        hi = min(len(b), i + limit)
+        best = current[0]
+        for j in range(lo, hi + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous[j - 1] + cost, previous[j] + 1, current[j - 1] + 1, big
+            )
+            best = min(best, current[j])
+        if best > limit:
+            return False
+        previous = current
+    return previous[len(b)] <= limit
+
+
+class _Word:
+    __slots__ = ("text", "limit", "key")
+
+    def __init__(self, text: str, phonetic: bool) -> None:
+        self.text = text
+        self.limit = max_edits(self.text)
+        self.key = phonetic_key(self.text) if phonetic and len(self.text) >= 4 else None
+
+    def matches(self, word: str, key: str | None) -> bool:
+        if word == self.text:
+            return True
+        if self.key is not None and key == self.key:
+            return True
+        return within_distance(word, self.text, self.limit)
+
+
+class ActivationMatch:
+    """Where a wake phrase was found in a transcript."""
+
+    __slots__ = ("phrase", "start", "end", "command")
+
+    def __init__(self, phrase: str, start: int, end: int, command: str) -> None:
+        self.phrase = phrase
+        self.start = start
+        self.end = end
+        self.command = command
+
+    def __repr__(self) -> str:
+        return (
+            f"ActivationMatch(phrase={self.phrase!r}, start={self.start},"
+            f" end={self.end}, command={self.command!r})"
+        )
+
+
+class ActivationMatcher:
+    """Finds wake phrases in transcribed text.
+
+    Phrases are compiled once. A transcript is scanned a word at a time and
+    the scan stops at the first match, so a search is linear in the length of
+    the transcript. Words match when they're equal after normalization,
+    within a bounded edit distance (one edit per four letters) or, with
+    `phonetic`, when they sound alike. Verdicts are remembered per distinct
+    word, transcripts mostly repeat a small vocabulary.
+
+    Multiple phrases and languages are supported, e.g. `jarvis`, `hey jarvis`
+    and `oye jarvis`. When several phrases match at the same place the
+    longest wins, so the command that follows can be cut out cleanly.
+    """
+
+    phrases: list[str]
+
+    def __init__(self, phrases: typing.Iterable[str], phonetic: bool = True) -> None:
+        self.phrases = [p for p in phrases if _WORD.search(p)]
+        if not self.phrases:
+            raise ValueError("At least one activation phrase is required")
+        self._phonetic = phonetic
+
+        # Every distinct phrase word once, phrases refer to them by index
+        self._words = list[_Word]()
+        index = dict[str, int]()
+        compiled = list[tuple[str, tuple[int, ...]]]()
+        for phrase in self.phrases:
+            pattern = list[int]()
+            for word in _WORD.findall(phrase):
+                text = normalize(word)
+                if text not in index:
+                    index[text] = len(self._words)
+                    self._words.append(_Word(text, phonetic))
+                pattern.append(index[text])
+            compiled.append((phrase, tuple(pattern)))
+        # Longest phrases first so they win over phrases they contain
+        self._compiled = sorted(compiled, key=lambda p: -len(p[1]))
+        self._longest = len(self._compiled[0][1])
+        self._seen = dict[str, tuple[bool, ...]]()
+
+    def _verdicts(self, token: str) -> tuple[bool, ...]:
+        """Which phrase words `token` matches, followed by whether it
+        matches the first word of any phrase."""
+        verdicts = self._seen.get(token)
+        if verdicts is None:
+            word = normalize(token)
+            key = phonetic_key(word) if self._phonetic else None
+            matched = [w.matches(word, key) for w in self._words]
+            # Last, whether it could start any phrase at all
+            matched.append(any(matched[p[0]] for _, p in self._compiled))
+            verdicts = tuple(matched)
+            if len(self._seen) >= _MAX_SEEN:
+                self._seen.clear()
+            self._seen[token] = verdicts
+        return verdicts
+
+    def _match_at(
+        self, window: collections.deque[tuple[int, int, tuple[bool, ...]]]
+    ) -> tuple[str, int] | None:
+        for phrase, pattern in self._compiled:
+            if len(pattern) <= len(window) and all(
+                window[j][2][w] for j, w in enumerate(pattern)
+            ):
+                return phrase, len(pattern)
+        return None
+
+    def search(self, text: str) -> ActivationMatch | None:
+        """Returns the earliest wake phrase in `text` and the command after
+        it, or None."""
+        # The words that could make up a phrase starting at window[0]
+        window = collections.deque[tuple[int, int, tuple[bool, ...]]]()
+        tokens = _WORD.finditer(text)
+        while True:
+            if len(window) < self._longest:
+                token = next(tokens, None)
+                if token is not None:
+                    window.append((*token.span(), self._verdicts(token.group())))
+                    continue
+            if not window:
+                return None
+
+            found = self._match_at(window) if window[0][2][-1] else None
+            if found is not None:
+                phrase, length = found
+                start, end = window[0][0], window[length - 1][1]
+                command = text[end:].strip(_PUNCTUATION)
+                return ActivationMatch(phrase, start, end, command)
+            window.popleft()
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
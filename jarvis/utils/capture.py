@@ -0,0 +1,228 @@
+import contextlib
+import logging
+import threading
+import typing
+
+import pyaudio
+
+from jarvis.utils import Frame, FrameRing
+
+_logger = logging.getLogger(__name__)
+
+
+class AudioCapture:
+    """Keeps an input stream open and captures audio continuously.
+
+    PyAudio invokes `_callback` on its own thread with exactly one frame of
+    audio at a time, which is copied into a preallocated `FrameRing`.
+    Consumers pull frames from `frames()` at their own pace, so nothing said
+    while the previous utterance is being transcribed or acted upon is lost.
+    When the ring is full the oldest frame is dropped, keeping memory bounded
+    if nobody is listening.
+
+    Frames handed out are views over the ring and stay valid until
+    `retain_frames` further frames have been read.
+
+    `input_device_index` picks the PyAudio input device, by default the
+    system's default input.
+    """
+
+    pyaudio_instance: pyaudio.PyAudio
+    rate: int
+    channels: int
+    format: int
+    frame_duration_ms: int
+    input_device_index: int | None
+    dropped_frames: int
+
+    def __init__(
+        self,
+        pyaudio_instance: pyaudio.PyAudio,
+        rate: int,
+        channels: int,
+        format: int,
+        frame_duration_ms: int = 20,
+        max_buffered_ms: int = 30_000,
+        retain_frames: int = 64,
+        input_device_index: int | None = None,
+    ) -> None:
+        self.pyaudio_instance = pyaudio_instance
+        self.rate = rate
+        self.channels = channels
+        self.format = format
+        self.frame_duration_ms = frame_duration_ms
+        self.input_device_index = input_device_index
+        self.dropped_frames = 0
+        self._frame_samples = int(rate * frame_duration_ms / 1000)
+        self._frame_seconds = frame_duration_ms / 1000
+        self._ring = FrameRing(
+            self._frame_samples * channels * pyaudio.get_sample_size(format),
+            max(1, max_buffered_ms // frame_duration_ms),
+            retain=retain_frames,
+        )
+        self._available = threading.Condition()
+        self._stream: pyaudio.Stream | None = None
+        self._muted = threading.Event()
+        self._interrupted = False
+        self._timestamp = 0.0
+
+    def start(self) -> None:
+        if self._stream is not None:
+            return
+        self._stream = self.pyaudio_instance.open(
+            self.rate,
+            self.channels,
+            self.format,
+            input=True,
+            input_device_index=self.input_device_index,
+            frames_per_buffer=self._frame_samples,
+            stream_callback=self._callback,
+        )
+        self._stream.start_stream()
+        _logger.info("[capture-start]")
+
+    def stop(self) -> None:
+        if self._stream is None:
+            return
+        self._stream.stop_stream()
+        self._stream.close()
+        self._stream = None
+        _logger.info("[capture-stop]")
+
+    def is_running(self) -> bool:
+        return self._stream is not None and self._stream.is_active()
+
+    @contextlib.contextmanager
+    def muted(self) -> typing.Iterator[None]:
+        """Discards captured audio for the duration of the block, e.g. while
+        the speaker is playing so the assistant doesn't hear itself."""
+        self._muted.set()
+        try:
+            yield
+        finally:
+            self.clear()
+            self._muted.clear()
+
+    def clear(self) -> None:
+        with self._available:
+            self._ring.clear()
+
+    def interrupt(self) -> None:
+        """Makes `frames()` return early, now or the next time it's called,
+        e.g. when there's something more pressing than listening."""
+        with self._available:
+            self._interrupted = True
+            self._available.notify_all()
+
+    def frames(self, poll_timeout: float = 1.0) -> typing.Iterator[Frame]:
+        """Yields captured frames as they arrive. Stops once the stream has
+        been stopped and the buffer is drained, or when interrupted."""
+        while True:
+            with self._available:
+                data = None
+                if not self._interrupted:
+                    data = self._ring.get()
+                    if data is None:
+                        self._available.wait(poll_timeout)
+                        data = self._ring.get()
+                if self._interrupted:
+                    self._interrupted = False
+                    return
+            if data is None:
+                if not self.is_running():
+                    return
+                continue
+            frame = Frame(data, self._timestamp, self._frame_seconds)
+            self._timestamp += self._frame_seconds
+            yield frame
+
+    def _callback(
+        self,
+        in_data: bytes | None,
+        frame_count: int,
+        time_info: typing.Mapping[str, float],
+        status: int,
+    ) -> tuple[None, int]:
+        if in_data is None or self._muted.is_set():
+            return None, pyaudio.paContinue
+
+        with self._available:
+            kept = self._ring.put(in_data)
+            self._available.notify()
+        if not kept:
+            self.dropped_frames += 1
+            if self.dropped_frames % 50 == 1:
+                _logger.warning(
+                    f"Capture buffer full, dropped {self.dropped_frames} frames"
+                )
+        return None, pyaudio.paContinue
+
+
+class RemoteCapture(AudioCapture):
+    """Capture fed with 16-bit mono PCM received over the network instead of
+    from a local input device.
+
+    Audio may be pushed in chunks of any size, it's cut into frames as it
+    comes in. Unread audio is never dropped to make room, the sender is
+    expected to push no more than `room()` at a time and hold off while it's
+    zero, pushing back on the client. Audio pushed past that is held back
+    and moved into the buffer by a later push, once there's room.
+    """
+
+    def __init__(
+        self,
+        rate: int,
+        frame_duration_ms: int = 20,
+        max_buffered_ms: int = 30_000,
+        retain_frames: int = 64,
+    ) -> None:
+        super().__init__(
+            typing.cast(pyaudio.PyAudio, None),
+            rate,
+            1,
+            pyaudio.paInt16,
+            frame_duration_ms=frame_duration_ms,
+            max_buffered_ms=max_buffered_ms,
+            retain_frames=retain_frames,
+        )
+        self._pending = bytearray()
+        self._open = True
+
+    @typing.override
+    def start(self) -> None:
+        pass
+
+    @typing.override
+    def stop(self) -> None:
+        """Ends `frames()` once what's buffered has been read."""
+        with self._available:
+            self._open = False
+            self._available.notify_all()
+
+    @typing.override
+    def is_running(self) -> bool:
+        return self._open
+
+    def room(self) -> int:
+        """How many bytes can be pushed without going over the buffer."""
+        with self._available:
+            free = (self._ring.capacity - len(self._ring)) * self._ring.frame_bytes
+            return max(0, free - len(self._pending))
+
+    def has_room(self) -> bool:
+        return self.room() > 0
+
+    def push(self, pcm: bytes | bytearray | memoryview) -> None:
+        if self._muted.is_set():
+            return
+        size = self._ring.frame_bytes
+        with self._available:
+            self._pending += pcm
+            free = self._ring.capacity - len(self._ring)
+            end = min(len(self._pending) // size, free) * size
+            if end == 0:
+                return
+            for offset in range(0, end, size):
+                self._ring.put(self._pending[offset : offset + size])
+            del self._pending[:end]
+            self._available.notify()
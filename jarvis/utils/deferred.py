@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+import typing
+
+_logger = logging.getLogger(__name__)
+
+
+# Reentrant, factories may build other Deferreds
+_build_lock = threading.RLock()
+
+
+class Deferred[T]:
+    """A value, usually an SDK client, that is only built when first needed.
+
+    `get()` builds it on the calling thread, or waits for a build already
+    under way. `warm()` starts building it on a background thread right away,
+    so it's ready by the time it's needed without holding up startup. A
+    failed build is retried on the next `get()`.
+
+    Builds are serialized process wide: they mostly import packages, and
+    threads importing the same packages at once can see partially
+    initialized modules.
+
+    Attribute access is forwarded to the value, so a `Deferred` can stand in
+    for the client it builds.
+    """
+
+    def __init__(self, factory: typing.Callable[[], T], name: str) -> None:
+        self._factory = factory
+        self._name = name
+        self._value: T | None = None
+        self._built = False
+        self._warm_lock = threading.Lock()
+        self._warming: threading.Thread | None = None
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def warm(self) -> typing.Self:
+        with self._warm_lock:
+            if not self._built and self._warming is None:
+                self._warming = threading.Thread(
+                    target=self._warm, name=f"warm-{self._name}", daemon=True
+                )
+                self._warming.start()
+        return self
+
+    def _warm(self) -> None:
+        try:
+            self.get()
+        except Exception as e:
+            _logger.warning(f"Unable to build `{self._name}` in the background: {e}")
+
+    def get(self) -> T:
+        if self._built:
+            return typing.cast(T, self._value)
+        with _build_lock:
+            if not self._built:
+                start = time.monotonic()
+                self._value = self._factory()
+                self._built = True
+                _logger.debug(
+                    "[deferred] built `{}` in {:.3f}s".format(
+                        self._name, time.monotonic() - start
+                    )
+                )
+        return self._value
+
+    def if_built(self, fn: typing.Callable[[T], None]) -> None:
+        """Calls `fn` with the value unless it was never built, e.g. to
+        release it. Waits for a build already under way, never starts one."""
+        if not self._built:
+            with _build_lock:
+                if not self._built:
+                    return
+        fn(typing.cast(T, self._value))
+
+    def __getattr__(self, name: str) -> typing.Any:
+        # Only called for attributes the Deferred itself doesn't have
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
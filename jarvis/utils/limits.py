@@ -0,0 +1,47 @@
+import contextlib
+import logging
+import threading
+import time
+import typing
+
+_logger = logging.getLogger(__name__)
+
+
+class CallLimit:
+    """Bounds how many calls, e.g. model requests, are in flight at once
+    across every thread sharing it.
+
+    `slot()` blocks until one of `max_concurrency` slots frees up and yields
+    how long it waited. The busiest it has been and the total time spent
+    waiting are kept for reporting.
+    """
+
+    max_concurrency: int
+
+    def __init__(self, max_concurrency: int) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.waited = 0.0
+
+    @contextlib.contextmanager
+    def slot(self) -> typing.Iterator[float]:
+        start = time.monotonic()
+        self._slots.acquire()
+        waited = time.monotonic() - start
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.waited += waited
+        if waited > 1.0:
+            _logger.info(f"[limit] waited {waited:.1f}s for a free call slot")
+        try:
+            yield waited
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
@@ -0,0 +1,341 @@
+"""Lightweight tracing for the voice -> agent -> tool -> speech pipeline.
+
+Spans are timed with `span()`, nest through a context variable and are
+handed to every configured exporter once they end. Nothing is recorded until
+an exporter is added, e.g.
+
+    tracing.get_tracer().add_exporter(tracing.JsonlExporter("trace.jsonl"))
+
+Per stage p50/p95 of a JSONL trace:
+
+    python -m jarvis.utils.tracing trace.jsonl
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from opentelemetry.sdk.trace.export import SpanExporter
+
+_logger = logging.getLogger(__name__)
+
+type AttributeValue = str | bool | int | float
+
+
+class Span:
+    """A timed operation. Ids and timestamps follow OpenTelemetry: 128-bit
+    trace ids, 64-bit span ids, nanoseconds since the epoch."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(self, name: str, parent: Span | None, **attributes: AttributeValue):
+        self.name = name
+        self.trace_id: int = parent.trace_id if parent else random.getrandbits(128)
+        self.span_id: int = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = dict[str, AttributeValue](attributes)
+        self.error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds, up to now for a span that hasn't ended."""
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set(self, **attributes: AttributeValue | None) -> None:
+        """Adds attributes, None values are skipped."""
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "name": self.name,
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": (
+                f"{self.parent_id:016x}" if self.parent_id is not None else None
+            ),
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": self.duration * 1000,
+            "status": "ERROR" if self.error is not None else "OK",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan(Span):
+    """Handed out when there are no exporters, records nothing."""
+
+    def __init__(self) -> None:
+        super().__init__("noop", None)
+
+    @typing.override
+    def set(self, **attributes: AttributeValue | None) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Exporter(abc.ABC):
+    @abc.abstractmethod
+    def export(self, span: Span) -> None: ...
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryExporter(Exporter):
+    """Keeps finished spans in a list, for in-process consumers and tests."""
+
+    def __init__(self) -> None:
+        self.spans = list[Span]()
+        self._lock = threading.Lock()
+
+    @typing.override
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonlExporter(Exporter):
+    """Appends each finished span to a file as one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    @typing.override
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict())
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    @typing.override
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetryExporter(Exporter):
+    """Hands spans to an OpenTelemetry SDK `SpanExporter`, e.g. the OTLP or
+    console exporters, through a `BatchSpanProcessor` so exporting never
+    blocks the pipeline. Requires `opentelemetry-sdk`."""
+
+    def __init__(self, span_exporter: SpanExporter) -> None:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self._processor = BatchSpanProcessor(span_exporter)
+        self._resource = Resource.create({"service.name": "jarvis"})
+
+    @typing.override
+    def export(self, span: Span) -> None:
+        from opentelemetry.sdk.trace import ReadableSpan
+        from opentelemetry.trace import SpanContext, Status, StatusCode, TraceFlags
+
+        def context(span_id: int) -> SpanContext:
+            return SpanContext(
+                span.trace_id,
+                span_id,
+                is_remote=False,
+                trace_flags=TraceFlags(TraceFlags.SAMPLED),
+            )
+
+        self._processor.on_end(
+            ReadableSpan(
+                name=span.name,
+                context=context(span.span_id),
+                parent=context(span.parent_id) if span.parent_id else None,
+                resource=self._resource,
+                attributes=span.attributes,
+                status=(
+                    Status(StatusCode.ERROR, span.error)
+                    if span.error is not None
+                    else Status(StatusCode.OK)
+                ),
+                start_time=span.start_ns,
+                end_time=span.end_ns,
+            )
+        )
+
+    @typing.override
+    def close(self) -> None:
+        self._processor.shutdown()
+
+
+class Tracer:
+    """Creates spans and fans finished ones out to the exporters.
+
+    The current span is kept in a context variable, so nesting follows the
+    call stack and asyncio tasks. Work handed to a thread pool should be
+    submitted with `contextvars.copy_context().run` to keep its parent.
+    """
+
+    def __init__(self, exporters: typing.Iterable[Exporter] = ()) -> None:
+        self.exporters = list(exporters)
+        self._current = contextvars.ContextVar[Span | None]("span", default=None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        self.exporters.append(exporter)
+
+    def start_span(self, name: str, **attributes: AttributeValue) -> Span:
+        """Starts a span under the current one without making it current,
+        for work that is interleaved with other spans, e.g. a generator.
+        It must be finished with `end_span`."""
+        if not self.enabled:
+            return _NOOP
+        return Span(name, self._current.get(), **attributes)
+
+    def end_span(self, span: Span, error: BaseException | None = None) -> None:
+        if span is _NOOP:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                _logger.warning(f"Unable to export span `{span.name}`: {e}")
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, current: bool = True, **attributes: AttributeValue
+    ) -> typing.Iterator[Span]:
+        """Times the enclosed block as a child of the current span. With
+        `current` False spans started inside the block aren't its children,
+        e.g. for a model call that kicks off tool calls while streaming."""
+        span = self.start_span(name, **attributes)
+        if span is _NOOP:
+            yield span
+            return
+        token = self._current.set(span) if current else None
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            if token is not None:
+                self._current.reset(token)
+
+    def close(self) -> None:
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters.clear()
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+def span(
+    name: str, current: bool = True, **attributes: AttributeValue
+) -> typing.ContextManager[Span]:
+    """`Tracer.span` on the global tracer."""
+    return _tracer.span(name, current, **attributes)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(records: typing.Iterable[dict[str, typing.Any]]) -> str:
+    """Per span name: count, p50/p95/max duration, errors and the totals of
+    token and byte counts."""
+    durations = collections.defaultdict[str, list[float]](list)
+    errors = collections.Counter[str]()
+    totals = collections.defaultdict[str, collections.Counter[str]](collections.Counter)
+    for record in records:
+        name = record["name"]
+        durations[name].append(record["duration_ms"])
+        errors[name] += record.get("status") == "ERROR"
+        for key, value in record.get("attributes", {}).items():
+            if (key.endswith("tokens") or key.endswith("bytes")) and isinstance(
+                value, int
+            ):
+                totals[name][key] += value
+
+    lines = [
+        f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+        f"{'errors':>8}  totals"
+    ]
+    for name in sorted(durations):
+        values = sorted(durations[name])
+        total = ", ".join(f"{k}={v:,}" for k, v in sorted(totals[name].items()))
+        lines.append(
+            f"{name:<24}{len(values):>7}{percentile(values, 50):>10.1f}"
+            f"{percentile(values, 95):>10.1f}{values[-1]:>10.1f}"
+            f"{errors[name]:>8}  {total}"
+        )
+    return "\n".join(lines)
+
+
+def read_jsonl(path: str) -> typing.Iterator[dict[str, typing.Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m jarvis.utils.tracing",
+        description="Prints per stage latency percentiles of a JSONL trace.",
+    )
+    parser.add_argument("trace", help="file written by JsonlExporter")
+    args = parser.parse_args()
+    print(summarize(read_jsonl(args.trace)))
+
+
+if __name__ == "__main__":
+    main()
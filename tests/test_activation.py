@@ -0,0 +1,57 @@
+import pytest
+
+from jarvis.utils.activation import ActivationMatcher, within_distance
+
+PHRASES = ["jarvis", "hey jarvis", "oye jarvis"]
+
+
+def test_returns_the_command_after_the_wake_phrase():
+    match = ActivationMatcher(PHRASES).search("Hey Jarvis, what's the weather?")
+    assert match is not None
+    assert match.phrase == "hey jarvis"
+    assert (match.start, match.end) == (0, 10)
+    assert match.command == "what's the weather"
+
+
+def test_wake_phrase_in_the_middle_of_a_transcript():
+    text = "um okay jarvis turn on the lights"
+    match = ActivationMatcher(PHRASES).search(text)
+    assert match is not None
+    assert text[match.start : match.end] == "jarvis"
+    assert match.command == "turn on the lights"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Oye, Harvis, ¿qué hora es?",
+        "Yarvis pon música",
+        "JARVÍS apaga la luz",
+        "jervis play some music",
+        "jarbis",
+    ],
+)
+def test_misheard_and_accented_spellings_match(text):
+    assert ActivationMatcher(PHRASES).matches(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["I went to Paris yesterday", "Travis called", "customer service", "the jar", ""],
+)
+def test_similar_words_do_not_match(text):
+    assert ActivationMatcher(PHRASES).search(text) is None
+
+
+def test_phrases_are_required():
+    with pytest.raises(ValueError):
+        ActivationMatcher(["", " , "])
+
+
+def test_within_distance_is_bounded():
+    assert within_distance("jarvis", "jarvis", 0)
+    assert within_distance("jarvis", "jervis", 1)
+    assert within_distance("jarvis", "jarvi", 1)
+    assert not within_distance("jarvis", "paris", 1)
+    assert within_distance("jarvis", "paris", 2)
+    assert not within_distance("jarvis", "travis", 2)
@@ -0,0 +1,212 @@
+import json
+import types
+import typing
+
+from anthropic.types import Message, TextBlock
+from pydantic import BaseModel
+
+from jarvis.agents import AnthropicAgent
+from jarvis.tools._tool import AnthropicTool
+from jarvis.utils.limits import CallLimit
+from tests.test_async_agent import _message, _tool_use
+
+
+class _Stream:
+    def __init__(self, message: Message) -> None:
+        self._message = message
+
+    def __enter__(self) -> "_Stream":
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        pass
+
+    def __iter__(self) -> typing.Iterator[typing.Any]:
+        for block in self._message.content:
+            if block.type == "text":
+                yield types.SimpleNamespace(type="text", text=block.text)
+            yield types.SimpleNamespace(type="content_block_stop", content_block=block)
+
+    def get_final_message(self) -> Message:
+        return self._message
+
+
+class _Messages:
+    """Stands in for `anthropic.Client().messages`, replaying one response
+    per turn and calling `done` when handing out the last one."""
+
+    def __init__(self, responses: list[Message], done: typing.Callable[[], None]):
+        self.responses = responses
+        self.requests = list[dict[str, typing.Any]]()
+        self.done = done
+
+    def stream(self, **params: typing.Any) -> _Stream:
+        self.requests.append(params)
+        if len(self.responses) == 1:
+            self.done()
+        return _Stream(self.responses.pop(0))
+
+
+class _Speech:
+    """Records what happened, and whether the model call slot was held, each
+    time speech is flushed."""
+
+    def __init__(self, limit: CallLimit, events: list[str]) -> None:
+        self.limit = limit
+        self.events = events
+
+    def feed(self, text: str) -> None:
+        self.events.append(f"feed {text}")
+
+    def flush(self) -> None:
+        self.events.append(f"flush with {self.limit.active} slots taken")
+
+    def close(self) -> None:
+        pass
+
+
+class _Input(BaseModel):
+    control_type: typing.Literal["lookup"] = "lookup"
+    key: str
+
+
+class _Controls(BaseModel):
+    input: _Input
+
+
+class _Output(BaseModel):
+    value: str
+
+
+class _Microphone(AnthropicTool[_Controls, _Output]):
+    controls = _Controls
+    exclusive = True
+
+    def __init__(self, events: list[str]) -> None:
+        self.events = events
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Microphone"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Listens."
+
+    @typing.override
+    def _use(self, control_request: _Controls) -> _Output:
+        self.events.append("listen")
+        return _Output(value="heard")
+
+
+def test_speech_plays_after_the_call_slot_is_released():
+    events = list[str]()
+    limit = CallLimit(1)
+    messages = _Messages(
+        [
+            _message(
+                TextBlock(type="text", text="Go ahead."),
+                _tool_use("t1", "Microphone", "a"),
+            ),
+            _message(TextBlock(type="text", text="Got it.")),
+        ],
+        lambda: agent.cancel(),
+    )
+    agent = AnthropicAgent(
+        directive="Be brief.",
+        max_tokens=256,
+        anthropic_client=typing.cast(
+            typing.Any, types.SimpleNamespace(messages=messages)
+        ),
+        speech=typing.cast(typing.Any, _Speech(limit, events)),
+        llm_limit=limit,
+    )
+    agent.register_tool(_Microphone(events))
+    agent.act("listen")
+    agent.close()
+
+    assert events == [
+        "feed Go ahead.",
+        "flush with 0 slots taken",
+        "listen",
+        "feed Got it.",
+        "flush with 0 slots taken",
+    ]
+
+
+class _Flaky(AnthropicTool[_Controls, _Output]):
+    """Fails on key "down", like a request to a host that's unreachable."""
+
+    controls = _Controls
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Flaky"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Fetches a key."
+
+    @typing.override
+    def _use(self, control_request: _Controls) -> _Output:
+        if control_request.input.key == "down":
+            raise ConnectionError("Connection refused")
+        return _Output(value=control_request.input.key)
+
+
+def test_a_failing_tool_call_is_reported_with_the_others():
+    messages = _Messages(
+        [
+            _message(_tool_use("t1", "Flaky", "down"), _tool_use("t2", "Flaky", "up")),
+            _message(TextBlock(type="text", text="One of them worked.")),
+        ],
+        lambda: agent.cancel(),
+    )
+    agent = AnthropicAgent(
+        directive="Be brief.",
+        max_tokens=256,
+        anthropic_client=typing.cast(
+            typing.Any, types.SimpleNamespace(messages=messages)
+        ),
+        streaming=True,
+    )
+    agent.register_tool(_Flaky())
+    agent.act("fetch both")
+    agent.close()
+
+    results = messages.requests[1]["messages"][-1]["content"]
+    assert [r["is_error"] for r in results] == [True, False]
+    assert json.loads(results[0]["content"]) == {"error": "Connection refused"}
+    assert json.loads(results[1]["content"])["value"] == "up"
+
+
+def test_requests_carry_cache_breakpoints():
+    messages = _Messages(
+        [_message(TextBlock(type="text", text="Hi."))], lambda: agent.cancel()
+    )
+    agent = AnthropicAgent(
+        directive="Be brief.",
+        max_tokens=256,
+        anthropic_client=typing.cast(
+            typing.Any, types.SimpleNamespace(messages=messages)
+        ),
+        streaming=True,
+    )
+    agent.register_tool(_Flaky())
+    agent.register_tool(_Microphone([]))
+    agent.act("hello")
+    agent.close()
+
+    request = messages.requests[0]
+    ephemeral = {"type": "ephemeral"}
+    assert [t.get("cache_control") for t in request["tools"]] == [None, ephemeral]
+    assert request["system"][0]["cache_control"] == ephemeral
+    assert request["messages"][-1]["content"] == [
+        {"type": "text", "text": "hello", "cache_control": ephemeral}
+    ]
+    # The conversation remembered is left as it was
+    assert agent._memory.messages()[0]["content"] == "hello"
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import types
+import typing
+
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+from pydantic import BaseModel
+
+from jarvis.agents import AsyncAnthropicAgent
+from jarvis.tools._tool import AnthropicTool, AsyncAnthropicTool
+
+
+def _message(*content: TextBlock | ToolUseBlock) -> Message:
+    tool_use = any(b.type == "tool_use" for b in content)
+    return Message(
+        id="msg",
+        content=list(content),
+        model="claude",
+        role="assistant",
+        stop_reason="tool_use" if tool_use else "end_turn",
+        type="message",
+        usage=Usage(input_tokens=10, output_tokens=5),
+    )
+
+
+class _Stream:
+    def __init__(self, message: Message) -> None:
+        self._message = message
+
+    async def __aenter__(self) -> "_Stream":
+        return self
+
+    async def __aexit__(self, *exc: typing.Any) -> None:
+        pass
+
+    async def __aiter__(self) -> typing.AsyncIterator[typing.Any]:
+        for block in self._message.content:
+            if block.type == "text":
+                yield types.SimpleNamespace(type="text", text=block.text)
+            yield types.SimpleNamespace(type="content_block_stop", content_block=block)
+
+    async def get_final_message(self) -> Message:
+        return self._message
+
+
+class _Messages:
+    """Stands in for `anthropic.AsyncClient().messages`, replaying one
+    response per turn and calling `done` when handing out the last one."""
+
+    def __init__(self, responses: list[Message], done: typing.Callable[[], None]):
+        self.responses = responses
+        self.requests = list[dict[str, typing.Any]]()
+        self.done = done
+
+    def stream(self, **params: typing.Any) -> _Stream:
+        self.requests.append(params)
+        if len(self.responses) == 1:
+            self.done()
+        return _Stream(self.responses.pop(0))
+
+
+def _agent(*responses: Message) -> tuple[AsyncAnthropicAgent, _Messages]:
+    messages = _Messages(list(responses), lambda: agent.cancel())
+    client = types.SimpleNamespace(messages=messages)
+    agent = AsyncAnthropicAgent(
+        directive="Be brief.",
+        max_tokens=256,
+        anthropic_client=typing.cast(typing.Any, client),
+    )
+    return agent, messages
+
+
+def test_one_streamed_turn():
+    agent, messages = _agent(_message(TextBlock(type="text", text="Hello there")))
+    asyncio.run(agent.act("hi"))
+
+    assert len(messages.requests) == 1
+    assert agent.last_turn_metrics is not None
+    assert agent.last_turn_metrics.time_to_first_token is not None
+    assert [m["role"] for m in agent._memory] == ["user", "assistant", "user"]
+
+
+class _LookupInput(BaseModel):
+    control_type: typing.Literal["lookup"] = "lookup"
+    key: str
+
+
+class _LookupControls(BaseModel):
+    input: _LookupInput
+
+
+class _LookupOutput(BaseModel):
+    value: str
+    error: bool = False
+
+
+class _AsyncLookup(AsyncAnthropicTool[_LookupControls, _LookupOutput]):
+    controls = _LookupControls
+
+    def __init__(self, on_use: typing.Callable[[], None] = lambda: None) -> None:
+        self.keys = list[str]()
+        self.on_use = on_use
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Lookup"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Looks up a key."
+
+    @typing.override
+    async def _use(self, control_request: _LookupControls) -> _LookupOutput:
+        await asyncio.sleep(0)
+        self.keys.append(control_request.input.key)
+        self.on_use()
+        return _LookupOutput(value=control_request.input.key.upper())
+
+
+class _SyncLookup(AnthropicTool[_LookupControls, _LookupOutput]):
+    controls = _LookupControls
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "SyncLookup"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Looks up a key, blocking."
+
+    @typing.override
+    def _use(self, control_request: _LookupControls) -> _LookupOutput:
+        if control_request.input.key == "down":
+            raise ConnectionError("Connection refused")
+        return _LookupOutput(value=control_request.input.key * 2)
+
+
+def _tool_use(id_: str, name: str, key: str) -> ToolUseBlock:
+    return ToolUseBlock(
+        type="tool_use",
+        id=id_,
+        name=name,
+        input={"input": {"control_type": "lookup", "key": key}},
+    )
+
+
+def test_tool_calls_run_and_results_come_back_in_order():
+    agent, messages = _agent(
+        _message(
+            TextBlock(type="text", text="Looking it up"),
+            _tool_use("t1", "Lookup", "a"),
+            _tool_use("t2", "SyncLookup", "b"),
+            _tool_use("t3", "Missing", "c"),
+        ),
+        _message(TextBlock(type="text", text="A and bb")),
+    )
+    lookup = _AsyncLookup()
+    agent.register_tool(lookup)
+    agent.register_tool(_SyncLookup())
+    asyncio.run(agent.act("look up a and b"))
+
+    assert lookup.keys == ["a"]
+    assert len(messages.requests) == 2
+    assert [t["name"] for t in messages.requests[0]["tools"]] == [
+        "Lookup",
+        "SyncLookup",
+    ]
+    results = messages.requests[1]["messages"][-1]["content"]
+    assert [r["tool_use_id"] for r in results] == ["t1", "t2", "t3"]
+    assert json.loads(results[0]["content"])["value"] == "A"
+    assert json.loads(results[1]["content"])["value"] == "bb"
+    assert results[2]["is_error"]
+
+
+def test_cancel_ends_the_request_after_the_current_turn():
+    agent, messages = _agent(
+        _message(_tool_use("t1", "Lookup", "a")),
+        _message(_tool_use("t2", "Lookup", "b")),
+        _message(TextBlock(type="text", text="never asked for")),
+    )
+    lookup = _AsyncLookup(on_use=agent.cancel)
+    agent.register_tool(lookup)
+    asyncio.run(agent.act("look up a"))
+
+    assert lookup.keys == ["a"]
+    assert len(messages.requests) == 1
+    # The turn in flight is still remembered, tool result included
+    assert agent._memory.messages()[-1]["content"][0]["tool_use_id"] == "t1"
+
+    asyncio.run(agent.act("and b"))
+    assert len(messages.requests) == 1
+
+
+def test_a_failing_tool_call_is_reported_with_the_others():
+    agent, messages = _agent(
+        _message(
+            _tool_use("t1", "SyncLookup", "down"), _tool_use("t2", "SyncLookup", "b")
+        ),
+        _message(TextBlock(type="text", text="Only b")),
+    )
+    agent.register_tool(_SyncLookup())
+    asyncio.run(agent.act("look up down and b"))
+
+    results = messages.requests[1]["messages"][-1]["content"]
+    assert [r["is_error"] for r in results] == [True, False]
+    assert json.loads(results[0]["content"]) == {"error": "Connection refused"}
+    assert json.loads(results[1]["content"])["value"] == "bb"
+
+
+class _Slow(AsyncAnthropicTool[_LookupControls, _LookupOutput]):
+    """Exclusive, hangs on every key but "fast"."""
+
+    controls = _LookupControls
+    exclusive = True
+    timeout = 0.1
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Slow"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Looks up a key, slowly."
+
+    @typing.override
+    async def _use(self, control_request: _LookupControls) -> _LookupOutput:
+        if control_request.input.key != "fast":
+            await asyncio.Event().wait()
+        return _LookupOutput(value=control_request.input.key)
+
+
+def test_a_timed_out_call_is_cancelled_and_releases_its_lock():
+    agent, messages = _agent(
+        _message(_tool_use("t1", "Slow", "hang")),
+        _message(_tool_use("t2", "Slow", "fast")),
+        _message(TextBlock(type="text", text="Done")),
+    )
+    agent.register_tool(_Slow())
+    asyncio.run(agent.act("look up both"))
+
+    first = messages.requests[1]["messages"][-1]["content"][0]
+    assert first["is_error"]
+    second = messages.requests[2]["messages"][-1]["content"][0]
+    assert not second["is_error"]
+    assert json.loads(second["content"])["value"] == "fast"
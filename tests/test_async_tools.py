@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+
+from jarvis.tools import HttpCache, ResponseCache
+from jarvis.tools.browser import AsyncBrowser
+from jarvis.tools.google_search import AsyncGoogleSearch
+
+PAGE = b"<html><body><main><h1>Title</h1><p>Some text.</p></main></body></html>"
+
+
+def test_identical_searches_in_flight_hit_the_api_once():
+    requests = list[str]()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.params["q"])
+        await asyncio.sleep(0.05)
+        items = [{"link": "https://a.test", "title": "A", "htmlSnippet": "a"}]
+        return httpx.Response(200, json={"items": items})
+
+    async def scenario() -> None:
+        cache = ResponseCache()
+        search = AsyncGoogleSearch(
+            "key",
+            "engine",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            cache=cache,
+        )
+        outputs = await asyncio.gather(
+            search._run_query("Weather today"),
+            search._run_query("weather  TODAY"),
+        )
+        assert outputs[0] == outputs[1]
+        assert [r.url for r in outputs[0].results] == ["https://a.test"]
+        assert cache.stats.misses == 1 and cache.stats.coalesced == 1
+
+        await search._run_query("weather today")
+        assert cache.stats.hits == 1
+
+    asyncio.run(scenario())
+    assert requests == ["Weather today"]
+
+
+def test_failed_searches_are_not_cached():
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(500)
+
+    async def scenario() -> None:
+        search = AsyncGoogleSearch(
+            "key",
+            "engine",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            cache=ResponseCache(),
+        )
+        controls = {"input": {"control_type": "run_query", "query": "q"}}
+        outputs = await asyncio.gather(search.use(controls), search.use(controls))
+        assert all(o.error for o in outputs)
+        assert (await search.use(controls)).error
+
+    asyncio.run(scenario())
+    assert calls == 2
+
+
+def test_visit_many_reports_errors_per_url_and_serves_fresh_pages(tmp_path):
+    fetched = list[str]()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        fetched.append(str(request.url))
+        if request.url.host == "down.test":
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(
+            200, headers={"Cache-Control": "max-age=60"}, content=PAGE
+        )
+
+    async def scenario() -> None:
+        browser = AsyncBrowser(
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            cache=HttpCache(str(tmp_path)),
+        )
+        urls = ["https://up.test/", "https://down.test/"]
+        first = await browser.visit_many(urls)
+        assert first.results[0].text is not None
+        assert "Some text." in first.results[0].text
+        assert not first.results[0].error
+        assert first.results[1].error
+        assert first.results[1].reason == "Connection refused"
+
+        second = await browser.visit_many(urls)
+        assert second.results[0].text == first.results[0].text
+
+    asyncio.run(scenario())
+    assert fetched.count("https://up.test/") == 1
+    assert fetched.count("https://down.test/") == 2
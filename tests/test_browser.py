@@ -0,0 +1,83 @@
+import typing
+
+from jarvis.tools import HttpCache
+from jarvis.tools.browser import Browser
+
+CHUNKS = [b"<html><body><main>"] + [
+    b"<p>Paragraph %d of a long article.</p>" % i for i in range(500)
+]
+
+
+class _Response:
+    def __init__(self, chunks: list[bytes], headers: dict[str, str]) -> None:
+        self.status_code = 200
+        self.headers = {"Cache-Control": "max-age=60", **headers}
+        self.chunks = chunks
+        self.read = 0
+
+    def __enter__(self) -> "_Response":
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        pass
+
+    def iter_content(self, chunk_size: int) -> typing.Iterator[bytes]:
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+class _Session:
+    """Serves `chunks` as a streamed body, one chunk per read."""
+
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.chunks = chunks
+        self.headers = dict[str, str]()
+        self.responses = list[_Response]()
+
+    def get(self, url: str, **kwargs: typing.Any) -> _Response:
+        self.responses.append(_Response(self.chunks, self.headers))
+        return self.responses[-1]
+
+
+def test_download_stops_once_the_page_is_read(tmp_path):
+    session = _Session(CHUNKS)
+    browser = Browser(typing.cast(typing.Any, session), HttpCache(str(tmp_path)))
+    visit = browser._visit("https://a.test", max_tokens=100)
+    assert visit.has_more
+    assert visit.text.startswith("Paragraph 0 of a long article.")
+    assert session.responses[0].read < len(CHUNKS) // 2
+
+    # Only part of the body was seen, so it can't be served from the cache
+    browser._visit("https://a.test", max_tokens=100)
+    assert len(session.responses) == 2
+
+
+def test_pages_read_to_the_end_are_cached(tmp_path):
+    session = _Session(CHUNKS[:4] + [b"</main></body></html>"])
+    browser = Browser(typing.cast(typing.Any, session), HttpCache(str(tmp_path)))
+    first = browser._visit("https://a.test")
+    assert not first.has_more
+    assert browser._visit("https://a.test") == first
+    assert len(session.responses) == 1
+
+
+def test_bodies_are_cut_off_after_max_bytes(tmp_path):
+    session = _Session([b"<p>" + b"x" * 100, b"y" * 100 + b"</p>"])
+    browser = Browser(
+        typing.cast(typing.Any, session), HttpCache(str(tmp_path)), max_bytes=150
+    )
+    visit = browser._visit("https://a.test")
+    assert visit.text == "x" * 100 + "y" * 47
+    browser._visit("https://a.test")
+    assert len(session.responses) == 2
+
+
+def test_the_response_charset_reaches_the_extractor(tmp_path):
+    session = _Session(["<p>café</p>".encode("latin-1")])
+    session.headers["Content-Type"] = "text/html; charset=ISO-8859-1"
+    browser = Browser(typing.cast(typing.Any, session), HttpCache(str(tmp_path)))
+    assert browser._visit("https://a.test").text == "café"
+    # and it's kept with the cached body
+    assert browser._visit("https://a.test").text == "café"
+    assert len(session.responses) == 1
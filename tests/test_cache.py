@@ -0,0 +1,108 @@
+import contextlib
+import sqlite3
+import threading
+
+from jarvis.tools import ResponseCache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    clock = _Clock()
+    cache = ResponseCache(max_entries=2, ttl=10.0, clock=clock)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+    clock.now = 11.0
+    assert cache.get("a") is None
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 2
+    assert cache.stats.evictions == 1
+
+
+def test_entries_survive_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path=path)
+    cache.put("weather today", "sunny")
+    cache.close()
+
+    assert ResponseCache(path=path).get("weather today") == "sunny"
+
+
+def test_least_recently_used_entries_are_evicted_from_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    clock = _Clock()
+    cache = ResponseCache(max_entries=2, path=path, clock=clock)
+    cache.put("a", "1")
+    clock.now = 1.0
+    cache.put("b", "2")
+    clock.now = 2.0
+    assert cache.get("a") == "1"
+    clock.now = 3.0
+    cache.put("c", "3")
+    cache.close()
+
+    reopened = ResponseCache(max_entries=2, path=path, clock=clock)
+    assert reopened.get("a") == "1"
+    assert reopened.get("b") is None
+
+
+def test_hits_dont_write_to_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    clock = _Clock()
+    cache = ResponseCache(path=path, clock=clock)
+    cache.put("a", "1")
+    clock.now = 5.0
+    assert cache.get("a") == "1"
+
+    def used() -> float:
+        with contextlib.closing(sqlite3.connect(path)) as db:
+            return db.execute("SELECT used FROM cache WHERE key = 'a'").fetchone()[0]
+
+    assert used() == 0.0
+    cache.close()
+    assert used() == 5.0
+
+
+def test_identical_in_flight_lookups_are_coalesced():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = list[int]()
+
+    def compute() -> str:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = list[str]()
+    owner = threading.Thread(
+        target=lambda: results.append(cache.get_or_compute("q", compute))
+    )
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(
+        target=lambda: results.append(cache.get_or_compute("q", compute))
+    )
+    waiter.start()
+    while cache.stats.coalesced == 0:
+        pass
+    release.set()
+    owner.join()
+    waiter.join()
+
+    assert results == ["result", "result"]
+    assert len(calls) == 1
+    assert cache.get_or_compute("q", compute) == "result"
+    assert len(calls) == 1
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from jarvis.utils.deferred import Deferred
+
+
+class _Client:
+    def ping(self) -> str:
+        return "pong"
+
+
+def test_built_once_on_first_use():
+    calls = list[int]()
+    client = Deferred(lambda: calls.append(1) or _Client(), "client")
+    assert not client.built and calls == []
+    assert client.ping() == "pong"
+    assert client.ping() == "pong"
+    assert client.built and calls == [1]
+
+
+def test_warm_builds_in_the_background():
+    release = threading.Event()
+
+    def factory() -> _Client:
+        release.wait(5)
+        return _Client()
+
+    client = Deferred(factory, "client").warm()
+    assert not client.built
+    release.set()
+    assert isinstance(client.get(), _Client)
+    assert client.built
+
+
+def test_failed_build_is_retried():
+    attempts = list[int]()
+
+    def factory() -> _Client:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return _Client()
+
+    client = Deferred(factory, "client")
+    with pytest.raises(ConnectionError):
+        client.get()
+    assert client.ping() == "pong"
+    assert len(attempts) == 2
+
+
+def test_if_built_never_builds():
+    calls = list[int]()
+    client = Deferred(lambda: calls.append(1) or _Client(), "client")
+    seen = list[_Client]()
+    client.if_built(seen.append)
+    assert seen == [] and calls == [] and not client.built
+
+    client.get()
+    client.if_built(seen.append)
+    assert seen == [client.get()]
+
+
+def test_if_built_waits_for_a_build_under_way():
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory() -> _Client:
+        started.set()
+        release.wait(5)
+        return _Client()
+
+    client = Deferred(factory, "client").warm()
+    started.wait(5)
+    seen = list[_Client]()
+    threading.Timer(0.05, release.set).start()
+    client.if_built(seen.append)
+    assert len(seen) == 1
@@ -0,0 +1,61 @@
+import pytest
+
+from jarvis.tools._extract import BACKENDS, DEFAULT_BACKEND, extract_text
+
+ARTICLE = (
+    b"<html><head><title>T</title><style>p{}</style></head><body>"
+    b"<nav><ul><li>Home<li>About</ul></nav><main><h1>Fish &amp; chips</h1>"
+    + b"".join(b"<p>Paragraph %d of the article.</p>" % i for i in range(100))
+    + b"</main><footer>Footer</footer><script>var x = '<p>';</script>"
+    b"</body></html>"
+)
+BACKENDS_AVAILABLE = [b for b in BACKENDS if b == "html.parser" or b == DEFAULT_BACKEND]
+
+
+@pytest.mark.parametrize("backend", BACKENDS_AVAILABLE)
+def test_boilerplate_is_dropped(backend):
+    page = extract_text(ARTICLE, "|", backend=backend)
+    assert page.text.startswith("Fish & chips|Paragraph 0 of the article.")
+    assert page.text.endswith("Paragraph 99 of the article.")
+    for boilerplate in ("Home", "Footer", "var x", "p{}", "T|"):
+        assert boilerplate not in page.text
+    assert not page.has_more
+
+
+@pytest.mark.parametrize("backend", BACKENDS_AVAILABLE)
+def test_long_pages_are_paginated(backend):
+    first = extract_text(ARTICLE, "|", max_tokens=100, backend=backend)
+    second = extract_text(ARTICLE, "|", max_tokens=100, page=2, backend=backend)
+    assert len(first.text) <= 400
+    assert first.has_more
+    assert second.page == 2
+    last = int(first.text.rsplit("|", 1)[1].split()[1])
+    assert second.text.startswith(f"Paragraph {last + 1} of the article.")
+
+
+def test_declared_charset_is_honored():
+    html = '<meta charset="iso-8859-1"><p>café</p>'.encode("latin-1")
+    assert extract_text(html, "|", backend="html.parser").text == "café"
+
+
+@pytest.mark.parametrize("backend", BACKENDS_AVAILABLE)
+def test_form_and_header_text_is_kept(backend):
+    html = (
+        b"<header><h1>Release notes</h1></header>"
+        b"<form><label>Search the docs</label></form><p>Body</p>"
+    )
+    page = extract_text(html, "|", backend=backend)
+    assert page.text == "Release notes|Search the docs|Body"
+
+
+@pytest.mark.parametrize("backend", BACKENDS_AVAILABLE)
+def test_response_charset_takes_precedence(backend):
+    html = '<meta charset="utf-8"><p>café</p>'.encode("latin-1")
+    page = extract_text(html, "|", backend=backend, encoding="iso-8859-1")
+    assert page.text == "café"
+
+
+@pytest.mark.parametrize("backend", BACKENDS_AVAILABLE)
+def test_undeclared_pages_that_arent_utf8_are_windows_1252(backend):
+    html = "<p>“café”</p>".encode("cp1252")
+    assert extract_text(html, "|", backend=backend).text == "“café”"
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from jarvis.tools import HttpCache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_fresh_pages_are_served_until_max_age(tmp_path):
+    clock = _Clock()
+    cache = HttpCache(str(tmp_path), clock=clock)
+    cache.store("https://a.test", {"Cache-Control": "public, max-age=60"}, b"\xffpage")
+
+    entry = cache.lookup("https://a.test")
+    assert entry is not None
+    assert entry.body == b"\xffpage"
+    assert entry.is_fresh(clock.now)
+    assert not entry.is_fresh(clock.now + 61)
+
+
+def test_stale_pages_are_revalidated(tmp_path):
+    clock = _Clock()
+    cache = HttpCache(str(tmp_path), clock=clock)
+    cache.store(
+        "https://a.test",
+        {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+        b"page",
+    )
+    entry = cache.lookup("https://a.test")
+    assert entry is not None
+    assert not entry.is_fresh(clock.now)
+    assert entry.validators() == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+    entry = cache.refresh(entry, {"Cache-Control": "max-age=30"})
+    assert entry.is_fresh(clock.now)
+    assert entry.etag == '"v1"'
+
+
+def test_uncacheable_responses_are_not_stored(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    assert cache.store("https://a.test", {"Cache-Control": "no-store"}, b"x") is None
+    assert cache.store("https://b.test", {}, b"x") is None
+    assert cache.lookup("https://a.test") is None
+    assert cache.lookup("https://b.test") is None
+
+
+def test_freshness_follows_the_cache_clock(tmp_path):
+    clock = _Clock()
+    cache = HttpCache(str(tmp_path), clock=clock)
+    entry = cache.store("https://a.test", {"Cache-Control": "max-age=60"}, b"x")
+    assert entry is not None
+    assert cache.is_fresh(entry)
+    clock.now += 61
+    assert not cache.is_fresh(entry)
+
+
+def test_concurrent_writes_leave_no_temporary_files(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    headers = {"Cache-Control": "max-age=60"}
+    with ThreadPoolExecutor(8) as pool:
+        list(
+            pool.map(
+                lambda i: cache.store("https://a.test", headers, b"%d" % i),
+                range(64),
+            )
+        )
+    assert [p.suffix for p in tmp_path.iterdir()] == [".json"]
+    entry = cache.lookup("https://a.test")
+    assert entry is not None
+    assert int(entry.body) in range(64)
+
+
+def test_oldest_entries_are_removed(tmp_path):
+    cache = HttpCache(str(tmp_path), max_entries=2)
+    headers = {"Cache-Control": "max-age=60"}
+    for url in ("https://a.test", "https://b.test", "https://c.test"):
+        cache.store(url, headers, b"x")
+    assert cache.lookup("https://a.test") is None
+    assert cache.lookup("https://b.test") is not None
+    assert cache.lookup("https://c.test") is not None
+
+    cache.clear()
+    cache.store("https://d.test", headers, b"x")
+    assert [p.suffix for p in tmp_path.iterdir()] == [".json"]
@@ -0,0 +1,380 @@
+import asyncio
+import contextlib
+import json
+import math
+import struct
+import threading
+import time
+import types
+import typing
+
+import pytest
+from anthropic.types import TextBlock, ToolUseBlock
+
+from jarvis.config import Config
+from jarvis.daemon import Daemon
+from jarvis.ingress import AUDIO, DONE, TEXT, IngressClient, IngressServer
+from jarvis.tools import TranscriptionBackend
+from jarvis.tools.audio_transciever import (
+    AudioTranscieverControls,
+    OutputVoiceInput,
+    SpeechPipeline,
+)
+from jarvis.utils.capture import RemoteCapture
+from tests.test_agent import _Stream
+from tests.test_async_agent import _message
+
+RATE = 16_000
+
+
+class _Transcriber(TranscriptionBackend):
+    def __init__(self) -> None:
+        self.closed = False
+        self.delay = 0.0
+        self.transcribing = threading.Event()
+        self.closed_while_transcribing = False
+
+    def transcribe(self, pcm: bytes | bytearray, sample_rate: int) -> str:
+        self.transcribing.set()
+        time.sleep(self.delay)
+        self.transcribing.clear()
+        return "Hey Jarvis, what time is it?"
+
+    def close(self) -> None:
+        self.closed = True
+        self.closed_while_transcribing = self.transcribing.is_set()
+
+
+class _Speech:
+    """Stands in for `openai_client.audio.speech.with_streaming_response`."""
+
+    @contextlib.contextmanager
+    def create(self, input: str, **kwargs: typing.Any) -> typing.Iterator[typing.Any]:
+        yield types.SimpleNamespace(iter_bytes=lambda size: [bytes(size)] * 3)
+
+
+class _EchoAgent:
+    """Says back whatever it was asked, through the session's speech
+    pipeline or its transciever."""
+
+    def __init__(self, speech: SpeechPipeline | None, **kwargs: typing.Any) -> None:
+        self.speech = speech
+        self.tools = dict[str, typing.Any]()
+        self.requests = list[str]()
+        self.closed = False
+
+    def register_tool(self, tool: typing.Any) -> None:
+        self.tools[tool.get_name()] = tool
+
+    def act(self, request: str) -> None:
+        self.requests.append(request)
+        if self.speech is not None:
+            self.speech.feed(f"You said {request}")
+            self.speech.flush()
+            return
+        self.tools["AudioTransciever"].use(
+            AudioTranscieverControls(input=OutputVoiceInput(text=f"You said {request}"))
+        )
+
+    def cancel(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+        if self.speech is not None:
+            self.speech.close()
+
+
+class _Daemon(Daemon):
+    agent_type = typing.cast(typing.Any, _EchoAgent)
+
+
+def _daemon(
+    pipelined_speech: bool = False, anthropic_client: typing.Any = None
+) -> Daemon:
+    config = Config()
+    config.rooms = []
+    config.ingress_port = None
+    config.wake_word = None
+    config.fast_start = False
+    config.pipelined_speech = pipelined_speech
+    config.model_routing = False
+    config.browser_cache_dir = None
+    config.search_cache_path = None
+    openai_client = types.SimpleNamespace(
+        audio=types.SimpleNamespace(
+            speech=types.SimpleNamespace(with_streaming_response=_Speech())
+        )
+    )
+    daemon_type = _Daemon if anthropic_client is None else Daemon
+    return daemon_type(
+        config=config,
+        anthropic_client=typing.cast(typing.Any, anthropic_client),
+        openai_client=typing.cast(typing.Any, openai_client),
+        google_client=typing.cast(typing.Any, None),
+        transcriber=_Transcriber(),
+    )
+
+
+class _Conversation:
+    """Stands in for `anthropic.Client().messages`: says back what it heard,
+    through the speech pipeline, and listens for more."""
+
+    def __init__(self) -> None:
+        self.heard = list[str]()
+
+    def stream(self, **params: typing.Any) -> _Stream:
+        [block] = params["messages"][-1]["content"]
+        if block["type"] == "tool_result":
+            output = json.loads(block["content"])["output"]
+            text, typed = output["text"], output["typed"]
+        else:
+            text, typed = block["text"], True
+        content: list[typing.Any] = []
+        if text:
+            self.heard.append(text if typed else f"spoken: {text}")
+            content.append(TextBlock(type="text", text=f"You said {text}."))
+        listen = {"input": {"control_type": "record_voice_adaptive"}}
+        content.append(
+            ToolUseBlock(type="tool_use", id="t", name="AudioTransciever", input=listen)
+        )
+        return _Stream(_message(*content))
+
+
+def _utterance() -> bytes:
+    """Half a second of silence, a voice-like harmonic tone and a second of
+    silence to close it."""
+    samples = [
+        int(
+            8000
+            * (0.6 + 0.4 * math.sin(2 * math.pi * 4 * i / RATE))
+            * sum(math.sin(2 * math.pi * 120 * k * i / RATE) / k for k in range(1, 15))
+        )
+        for i in range(int(RATE * 1.5))
+    ]
+    voice = struct.pack(f"<{len(samples)}h", *samples)
+    return bytes(RATE) + voice + bytes(RATE * 2)
+
+
+async def _reply(client: IngressClient) -> tuple[list[str], int]:
+    """Transcripts and bytes of speech received until the speech is done."""
+    transcripts = list[str]()
+    speech = 0
+    while True:
+        kind, payload = await asyncio.wait_for(client.receive(), 10)
+        if kind == TEXT:
+            transcripts.append(payload.decode())
+        elif kind == AUDIO:
+            speech += len(payload)
+        elif kind == DONE:
+            return transcripts, speech
+
+
+async def _closed(daemon: Daemon) -> None:
+    deadline = time.monotonic() + 5
+    while daemon.sessions and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert daemon.sessions == []
+
+
+def test_streamed_audio_is_answered_over_the_connection():
+    daemon = _daemon()
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        client = await IngressClient.connect("127.0.0.1", server.port, "kitchen", RATE)
+        assert client.session == "kitchen"
+        [session] = daemon.sessions
+
+        pcm = _utterance()
+        for offset in range(0, len(pcm), 700):
+            await client.send_audio(pcm[offset : offset + 700])
+        transcripts, speech = await _reply(client)
+        assert transcripts == ["Hey Jarvis, what time is it?"]
+        assert speech > 0
+        # Only what follows the wake phrase reaches the agent
+        assert session.jarvis_agent.requests == ["what time is it"]
+
+        await client.close()
+        await _closed(daemon)
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_text_commands_skip_the_wake_phrase():
+    daemon = _daemon()
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        clients = [
+            await IngressClient.connect("127.0.0.1", server.port) for _ in range(3)
+        ]
+        assert len({c.session for c in clients}) == 3
+        for i, client in enumerate(clients):
+            await client.send_text(f"turn on light {i}")
+        for client in clients:
+            assert (await _reply(client))[1] > 0
+        requests = sorted(r for s in daemon.sessions for r in s.jarvis_agent.requests)
+        assert requests == [f"turn on light {i}" for i in range(3)]
+
+        for client in clients:
+            await client.close()
+        await _closed(daemon)
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_commands_reach_a_request_under_way():
+    # The real agent never ends its request, it keeps listening with its tool
+    conversation = _Conversation()
+    daemon = _daemon(
+        pipelined_speech=True,
+        anthropic_client=types.SimpleNamespace(messages=conversation),
+    )
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        client = await IngressClient.connect("127.0.0.1", server.port)
+        for i in range(2):
+            await client.send_text(f"turn on light {i}")
+            assert (await _reply(client))[1] > 0
+        assert conversation.heard == ["turn on light 0", "turn on light 1"]
+
+        await client.close()
+        await _closed(daemon)
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_reconnecting_clients_leave_nothing_running():
+    daemon = _daemon(pipelined_speech=True)
+    transcriber = typing.cast(_Transcriber, daemon._transcriber)
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        threads = None
+        agents = list[_EchoAgent]()
+        for i in range(4):
+            if i == 1:
+                # Counted once the event loop's worker threads are up
+                threads = threading.active_count()
+            client = await IngressClient.connect("127.0.0.1", server.port)
+            [session] = daemon.sessions
+            agents.append(typing.cast(_EchoAgent, session.jarvis_agent.get()))
+            await client.send_text(f"turn on light {i}")
+            assert (await _reply(client))[1] > 0
+            await client.close()
+            await _closed(daemon)
+
+        assert threads is not None
+        deadline = time.monotonic() + 5
+        while threading.active_count() > threads and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert threading.active_count() == threads
+        assert all(agent.closed for agent in agents)
+        # Shared by every session, closed only with the daemon
+        assert not transcriber.closed
+        await server.close()
+
+    asyncio.run(scenario())
+    daemon.stop()
+    assert transcriber.closed
+
+
+def test_stop_closes_the_sessions_before_what_they_share():
+    daemon = _daemon()
+    transcriber = typing.cast(_Transcriber, daemon._transcriber)
+    transcriber.delay = 0.3
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        client = await IngressClient.connect("127.0.0.1", server.port)
+        [session] = daemon.sessions
+        await client.send_audio(_utterance())
+        assert await asyncio.to_thread(transcriber.transcribing.wait, 5)
+
+        await asyncio.to_thread(daemon.stop)
+        assert daemon.sessions == []
+        assert session._idle.is_set()
+        assert transcriber.closed
+        assert not transcriber.closed_while_transcribing
+        await client.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_audio_larger_than_the_buffer_waits_for_room():
+    # 5 frames of 20ms, sent 8 at once
+    capture = RemoteCapture(RATE, 20, max_buffered_ms=100)
+    frame = RATE * 2 // 50
+    payload = b"".join(bytes([i]) * frame for i in range(8))
+    capture.push(payload)
+    assert capture.room() == 0
+    # The oldest frames were kept, nothing was written over them
+    frames = capture.frames()
+    assert [memoryview(next(frames).bytes)[0] for _ in range(2)] == [0, 1]
+    assert capture.room() == 0
+    # What was held back moves in with later pushes, as room frees up
+    capture.push(b"")
+    assert [memoryview(next(frames).bytes)[0] for _ in range(5)] == [2, 3, 4, 5, 6]
+    capture.push(b"")
+    assert memoryview(next(frames).bytes)[0] == 7
+    assert capture.room() == 5 * frame
+
+    capture = RemoteCapture(RATE, 20, max_buffered_ms=100)
+    session = types.SimpleNamespace(
+        audio_transciever=types.SimpleNamespace(capture=capture)
+    )
+    server = IngressServer(typing.cast(typing.Any, None), "127.0.0.1", 0)
+
+    async def main() -> list[bytes]:
+        reader = asyncio.create_task(
+            asyncio.to_thread(lambda: [bytes(f.bytes) for f in capture.frames()])
+        )
+        await server._receive(typing.cast(typing.Any, session), AUDIO, payload)
+        capture.stop()
+        return await reader
+
+    assert b"".join(asyncio.run(main())) == payload
+
+
+def test_unsupported_rate_is_refused():
+    daemon = _daemon()
+
+    async def scenario() -> None:
+        server = IngressServer(daemon, "127.0.0.1", 0)
+        await server.start()
+        with pytest.raises(ConnectionError, match="sample rate"):
+            await IngressClient.connect("127.0.0.1", server.port, rate=44_100)
+        assert daemon.sessions == []
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_remote_capture_frames_chunks_and_fills_up():
+    # 5 frames of 20ms
+    capture = RemoteCapture(RATE, 20, max_buffered_ms=100)
+    frame = RATE * 2 // 50
+    with capture.muted():
+        capture.push(bytes(frame * 10))
+    assert len(capture._ring) == 0
+    capture.push(bytes(frame // 2))
+    capture.push(bytes(frame * 3))
+    assert capture.has_room()
+    capture.push(bytes(frame * 2))
+    assert not capture.has_room()
+
+    capture.stop()
+    frames = list(capture.frames())
+    assert len(frames) == 5
+    assert all(len(f.bytes) == frame for f in frames)
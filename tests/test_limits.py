@@ -0,0 +1,50 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jarvis.config import Room, _parse_rooms
+from jarvis.utils.limits import CallLimit
+
+
+def test_bounds_calls_in_flight():
+    limit = CallLimit(2)
+    active = list[int]()
+    lock = threading.Lock()
+    running = 0
+
+    def call() -> None:
+        nonlocal running
+        with limit.slot():
+            with lock:
+                running += 1
+                active.append(running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: call(), range(16)))
+    assert max(active) == 2
+    assert limit.peak == 2 and limit.active == 0
+    assert limit.waited > 0
+
+
+def test_slot_released_on_error():
+    limit = CallLimit(1)
+    with pytest.raises(RuntimeError):
+        with limit.slot():
+            raise RuntimeError("boom")
+    with limit.slot() as waited:
+        assert waited < 0.1
+    assert limit.active == 0
+
+
+def test_rooms():
+    assert _parse_rooms("") == [Room("default")]
+    assert _parse_rooms("kitchen=2:3, office=5,hall=") == [
+        Room("kitchen", 2, 3),
+        Room("office", 5, None),
+        Room("hall", None, None),
+    ]
@@ -0,0 +1,121 @@
+import threading
+
+from anthropic.types import MessageParam
+
+from jarvis.agents import ConversationMemory
+
+
+def _turn(i: int, size: int = 400) -> list[MessageParam]:
+    return [
+        MessageParam(role="user", content=f"request {i} " + "x" * size),
+        MessageParam(
+            role="assistant",
+            content=[
+                {"type": "tool_use", "id": f"t{i}", "name": "Browser", "input": {}}
+            ],
+        ),
+        MessageParam(
+            role="user",
+            content=[{"type": "tool_result", "tool_use_id": f"t{i}", "content": "ok"}],
+        ),
+        MessageParam(role="assistant", content=[{"type": "text", "text": "done"}]),
+    ]
+
+
+def test_memory_is_unbounded_by_default():
+    memory = ConversationMemory()
+    for i in range(50):
+        for message in _turn(i):
+            memory.append(message)
+    assert len(memory) == 200
+    assert memory.summary is None
+
+
+def test_memory_compacts_whole_turns_into_summary():
+    summarized = list[int]()
+
+    def summarize(previous, messages):
+        summarized.append(len(messages))
+        return f"{previous or ''}+{len(messages)}"
+
+    memory = ConversationMemory(token_budget=500, summarize=summarize)
+    for i in range(10):
+        for message in _turn(i):
+            memory.append(message)
+        memory.wait()
+
+    assert summarized
+    assert memory.summary is not None
+    assert memory.total_tokens() <= 500 + 150
+    messages = memory.messages()
+    # Never starts with a dangling tool_result
+    assert messages[0]["role"] == "user"
+    assert isinstance(messages[0]["content"], str)
+    tool_uses = {
+        b["id"]
+        for m in messages
+        if not isinstance(m["content"], str)
+        for b in m["content"]
+        if b["type"] == "tool_use"
+    }
+    tool_results = {
+        b["tool_use_id"]
+        for m in messages
+        if not isinstance(m["content"], str)
+        for b in m["content"]
+        if b["type"] == "tool_result"
+    }
+    assert tool_uses == tool_results
+
+
+def test_memory_keeps_history_when_summary_fails():
+    def summarize(previous, messages):
+        raise RuntimeError("unavailable")
+
+    memory = ConversationMemory(token_budget=100, summarize=summarize)
+    for message in _turn(0) + _turn(1):
+        memory.append(message)
+    memory.wait()
+    assert len(memory) == 8
+
+
+def test_a_long_tool_loop_is_compacted_between_pairs():
+    memory = ConversationMemory(
+        token_budget=500, summarize=lambda previous, messages: "summary"
+    )
+    memory.append(MessageParam(role="user", content="research this"))
+    # One request, so the only plain user message is the first
+    for i in range(20):
+        for message in _turn(i)[1:3]:
+            memory.append(message)
+        memory.wait()
+
+    assert memory.summary == "summary"
+    assert memory.total_tokens() <= 500 + 150
+    messages = memory.messages()
+    assert messages[0]["role"] == "user"
+    assert messages[1]["role"] == "assistant"
+    assert messages[-1]["content"][0]["tool_use_id"] == "t19"
+    for assistant, user in zip(messages[1::2], messages[2::2]):
+        assert assistant["content"][0]["id"] == user["content"][0]["tool_use_id"]
+
+
+def test_a_compaction_running_during_clear_is_discarded():
+    started = threading.Event()
+    release = threading.Event()
+
+    def summarize(previous, messages):
+        started.set()
+        release.wait(5)
+        return "stale"
+
+    memory = ConversationMemory(token_budget=100, summarize=summarize)
+    for message in _turn(0) + _turn(1):
+        memory.append(message)
+    assert started.wait(5)
+    memory.clear()
+    release.set()
+    memory.wait()
+
+    assert memory.summary is None
+    assert len(memory) == 0
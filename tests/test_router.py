@@ -0,0 +1,36 @@
+from anthropic.types import Usage
+
+from jarvis.agents import ModelRouter
+from jarvis.agents._router import RoutingSignals
+
+
+def _router() -> ModelRouter:
+    return ModelRouter("fast", "strong", max_fast_chars=50, max_fast_depth=2)
+
+
+def test_short_requests_use_the_fast_model():
+    router = _router()
+    assert router.choose(RoutingSignals(request_chars=20)) == "fast"
+    assert router.choose(RoutingSignals(request_chars=200)) == "strong"
+    assert router.choose(RoutingSignals(request_chars=20, depth=2)) == "strong"
+
+
+def test_tool_errors_escalate_for_the_rest_of_the_request():
+    router = _router()
+    signals = RoutingSignals(request_chars=20, depth=1, previous_error=True)
+    assert router.choose(signals) == "strong"
+
+    signals.previous_error = False
+    assert router.choose(signals) == "strong"
+    assert router.stats["strong"].escalations == 1
+
+
+def test_usage_is_recorded_per_model():
+    router = _router()
+    router.record("fast", 0.5, Usage(input_tokens=100, output_tokens=10))
+    router.record("fast", 1.5, Usage(input_tokens=50, output_tokens=5))
+    stats = router.stats["fast"]
+    assert stats.calls == 2
+    assert stats.input_tokens == 150
+    assert stats.output_tokens == 15
+    assert stats.mean_latency == 1.0
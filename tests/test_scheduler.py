@@ -0,0 +1,90 @@
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pydantic import BaseModel
+
+from jarvis.agents import ToolScheduler
+from jarvis.tools._tool import AnthropicTool
+
+
+class _Input(BaseModel):
+    key: str
+
+
+class _Controls(BaseModel):
+    input: _Input
+
+
+class _Output(BaseModel):
+    value: str
+
+
+class _Gated(AnthropicTool[_Controls, _Output]):
+    """One call at a time, each waits for `gate` to open."""
+
+    controls = _Controls
+    max_concurrency = 1
+    timeout = 0.2
+
+    def __init__(self) -> None:
+        self.gate = threading.Event()
+        self.keys = list[str]()
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Gated"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Waits for its gate."
+
+    @typing.override
+    def _use(self, control_request: _Controls) -> _Output:
+        self.keys.append(control_request.input.key)
+        self.gate.wait(5)
+        return _Output(value=control_request.input.key)
+
+
+class _Echo(AnthropicTool[_Controls, _Output]):
+    controls = _Controls
+
+    @typing.override
+    @classmethod
+    def get_name(cls) -> str:
+        return "Echo"
+
+    @typing.override
+    @classmethod
+    def get_description(cls) -> str:
+        return "Echoes a key."
+
+    @typing.override
+    def _use(self, control_request: _Controls) -> _Output:
+        return _Output(value=control_request.input.key)
+
+
+def _input(key: str) -> dict[str, typing.Any]:
+    return {"input": {"key": key}}
+
+
+def test_calls_over_a_limit_dont_hold_pool_threads():
+    with ThreadPoolExecutor(2) as executor:
+        scheduler = ToolScheduler(executor=executor)
+        gated = _Gated()
+        first = scheduler.submit(gated, _input("a"))
+        queued = scheduler.submit(gated, _input("b"))
+        # The second pool thread is still free for other tools
+        assert scheduler.submit(_Echo(), _input("c")).result(1).value == "c"
+
+        # Timed out waiting for its turn, it never runs
+        with pytest.raises(TimeoutError):
+            queued.result()
+        with pytest.raises(TimeoutError):
+            first.result()
+        gated.gate.set()
+        assert scheduler.submit(gated, _input("d")).result(1).value == "d"
+        assert gated.keys == ["a", "d"]
@@ -0,0 +1,47 @@
+import threading
+import time
+import types
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from jarvis.tools.google_search import GoogleSearch
+
+
+class _Client:
+    """Stands in for the Custom Search client, recording which `Http` each
+    request went out on and how many were in flight at once."""
+
+    def __init__(self) -> None:
+        self.https = list[tuple[int, typing.Any]]()
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def cse(self) -> typing.Any:
+        return types.SimpleNamespace(list=self._list)
+
+    def _list(self, q: str, cx: str) -> typing.Any:
+        return types.SimpleNamespace(execute=self._execute)
+
+    def _execute(self, http: typing.Any = None) -> dict[str, typing.Any]:
+        with self._lock:
+            self.https.append((threading.get_ident(), http))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.02)
+        with self._lock:
+            self.in_flight -= 1
+        return {"items": []}
+
+
+def test_threads_search_over_their_own_http_within_the_limit():
+    client = _Client()
+    search = GoogleSearch(typing.cast(typing.Any, client), "engine")
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda i: search._run_query(f"query {i}"), range(24)))
+
+    assert client.peak == GoogleSearch.max_concurrency
+    https = dict[int, typing.Any]()
+    for thread, http in client.https:
+        assert https.setdefault(thread, http) is http
+    assert len({id(http) for http in https.values()}) == len(https) > 1
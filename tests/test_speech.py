@@ -0,0 +1,76 @@
+import typing
+
+from jarvis.tools.audio_transciever import AudioTransciever, SpeechPipeline
+
+
+class _Transciever:
+    """Synthesizes each sentence as one chunk per word and plays them into a
+    list, failing while `failures` are left."""
+
+    def __init__(self, failures: int = 0, fail_after: int = 0) -> None:
+        self.played = list[list[bytes]]()
+        self.failures = failures
+        self.fail_after = fail_after
+
+    def _synthesize(self, text: str) -> typing.Iterator[bytes]:
+        for word in text.split():
+            yield word.encode()
+
+    def _play_pcm(self, chunks: typing.Iterable[bytes]) -> None:
+        sentence = list[bytes]()
+        for i, chunk in enumerate(chunks):
+            if self.failures and i == self.fail_after:
+                self.failures -= 1
+                raise OSError("Device unavailable")
+            sentence.append(chunk)
+        self.played.append(sentence)
+
+    def _record_time_to_first_audio(self, started_at: float) -> None:
+        pass
+
+
+def _pipeline(transciever: _Transciever) -> SpeechPipeline:
+    pipeline = SpeechPipeline(
+        typing.cast(AudioTransciever, transciever), min_sentence_length=1
+    )
+    pipeline.RETRY_DELAY = 0.01
+    return pipeline
+
+
+def test_sentences_are_played_in_order():
+    transciever = _Transciever()
+    pipeline = _pipeline(transciever)
+    pipeline.feed("One two. Three")
+    pipeline.feed(" four.")
+    pipeline.flush()
+    assert transciever.played == [[b"One", b"two."], [b"Three", b"four."]]
+
+
+def test_a_failed_sentence_is_dropped_whole():
+    # Fails before the first chunk, as when the output stream can't be opened
+    transciever = _Transciever(failures=2)
+    pipeline = _pipeline(transciever)
+    pipeline.feed("Lost sentence. Also lost. ")
+    pipeline.flush()
+    pipeline.feed("Spoken sentence.")
+    pipeline.flush()
+    assert transciever.played == [[b"Spoken", b"sentence."]]
+    assert transciever.failures == 0
+
+
+def test_the_rest_of_a_sentence_is_not_played_as_the_next_one():
+    transciever = _Transciever(failures=1, fail_after=1)
+    pipeline = _pipeline(transciever)
+    pipeline.feed("Cut off mid sentence. Next one.")
+    pipeline.flush()
+    assert transciever.played == [[b"Next", b"one."]]
+
+
+def test_close_stops_the_workers_after_speaking():
+    transciever = _Transciever()
+    pipeline = _pipeline(transciever)
+    pipeline.feed("Last words. ")
+    workers = list(pipeline._workers)
+    pipeline.close()
+    assert transciever.played == [[b"Last", b"words."]]
+    assert not any(worker.is_alive() for worker in workers)
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from jarvis.agents import ToolScheduler
+from jarvis.tools._tool import AnthropicTool
+from jarvis.utils import tracing
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter()
+    previous = tracing.get_tracer()
+    tracing.set_tracer(tracing.Tracer([exporter]))
+    yield exporter
+    tracing.set_tracer(previous)
+
+
+class _EchoControls(BaseModel):
+    text: str
+
+
+class _EchoOutput(BaseModel):
+    text: str
+
+
+class _Echo(AnthropicTool[_EchoControls, _EchoOutput]):
+    controls = _EchoControls
+
+    @classmethod
+    def get_name(cls) -> str:
+        return "Echo"
+
+    @classmethod
+    def get_description(cls) -> str:
+        return "Echoes its input"
+
+    def _use(self, control_request: _EchoControls) -> _EchoOutput:
+        return _EchoOutput(text=control_request.text)
+
+
+def test_spans_nest_and_carry_attributes(exporter):
+    with tracing.span("daemon.cycle") as cycle:
+        with tracing.span("transcription", bytes=64000) as span:
+            span.set(chars=12, skipped=None)
+        # Not current, so it doesn't become the parent of later spans
+        with tracing.span("llm.create", current=False):
+            with tracing.span("tool.use"):
+                pass
+        cycle.set(activated=True)
+
+    spans = {s.name: s for s in exporter.spans}
+    assert [s.name for s in exporter.spans] == [
+        "transcription",
+        "tool.use",
+        "llm.create",
+        "daemon.cycle",
+    ]
+    root = spans["daemon.cycle"]
+    assert root.parent_id is None
+    assert all(s.trace_id == root.trace_id for s in exporter.spans)
+    assert spans["transcription"].parent_id == root.span_id
+    assert spans["tool.use"].parent_id == root.span_id
+    assert spans["transcription"].attributes == {"bytes": 64000, "chars": 12}
+    assert root.attributes == {"activated": True}
+
+
+def test_errors_are_recorded_and_raised(exporter):
+    with pytest.raises(ValueError):
+        with tracing.span("tts.synthesis"):
+            raise ValueError("no voice")
+    (span,) = exporter.spans
+    assert span.error == "ValueError: no voice"
+    assert span.to_dict()["status"] == "ERROR"
+
+
+def test_nothing_is_recorded_without_exporters():
+    tracer = tracing.Tracer()
+    with tracer.span("daemon.cycle") as span:
+        span.set(activated=True)
+    assert span.attributes == {}
+
+
+def test_tool_calls_keep_their_parent_across_threads(exporter):
+    scheduler = ToolScheduler()
+    with tracing.span("agent.act") as act:
+        assert scheduler.submit(_Echo(), {"text": "hi"}).result().text == "hi"
+    scheduler.shutdown()
+
+    (tool,) = [s for s in exporter.spans if s.name == "tool.use"]
+    assert tool.parent_id == act.span_id
+    assert tool.attributes == {"tool": "Echo"}
+
+
+def test_jsonl_trace_summary(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    tracer = tracing.Tracer([tracing.JsonlExporter(path)])
+    for tokens in (100, 200, 300):
+        with tracer.span("llm.create", input_tokens=tokens):
+            pass
+    tracer.close()
+
+    records = list(tracing.read_jsonl(path))
+    assert len(records) == 3
+    assert json.loads(json.dumps(records[0]))["attributes"] == {"input_tokens": 100}
+    summary = tracing.summarize(records)
+    assert "llm.create" in summary
+    assert "input_tokens=600" in summary
+
+
+def test_percentile():
+    values = sorted(float(v) for v in range(1, 101))
+    assert tracing.percentile(values, 50) == 50.0
+    assert tracing.percentile(values, 95) == 95.0
+    assert tracing.percentile([], 95) == 0.0
@@ -0,0 +1,80 @@
+from jarvis import utils
+
+SAMPLE_RATE = 32_000
+FRAME_BYTES = SAMPLE_RATE * 20 // 1000 * 2
+
+
+class PatternVad:
+    """Treats any frame whose first byte is non-zero as speech."""
+
+    def is_speech(self, buf, sample_rate):
+        return buf[0] != 0
+
+
+def _audio(pattern):
+    return b"".join(bytes([v]) * FRAME_BYTES for v in pattern) + b"\x00"
+
+
+def test_frame_generator_yields_views():
+    frames = list(utils.frame_generator(20, _audio([1, 0, 1]), SAMPLE_RATE))
+    assert len(frames) == 3
+    assert all(isinstance(f.bytes, memoryview) for f in frames)
+    assert frames[1].timestamp == frames[0].duration
+
+
+def test_vad_collector_yields_segments_as_they_close():
+    speech = [1] * 30
+    silence = [0] * 30
+    audio = _audio(silence + speech + silence + speech + silence)
+    collector = utils.VadCollector(SAMPLE_RATE, 20, 200, PatternVad())
+
+    closed_at = list[int]()
+    for i, frame in enumerate(utils.frame_generator(20, audio, SAMPLE_RATE)):
+        if collector.push(frame) is not None:
+            closed_at.append(i)
+
+    # Each segment closes once the padding window is mostly unvoiced
+    assert closed_at == [69, 129]
+    assert not collector.triggered
+
+
+def test_vad_collector_returns_leftover_audio():
+    audio = _audio([0] * 10 + [1] * 30)
+    segments, triggered = utils.vad_collector(
+        SAMPLE_RATE,
+        20,
+        200,
+        PatternVad(),
+        utils.frame_generator(20, audio, SAMPLE_RATE),
+    )
+    assert triggered
+    assert len(segments) == 1
+    assert set(segments[0]) == {1}
+
+
+def test_debug_sink_keeps_the_newest_files(tmp_path, monkeypatch):
+    scans = 0
+    scandir = utils.os.scandir
+
+    def counting_scandir(path):
+        nonlocal scans
+        scans += 1
+        return scandir(path)
+
+    monkeypatch.setattr(utils.os, "scandir", counting_scandir)
+    sink = utils.DebugSink(str(tmp_path), max_files=3, max_bytes=1024)
+    written = [sink.write(f"clip{i}", "pcm", b"x" * 100) for i in range(5)]
+    assert sorted(str(p) for p in tmp_path.iterdir()) == sorted(written[2:])
+    # Scanned on the first write and after max_files writes, not on every one
+    assert scans == 2
+
+    sink.write("big", "pcm", b"x" * 950)
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_file_retention_counts_rewrites_as_new(tmp_path):
+    retention = utils.FileRetention(str(tmp_path), max_files=2, max_bytes=1024)
+    for name in ("a", "b", "a", "c"):
+        (tmp_path / name).write_bytes(b"x")
+        retention.added(str(tmp_path / name), 1)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "c"]
@@ -0,0 +1,71 @@
+from jarvis.daemon import Daemon
+from jarvis.tools import (
+    CascadeWakeWordDetector,
+    TranscriptionBackend,
+    TranscriptWakeWordDetector,
+    WakeWordDetector,
+)
+
+RATE = 16_000
+
+
+class _Scripted(WakeWordDetector):
+    def __init__(self, accept: bool, head_ms: int = 1500) -> None:
+        super().__init__(head_ms)
+        self.accept = accept
+        self.heads = list[int]()
+
+    def _detect(self, head: memoryview, sample_rate: int) -> bool:
+        self.heads.append(len(head))
+        return self.accept
+
+
+class _Transcriber(TranscriptionBackend):
+    def __init__(self) -> None:
+        self.closed = 0
+
+    def transcribe(self, pcm: bytes | bytearray, sample_rate: int) -> str:
+        return "hey jarvis"
+
+    def close(self) -> None:
+        self.closed += 1
+
+
+def test_only_the_head_of_a_segment_is_checked():
+    detector = _Scripted(accept=False)
+    three_seconds = bytes(RATE * 2 * 3)
+    assert not detector.accepts(three_seconds, RATE)
+    assert detector.heads == [RATE * 2 * 1500 // 1000]
+    assert detector.stats.segments == 1
+    assert detector.stats.stt_calls_avoided == 1
+    assert detector.stats.audio_seconds == 1.5
+
+
+def test_cascade_stops_at_the_first_rejection():
+    spotter = _Scripted(accept=False, head_ms=2000)
+    verifier = _Scripted(accept=True)
+    cascade = CascadeWakeWordDetector(spotter, verifier)
+    assert not cascade.accepts(bytes(RATE * 2 * 3), RATE)
+    assert verifier.heads == []
+
+    spotter.accept = True
+    assert cascade.accepts(bytes(RATE * 2 * 3), RATE)
+    assert verifier.heads == [RATE * 2 * 1500 // 1000]
+    assert cascade.stats.accepted == 1
+    assert cascade.stats.stt_calls_avoided == 1
+
+
+def test_shared_transcribers_are_left_to_their_owner():
+    shared = _Transcriber()
+    for _ in range(2):
+        detector = Daemon.wake_word_detector(
+            "transcript", lambda text: "jarvis" in text, shared
+        )
+        assert detector is not None
+        assert detector.accepts(bytes(RATE * 2), RATE)
+        detector.close()
+    assert shared.closed == 0
+
+    owned = _Transcriber()
+    TranscriptWakeWordDetector(owned, lambda text: True).close()
+    assert owned.closed == 1